@@ -1,4 +1,3 @@
-from .main import ping, submit_job, create_user_document
-
-__all__ = ['ping', 'submit_job', 'create_user_document']
+from .main import ping, submit_job, create_user_document, get_job_history, get_job_artifact, get_job_status
 
+__all__ = ['ping', 'submit_job', 'create_user_document', 'get_job_history', 'get_job_artifact', 'get_job_status']
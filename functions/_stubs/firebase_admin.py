@@ -1,7 +1,8 @@
 """Minimal firebase_admin stubs for local unit tests and CLI helpers."""
 from __future__ import annotations
 
-from datetime import datetime
+import copy
+from collections import Counter
 from types import SimpleNamespace
 from typing import Any, Dict, Iterable, Optional
 
@@ -9,6 +10,23 @@ _firestore_store: Dict[str, Dict[str, Any]] = {}
 _app: Optional[object] = None
 
 
+class _OperationCounter(Counter):
+    """Tally of simulated Firestore round trips.
+
+    ``reads`` counts document gets, ``queries`` collection streams,
+    ``writes`` standalone set/update calls and ``commits`` batch commits.
+    ``query_results`` tallies documents returned by queries.
+    Writes staged inside a batch are tallied as ``batched_writes`` and do not
+    cost a round trip of their own.
+    """
+
+    ROUND_TRIP_KINDS = ("reads", "queries", "writes", "commits")
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self[kind] for kind in self.ROUND_TRIP_KINDS)
+
+
 class _FakeSnapshot:
     def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]) -> None:
         self.id = doc_id
@@ -26,9 +44,10 @@ class _FakeSnapshot:
         return data
 
 class _FakeDocument:
-    def __init__(self, store: Dict[str, Any], doc_id: str) -> None:
+    def __init__(self, store: Dict[str, Any], doc_id: str, ops: Optional[_OperationCounter] = None) -> None:
         self._store = store
         self._doc_id = doc_id
+        self._ops = ops if ops is not None else _OperationCounter()
 
     @property
     def id(self) -> str:
@@ -39,10 +58,28 @@ class _FakeDocument:
         doc.setdefault("__subcollections__", {})
         return doc
 
-    def get(self) -> _FakeSnapshot:
-        return _FakeSnapshot(self._doc_id, self._store.get(self._doc_id))
+    def get(
+        self,
+        field_paths: Optional[Iterable[str]] = None,
+        transaction: Optional["_FakeTransaction"] = None,
+    ) -> _FakeSnapshot:
+        self._ops["reads"] += 1
+        data = self._store.get(self._doc_id)
+        if data is None:
+            return _FakeSnapshot(self._doc_id, None)
+        if field_paths is not None:
+            return _FakeSnapshot(self._doc_id, _project(data, field_paths))
+        return _FakeSnapshot(self._doc_id, copy.deepcopy(data))
 
     def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._ops["writes"] += 1
+        self._apply_set(data, merge)
+
+    def update(self, updates: Dict[str, Any]) -> None:
+        self._ops["writes"] += 1
+        self._apply_update(updates)
+
+    def _apply_set(self, data: Dict[str, Any], merge: bool = False) -> None:
         doc = self._ensure_doc()
         if merge:
             _deep_merge(doc, data)
@@ -52,51 +89,164 @@ class _FakeDocument:
             doc["__subcollections__"] = sub
             _deep_merge(doc, data)
 
-    def update(self, updates: Dict[str, Any]) -> None:
+    def _apply_update(self, updates: Dict[str, Any]) -> None:
         doc = self._ensure_doc()
         for key, value in updates.items():
             parts = key.split(".")
             target = doc
             for part in parts[:-1]:
                 target = target.setdefault(part, {})
-            target[parts[-1]] = value
+            target[parts[-1]] = _resolve_value(target.get(parts[-1]), value)
 
     def collection(self, name: str) -> "_FakeCollection":
         sub_store = self._ensure_doc()["__subcollections__"].setdefault(name, {})
-        return _FakeCollection(sub_store)
+        return _FakeCollection(sub_store, self._ops)
 
 
 class _FakeCollection:
-    def __init__(self, store: Dict[str, Any]) -> None:
+    def __init__(self, store: Dict[str, Any], ops: Optional[_OperationCounter] = None) -> None:
         self._store = store
+        self._ops = ops if ops is not None else _OperationCounter()
 
     def document(self, doc_id: str) -> _FakeDocument:
-        return _FakeDocument(self._store, doc_id)
+        return _FakeDocument(self._store, doc_id, self._ops)
+
+    def _query(self) -> "_FakeQuery":
+        return _FakeQuery(self._store, self._ops)
 
     def stream(self) -> Iterable[_FakeSnapshot]:
-        return [_FakeSnapshot(doc_id, data) for doc_id, data in self._store.items()]
+        return self._query().stream()
+
+    def order_by(self, field: str, direction: Any = None) -> "_FakeQuery":
+        return self._query().order_by(field, direction=direction)
+
+    def where(self, field: str, op: str, value: Any) -> "_FakeQuery":
+        return self._query().where(field, op, value)
+
+    def select(self, field_paths: Iterable[str]) -> "_FakeQuery":
+        return self._query().select(field_paths)
+
+    def limit(self, count: int) -> "_FakeQuery":
+        return self._query().limit(count)
+
+
+_MISSING = object()
+
+_COMPARATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+}
+
+
+def _get_path(data: Dict[str, Any], path: str) -> Any:
+    value: Any = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _project(data: Dict[str, Any], paths: Iterable[str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for path in paths:
+        value = _get_path(data, path)
+        if value is _MISSING:
+            continue
+        parts = path.split(".")
+        target = out
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return out
+
 
-    def order_by(self, field: str, direction: Any = None) -> "_FakeCollectionView":
-        reverse = False
-        if direction is not None:
-            reverse = str(direction).upper().endswith('DESCENDING')
-        return _FakeCollectionView(self._store, field, reverse)
+class _FakeQuery:
+    """Immutable query supporting where/order_by/start_after/limit/select.
 
-class _FakeCollectionView:
-    def __init__(self, store: Dict[str, Any], field: str, reverse: bool) -> None:
+    Like Firestore, ordering on a field drops documents that lack it, ties
+    are broken by document id, and inequality filters on missing fields
+    never match.
+    """
+
+    def __init__(self, store: Dict[str, Any], ops: _OperationCounter, **state: Any) -> None:
         self._store = store
-        self._field = field
-        self._reverse = reverse
+        self._ops = ops
+        self._filters: tuple = state.get("filters", ())
+        self._orders: tuple = state.get("orders", ())
+        self._limit: Optional[int] = state.get("limit")
+        self._cursor: Any = state.get("cursor")
+        self._fields: Optional[tuple] = state.get("fields")
+
+    def _copy(self, **changes: Any) -> "_FakeQuery":
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "cursor": self._cursor,
+            "fields": self._fields,
+        }
+        state.update(changes)
+        return _FakeQuery(self._store, self._ops, **state)
+
+    def where(self, field: str, op: str, value: Any) -> "_FakeQuery":
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field: str, direction: Any = None) -> "_FakeQuery":
+        descending = direction is not None and str(direction).upper().endswith("DESCENDING")
+        return self._copy(orders=self._orders + ((field, descending),))
+
+    def limit(self, count: int) -> "_FakeQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, cursor: Any) -> "_FakeQuery":
+        return self._copy(cursor=cursor)
+
+    def select(self, field_paths: Iterable[str]) -> "_FakeQuery":
+        return self._copy(fields=tuple(field_paths))
+
+    def _sorted(self, items: list) -> list:
+        if not self._orders:
+            return items
+        # Stable sorts from the least to the most significant key.
+        tie_descending = self._orders[-1][1]
+        items = sorted(items, key=lambda item: item[0], reverse=tie_descending)
+        for field, descending in reversed(self._orders):
+            items = sorted(items, key=lambda item: _get_path(item[1], field), reverse=descending)
+        return items
 
     def stream(self) -> Iterable[_FakeSnapshot]:
-        def sort_key(item: tuple[str, Dict[str, Any]]):
-            value = item[1].get(self._field)
-            if isinstance(value, datetime):
-                return value
-            return (value is None, value)
+        self._ops["queries"] += 1
+        items = []
+        for doc_id, data in self._store.items():
+            if all(
+                _get_path(data, field) is not _MISSING and _COMPARATORS[op](_get_path(data, field), value)
+                for field, op, value in self._filters
+            ) and all(_get_path(data, field) is not _MISSING for field, _ in self._orders):
+                items.append((doc_id, data))
+
+        if self._cursor is not None:
+            cursor_id = getattr(self._cursor, "id", None)
+            cursor_data = self._cursor.to_dict() if hasattr(self._cursor, "to_dict") else dict(self._cursor)
+            marker = (cursor_id or "", cursor_data)
+            items = [item for item in items if item[0] != cursor_id]
+            ordered = self._sorted(items + [marker])
+            items = ordered[next(i for i, item in enumerate(ordered) if item is marker) + 1:]
+        else:
+            items = self._sorted(items)
 
-        ordered = sorted(self._store.items(), key=sort_key, reverse=self._reverse)
-        return [_FakeSnapshot(doc_id, data) for doc_id, data in ordered]
+        if self._limit is not None:
+            items = items[: self._limit]
+        self._ops["query_results"] += len(items)
+        if self._fields is not None:
+            return [_FakeSnapshot(doc_id, _project(data, self._fields)) for doc_id, data in items]
+        return [_FakeSnapshot(doc_id, data) for doc_id, data in items]
 
 class _FakeBatch:
     def __init__(self, client: "_FakeFirestore") -> None:
@@ -106,33 +256,92 @@ class _FakeBatch:
     def set(self, doc_ref: _FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
         self._ops.append(("set", doc_ref, data, merge))
 
+    def update(self, doc_ref: _FakeDocument, updates: Dict[str, Any]) -> None:
+        self._ops.append(("update", doc_ref, updates, False))
+
     def commit(self) -> None:
+        self._client.operations["commits"] += 1
         for action, doc_ref, data, merge in self._ops:
+            self._client.operations["batched_writes"] += 1
             if action == "set":
-                doc_ref.set(data, merge=merge)
+                doc_ref._apply_set(data, merge=merge)
+            elif action == "update":
+                doc_ref._apply_update(data)
         self._ops.clear()
 
 
 class _FakeFirestore:
     def __init__(self, store: Dict[str, Dict[str, Any]]) -> None:
         self._store = store
+        self.operations = _OperationCounter()
 
     def collection(self, name: str) -> _FakeCollection:
         collection_store = self._store.setdefault(name, {})
-        return _FakeCollection(collection_store)
+        return _FakeCollection(collection_store, self.operations)
 
     def batch(self) -> _FakeBatch:
         return _FakeBatch(self)
 
+    def transaction(self) -> _FakeTransaction:
+        return _FakeTransaction(self)
+
+    def reset_operations(self) -> None:
+        self.operations.clear()
+
+
+class Increment:
+    """Stand-in for ``firestore.Increment`` applied server-side on write."""
+
+    def __init__(self, value: int | float) -> None:
+        self.value = value
+
+
+def _resolve_value(current: Any, value: Any) -> Any:
+    if isinstance(value, Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    return value
+
 
 def _deep_merge(target: Dict[str, Any], source: Dict[str, Any]) -> None:
     for key, value in source.items():
         if key == "__subcollections__":
             continue
-        if isinstance(value, dict) and isinstance(target.get(key), dict):
+        if isinstance(value, dict):
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
             _deep_merge(target[key], value)
         else:
-            target[key] = value
+            target[key] = _resolve_value(target.get(key), value)
+
+
+class _FakeTransaction:
+    """Buffers writes and applies them on commit, like a batch."""
+
+    def __init__(self, client: "_FakeFirestore") -> None:
+        self._batch = _FakeBatch(client)
+
+    def set(self, doc_ref: _FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        self._batch.set(doc_ref, data, merge=merge)
+
+    def update(self, doc_ref: _FakeDocument, updates: Dict[str, Any]) -> None:
+        self._batch.update(doc_ref, updates)
+
+    def commit(self) -> None:
+        self._batch.commit()
+
+
+def transactional(func: Any) -> Any:
+    """Mimic ``firestore.transactional``: run ``func`` then commit its writes.
+
+    Writes are single-threaded under the GIL here, so no retry loop is needed.
+    """
+
+    def wrapper(transaction: _FakeTransaction, *args: Any, **kwargs: Any) -> Any:
+        result = func(transaction, *args, **kwargs)
+        transaction.commit()
+        return result
+
+    return wrapper
 
 
 def initialize_app(credential: Any | None = None) -> object:
@@ -158,7 +367,7 @@ class _CredentialsModule:
 
 
 credentials = _CredentialsModule()
-firestore = SimpleNamespace(client=client)
+firestore = SimpleNamespace(client=client, Increment=Increment, transactional=transactional)
 
 __all__ = [
     "initialize_app",
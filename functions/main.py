@@ -2,18 +2,25 @@
 from __future__ import annotations
 
 import base64
+import gzip
+import io
 import json
 import logging
 import os
-import re
+import zlib
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO
 from types import SimpleNamespace
 from uuid import uuid4
 
 from dotenv import load_dotenv
 
+try:
+    from google.cloud import storage  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover - optional for local tests
+    storage = None
+
 FORCE_ADMIN_STUBS = os.getenv("THERMOTERS_FORCE_FIREBASE_ADMIN_STUBS", "0").lower() in {"1", "true", "yes"}
 USING_FIREBASE_ADMIN_STUBS = False
 if not FORCE_ADMIN_STUBS:
@@ -57,8 +64,30 @@ else:
 
 if __package__:
     from .src.BrickPlotter import BrickPlotter
+    from .utils.blob_store import DEFAULT_BUCKET, GCSBlobStore, LocalBlobStore, blob_store_from_spec
+    from .utils.job_queue import job_queue_from_spec
+    from .utils.profile_cache import UserProfileCache
+    from .utils.quota import MONTHLY_JOB_LIMIT, MonthlyQuota
+    from .utils.sequence_io import (
+        GZIP_SUFFIXES, is_valid_sequence, iter_csv, iter_fasta, iter_text, sequence_suffix,
+    )
+    from .utils.single_flight import SingleFlight, fingerprint
+    from .utils.upload_stream import (
+        MultipartUpload, UploadError, UploadTooLarge, multipart_boundary, open_upload_text,
+    )
 else:  # Script execution fallback to support `python main.py`
     from src.BrickPlotter import BrickPlotter
+    from utils.blob_store import DEFAULT_BUCKET, GCSBlobStore, LocalBlobStore, blob_store_from_spec
+    from utils.job_queue import job_queue_from_spec
+    from utils.profile_cache import UserProfileCache
+    from utils.quota import MONTHLY_JOB_LIMIT, MonthlyQuota
+    from utils.sequence_io import (
+        GZIP_SUFFIXES, is_valid_sequence, iter_csv, iter_fasta, iter_text, sequence_suffix,
+    )
+    from utils.single_flight import SingleFlight, fingerprint
+    from utils.upload_stream import (
+        MultipartUpload, UploadError, UploadTooLarge, multipart_boundary, open_upload_text,
+    )
 
 load_dotenv()  # Load environment variables from .env file
 logging.basicConfig(level=logging.INFO)
@@ -135,6 +164,18 @@ except Exception as exc:
     app = initialize_app()
     db = firebase_admin_stub.firestore.client(app)
 
+_job_quota = MonthlyQuota(
+    transactional=firestore.transactional,
+    limit=MONTHLY_JOB_LIMIT,
+    block_size=int(os.getenv("THERMOTERS_QUOTA_LEASE_BLOCK", "5")),
+    lease_ttl=float(os.getenv("THERMOTERS_QUOTA_LEASE_TTL", "300")),
+)
+
+_profile_cache = UserProfileCache(
+    ttl=float(os.getenv("THERMOTERS_PROFILE_CACHE_TTL", "30")),
+    enabled=os.getenv("THERMOTERS_PROFILE_CACHE", "1").lower() not in {"0", "false", "no"},
+)
+
 def _resolve_auth_provider(user: Any) -> str:
     for attr in ("provider_id", "providerId", "sign_in_provider", "signInProvider"):
         value = getattr(user, attr, None)
@@ -164,6 +205,51 @@ JOB_STATUS = {
 }
 
 
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+# Fields returned by get_job_history by default. The heavy ones in
+# JOB_OPTIONAL_FIELDS are only read when requested via ``include``.
+JOB_SUMMARY_FIELDS = (
+    "uid",
+    "jobTitle",
+    "nextTitle",
+    "predictor",
+    "predictors",
+    "status",
+    "uploadedAt",
+    "rc",
+    "plusOne",
+    "prefixSuffix",
+    "maxValue",
+    "minValue",
+    "threshold",
+    "error",
+    "thumbnail",
+    "mode",
+    "batch",
+)
+JOB_OPTIONAL_FIELDS = ("brickplot", "sequence")
+BATCH_MAX_RECORDS = int(os.getenv("THERMOTERS_BATCH_MAX_RECORDS", "10000"))
+# Enforced while the upload is read: raw request bytes, and the text a
+# gzip/bgzip upload expands to.
+UPLOAD_MAX_BYTES = int(os.getenv("THERMOTERS_UPLOAD_MAX_BYTES", str(32 * 1024 * 1024)))
+UPLOAD_MAX_DECOMPRESSED_BYTES = int(os.getenv("THERMOTERS_UPLOAD_MAX_DECOMPRESSED_BYTES", str(256 * 1024 * 1024)))
+
+
+def _parse_list_param(value: Any) -> set[str]:
+    """Accept ``a,b`` strings or JSON lists for multi-valued parameters."""
+    if not value:
+        return set()
+    if isinstance(value, str):
+        value = value.split(",")
+    return {str(item).strip() for item in value if str(item).strip()}
+
+
+def _history_etag(user_id: str, head_id: Optional[str], head_updated_at: Any, **params: Any) -> str:
+    """Weak ETag for a history response: the newest change plus the query shape."""
+    return f'W/"{fingerprint(user=user_id, head=head_id, updatedAt=head_updated_at, **params)[:32]}"'
+
+
 def _model_path_from_request(model_path: Optional[str]) -> Path:
     """Resolve and validate the requested model path."""
     candidate = Path(model_path) if model_path else DEFAULT_MODEL
@@ -207,32 +293,98 @@ def get_job_history(req: https_fn.Request) -> https_fn.Response:
             response=json.dumps({"error": "userId is required"}),
         )
 
+    def param(name: str, default: Any = None) -> Any:
+        value = data.get(name)
+        if value is None:
+            value = args.get(name)
+        return default if value is None else value
+
     try:
-        jobs_collection = db.collection('users').document(user_id).collection('jobhistory')
-        direction_desc = getattr(getattr(firestore, 'Query', SimpleNamespace(DESCENDING='DESCENDING')), 'DESCENDING', 'DESCENDING')
-        try:
-            snapshots = jobs_collection.order_by('uploadedAt', direction=direction_desc).stream()
-        except Exception:
-            snapshots = jobs_collection.stream()
+        limit = max(1, min(int(param("limit", HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE))
+        include = _parse_list_param(param("include"))
+        unknown_fields = include - set(JOB_OPTIONAL_FIELDS)
+        if unknown_fields:
+            raise ValueError(f"Unsupported include fields: {', '.join(sorted(unknown_fields))}")
+        statuses = _parse_list_param(param("status")) or set(JOB_STATUS.values())
+        unknown_statuses = statuses - set(JOB_STATUS.values())
+        if unknown_statuses:
+            raise ValueError(f"Unsupported status filter: {', '.join(sorted(unknown_statuses))}")
+        since_raw = param("since")
+        since = datetime.fromisoformat(since_raw) if since_raw else None
+    except (TypeError, ValueError) as exc:
+        return https_fn.Response(
+            status=400,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": str(exc)}),
+        )
+    cursor = param("startAfter")
 
-        entries = []
-        for snapshot in snapshots:
-            doc_dict = snapshot.to_dict()
-            sort_key = doc_dict.get('uploadedAt')
-            entries.append((sort_key, snapshot.id, doc_dict))
+    try:
+        user_ref = db.collection('users').document(user_id)
+        jobs_collection = user_ref.collection('jobhistory')
+        direction_desc = getattr(getattr(firestore, 'Query', SimpleNamespace(DESCENDING='DESCENDING')), 'DESCENDING', 'DESCENDING')
 
-        entries.sort(key=lambda item: item[0] or datetime.min, reverse=True)
+        # Every job write bumps ``updatedAt``, so the most recently updated
+        # job identifies the state of the whole history. Reading it is a
+        # one-document query, and an unchanged history ends here with a 304.
+        head = list(
+            jobs_collection.order_by('updatedAt', direction=direction_desc).select(['updatedAt']).limit(1).stream()
+        )
+        watermark = head[0].to_dict().get('updatedAt') if head else None
+        etag = _history_etag(
+            user_id,
+            head[0].id if head else None,
+            watermark,
+            limit=limit,
+            include=sorted(include),
+            status=sorted(statuses),
+            startAfter=cursor,
+            since=since_raw,
+        )
+        if etag in _parse_list_param(req.headers.get("If-None-Match")):
+            return https_fn.Response(status=304, headers={"ETag": etag})
+
+        profile = _profile_cache.get(user_ref) or {}
+        # Filtering on status drops the placeholder seed document and needs
+        # the composite indexes in firestore.indexes.json.
+        query = jobs_collection.where('status', 'in', sorted(statuses))
+        if since is not None:
+            # Delta sync: everything created or changed after the watermark.
+            query = query.where('updatedAt', '>', since).order_by('updatedAt')
+        else:
+            query = query.order_by('uploadedAt', direction=direction_desc)
+        if cursor:
+            cursor_snapshot = jobs_collection.document(cursor).get()
+            if not cursor_snapshot.exists:
+                return https_fn.Response(
+                    status=400,
+                    headers={"Content-Type": "application/json"},
+                    response=json.dumps({"error": "Unknown startAfter cursor"}),
+                )
+            query = query.start_after(cursor_snapshot)
+
+        fields = JOB_SUMMARY_FIELDS + ("updatedAt",) + tuple(field for field in JOB_OPTIONAL_FIELDS if field in include)
+        # One extra document tells us whether another page exists.
+        snapshots = list(query.select(fields).limit(limit + 1).stream())
+        has_more = len(snapshots) > limit
+        snapshots = snapshots[:limit]
 
         job_history = []
-        for sort_key, doc_id, doc_dict in entries:
-            serialised = _serialize_for_json(doc_dict)
-            serialised['id'] = doc_id
+        for snapshot in snapshots:
+            serialised = _serialize_for_json(snapshot.to_dict())
+            serialised['id'] = snapshot.id
             job_history.append(serialised)
 
         return https_fn.Response(
             status=200,
-            headers={"Content-Type": "application/json"},
-            response=json.dumps({"jobs": job_history}),
+            headers={"Content-Type": "application/json", "ETag": etag},
+            response=json.dumps({
+                "jobs": job_history,
+                "nextCursor": snapshots[-1].id if has_more else None,
+                "watermark": _serialize_for_json(watermark) if watermark else since_raw,
+                "firstJob": profile.get("firstJob"),
+                "lastJob": profile.get("lastJob"),
+            }),
         )
     except Exception as exc:
         logger.exception("Error fetching job history: %s", exc)
@@ -255,12 +407,15 @@ def submit_job(req: https_fn.Request) -> https_fn.Response:
         )
 
     try:
-        data = req.get_json()
+        # multipart/form-data bodies carry the options as a JSON ``payload``
+        # part followed by the file, which is parsed while it is received.
+        upload = _open_multipart_upload(req)
+        data = json.loads(upload.fields.get("payload") or "{}") if upload else req.get_json()
         logger.info("Submit Job - Received request data: %s", data)
 
         sequence = (data.get("sequence", "") or "").upper().strip()
         file_content = data.get("fileContent")
-        file_name = data.get("fileName")
+        file_name = upload.file_name if upload else data.get("fileName")
         model_path = _model_path_from_request(data.get("model"))
         job_title = data.get("jobTitle", "Untitled Job")
         predictor_label = data.get("predictor") or "standard"
@@ -276,57 +431,77 @@ def submit_job(req: https_fn.Request) -> https_fn.Response:
         min_value = data.get("minValue", -6)
         threshold = data.get("threshold", -2.5)
         is_prefix_suffix = data.get("isPrefixSuffix", True)
-
-        if file_content and file_name:
-            file_ext = os.path.splitext(file_name)[1].lower()
-            sequences = process_file_content(file_content, file_ext)
+        run_async = bool(data.get("async", JOB_MODE == "async"))
+        run_batch = bool(data.get("batch"))
+        records: Optional[list[tuple[str, str]]] = None
+        streamed_records: Optional[Iterator[tuple[str, str]]] = None
+        uploaded_records: Optional[Iterator[tuple[str, str]]] = None
+        if upload is not None and upload.file_name:
+            uploaded_records = _stream_upload_records(upload)
+        elif file_content and file_name:
+            file_content = _decode_upload(file_content, file_name)
+
+        if run_batch:
+            # Batch mode scores every record of the upload; invalid records
+            # are reported individually instead of failing the job.
+            if uploaded_records is not None:
+                streamed_records = _bounded_records(uploaded_records)
+                if run_async:
+                    # Queued jobs carry their records in the task payload.
+                    records, streamed_records = list(streamed_records), None
+            elif file_content and file_name:
+                records = list(_bounded_records(process_file_records(file_content, sequence_suffix(file_name))))
+            else:
+                raise ValueError("Batch mode requires an uploaded file")
+            sequence = ""
+        elif uploaded_records is not None:
+            # Only the first valid record is needed; the rest is never parsed.
+            sequence = next((seq for _, seq in uploaded_records if is_valid_sequence(seq)), "")
+            if not sequence:
+                raise ValueError("No valid sequences found in uploaded file")
+        elif file_content and file_name:
+            sequences = process_file_content(file_content, sequence_suffix(file_name))
             if not sequences:
                 raise ValueError("No valid sequences found in uploaded file")
             sequence = sequences[0]
         elif not sequence:
             raise ValueError("No sequence provided")
 
-        if not re.fullmatch(r"[ACGTU]+", sequence):
-            raise ValueError("Invalid characters in sequence. Only A, C, G, T, U are allowed.")
-        if len(sequence) < 10:
-            raise ValueError("Sequence too short. Minimum length is 10 nucleotides.")
+        if records is None and streamed_records is None:
+            if not is_valid_sequence(sequence):
+                raise ValueError("Invalid characters in sequence. Only A, C, G, T, U are allowed.")
+            if len(sequence) < 10:
+                raise ValueError("Sequence too short. Minimum length is 10 nucleotides.")
 
-        current_month = datetime.now().strftime("%Y-%m")
+        now = datetime.now()
+        current_month = now.strftime("%Y-%m")
         user_id = req.auth.uid  # type: ignore[attr-defined]
         user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
-
-        if not user_doc.exists:
-            user_ref.set(
-                _build_user_profile(
-                    uid=user_id,
-                    email=data.get("email") or getattr(getattr(req, "auth", object()), "email", None),
-                    auth_provider=getattr(getattr(req, "auth", object()), "provider", None),
-                ),
-                merge=True,
+        cached_profile = _profile_cache.get(user_ref)
+
+        # The profile read above (usually a cache hit) is the only read on
+        # this path. Everything else up to the result write is staged in a
+        # single batch below.
+        is_new_user = cached_profile is None
+        if is_new_user:
+            user_data = _build_user_profile(
+                uid=user_id,
+                email=data.get("email") or getattr(getattr(req, "auth", object()), "email", None),
+                auth_provider=getattr(getattr(req, "auth", object()), "provider", None),
             )
-            user_doc = user_ref.get()
-
-        user_data = (user_doc.to_dict() or {}) if hasattr(user_doc, "to_dict") else {}
-        monthly_usage = user_data.get("monthlyUsage", {})
+        else:
+            user_data = cached_profile
         previous_last_job = user_data.get("lastJob")
-        stored_month = monthly_usage.get("monthYear")
-        current_count = monthly_usage.get("count", 0)
-
-        if stored_month != current_month:
-            current_count = 0
-            user_ref.update({
-                "monthlyUsage": {"count": current_count, "monthYear": current_month}
-            })
-        elif current_count >= 100:
+
+        # Quota is checked against an in-memory lease; Firestore is only
+        # touched (in a transaction) when this instance needs a new lease.
+        if not _job_quota.try_consume(db, user_ref, current_month):
             return https_fn.Response(
                 status=429,
                 headers={"Content-Type": "application/json"},
-                response=json.dumps({"error": "Monthly limit of 100 sequences reached"}),
+                response=json.dumps({"error": f"Monthly limit of {MONTHLY_JOB_LIMIT} sequences reached"}),
             )
 
-        user_ref.update({"monthlyUsage.count": current_count + 1})
-
         job_collection = (
             db.collection("users")
             .document(user_id)
@@ -334,62 +509,113 @@ def submit_job(req: https_fn.Request) -> https_fn.Response:
         )
         job_id = data.get("jobId") or f"job_{uuid4().hex}"
         job_ref = job_collection.document(job_id)
-        job_ref.set(
-            {
-                "uid": user_id,
-                "jobTitle": job_title,
-                "nextTitle": None,
-                "predictor": predictor_label,
-                "predictors": predictors,
-                "sequence": sequence,
-                "brickplot": None,
-                "status": JOB_STATUS["PROCESSING"],
-                "uploadedAt": datetime.now(),
-                "rc": is_rc,
-                "plusOne": is_plus_one,
-                "prefixSuffix": is_prefix_suffix,
-                "maxValue": max_value,
-                "minValue": min_value,
-                "threshold": threshold,
-            }
-        )
-
-        if previous_last_job and previous_last_job != job_id:
-            job_collection.document(previous_last_job).update({"nextTitle": job_id})
 
-        user_updates = {"lastJob": job_id, "lastLogin": datetime.now()}
+        user_updates: Dict[str, Any] = {"lastJob": job_id, "lastLogin": now}
         if not user_data.get("firstJob"):
             user_updates["firstJob"] = job_id
-        user_ref.update(user_updates)
-
-        try:
-            brickplot = get_brickplot(
-                model=str(model_path),
-                sequence=sequence,
-                is_plus_one=is_plus_one,
-                is_rc=is_rc,
-                max_value=max_value,
-                min_value=min_value,
-                threshold=threshold,
-                is_prefix_suffix=is_prefix_suffix,
+
+        batch = db.batch()
+        if is_new_user:
+            profile = {**user_data, **user_updates}
+            profile["monthlyUsage"] = {"count": firestore.Increment(1), "monthYear": current_month}
+            batch.set(user_ref, profile, merge=True)
+        else:
+            user_updates["monthlyUsage.count"] = firestore.Increment(1)
+            user_updates["monthlyUsage.monthYear"] = current_month
+            batch.update(user_ref, user_updates)
+        job_doc = {
+            "uid": user_id,
+            "jobTitle": job_title,
+            "nextTitle": None,
+            "predictor": predictor_label,
+            "predictors": predictors,
+            "sequence": sequence,
+            "brickplot": None,
+            "status": JOB_STATUS["PENDING"] if run_async else JOB_STATUS["PROCESSING"],
+            "uploadedAt": now,
+            "updatedAt": now,
+            "rc": is_rc,
+            "plusOne": is_plus_one,
+            "prefixSuffix": is_prefix_suffix,
+            "maxValue": max_value,
+            "minValue": min_value,
+            "threshold": threshold,
+        }
+        if records is not None or streamed_records is not None:
+            job_doc["mode"] = "batch"
+            # A streamed batch is counted as it is scored; the summary fills this in.
+            job_doc["batch"] = {"total": len(records) if records is not None else None}
+        batch.set(job_ref, job_doc)
+        if previous_last_job and previous_last_job != job_id:
+            batch.update(job_collection.document(previous_last_job), {"nextTitle": job_id, "updatedAt": now})
+        batch.commit()
+
+        # monthlyUsage is maintained server-side (atomic increments and quota
+        # leases), so the cached copy drops it rather than guessing.
+        if is_new_user:
+            _profile_cache.put(user_id, {k: v for k, v in profile.items() if k != "monthlyUsage"})
+        else:
+            _profile_cache.apply(
+                user_id,
+                {k: v for k, v in user_updates.items() if not k.startswith("monthlyUsage")},
+                drop=("monthlyUsage",),
             )
-            job_ref.update({"status": JOB_STATUS["COMPLETED"], "brickplot": brickplot})
+
+        params: Dict[str, Any] = {
+            "model": str(model_path),
+            "is_plus_one": is_plus_one,
+            "is_rc": is_rc,
+            "max_value": max_value,
+            "min_value": min_value,
+            "threshold": threshold,
+            "is_prefix_suffix": is_prefix_suffix,
+        }
+        if records is not None:
+            params["records"] = [list(record) for record in records]
+        elif streamed_records is not None:
+            # Scoring starts while the rest of the upload is still arriving.
+            params["records"] = streamed_records
+        else:
+            params["sequence"] = sequence
+        if run_async:
+            _get_job_queue().enqueue({"userId": user_id, "jobId": job_id, "params": params})
             return https_fn.Response(
-                status=200,
+                status=202,
                 headers={"Content-Type": "application/json"},
                 response=json.dumps(
                     {
-                        "message": "Job completed successfully",
+                        "message": "Job queued",
                         "jobId": job_ref.id,
-                        "brickplot": brickplot,
+                        "status": JOB_STATUS["PENDING"],
                     }
                 ),
             )
-        except Exception as exc:
-            logger.error("Error generating brickplot: %s", exc)
-            job_ref.update({"status": JOB_STATUS["ERROR"], "error": str(exc)})
-            raise
 
+        brickplot = _run_brickplot_job(job_ref, user_id, job_id, params)
+        if brickplot.get("mode") == "batch":
+            # Per-record matrices stay in the records artifact.
+            brickplot = {
+                **brickplot,
+                "records": [{k: v for k, v in record.items() if k != "matrix"} for record in brickplot["records"]],
+            }
+        return https_fn.Response(
+            status=200,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps(
+                {
+                    "message": "Job completed successfully",
+                    "jobId": job_ref.id,
+                    "brickplot": brickplot,
+                }
+            ),
+        )
+
+    except UploadTooLarge as exc:
+        return https_fn.Response(
+            status=413,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": str(exc)}),
+        )
     except ValueError as exc:
         return https_fn.Response(
             status=400,
@@ -405,6 +631,78 @@ def submit_job(req: https_fn.Request) -> https_fn.Response:
         )
 
 
+def _run_brickplot_job(job_ref: Any, user_id: str, job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute, tier and store the brickplot for a job, recording the outcome on the job document."""
+    try:
+        brickplot = _coalesced_brickplot(**params)
+        summary = brickplot.get("summary")
+        if summary is not None and not summary["completed"]:
+            raise ValueError(f"None of the {summary['total']} records could be scored")
+        stored_brickplot = _tier_brickplot(brickplot, user_id, job_id)
+        updates = {
+            "status": JOB_STATUS["COMPLETED"],
+            "brickplot": stored_brickplot,
+            "thumbnail": brickplot.get("thumbnail_base64"),
+            "updatedAt": datetime.now(),
+        }
+        if summary is not None:
+            updates["batch"] = summary
+        job_ref.update(updates)
+        return brickplot
+    except Exception as exc:
+        logger.error("Error generating brickplot: %s", exc)
+        job_ref.update({"status": JOB_STATUS["ERROR"], "error": str(exc), "updatedAt": datetime.now()})
+        raise
+
+
+# Async mode: submit_job writes a pending job and enqueues it; a worker pool
+# in this instance drains the queue. THERMOTERS_JOB_QUEUE selects the queue
+# ("memory" or "sqlite:<path>"); THERMOTERS_JOB_MODE=async makes async the
+# default for requests that do not say.
+JOB_MODE = os.getenv("THERMOTERS_JOB_MODE", "sync").lower()
+_job_queue: Any = None
+
+
+def _process_job_task(task: Dict[str, Any]) -> None:
+    """Queue worker entry point: run one pending job to completion."""
+    user_id, job_id = task["userId"], task["jobId"]
+    job_ref = db.collection("users").document(user_id).collection("jobhistory").document(job_id)
+    job_ref.update({"status": JOB_STATUS["PROCESSING"], "updatedAt": datetime.now()})
+    _run_brickplot_job(job_ref, user_id, job_id, task["params"])
+
+
+def _get_job_queue() -> Any:
+    """Return the configured job queue, starting its workers on first use."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = job_queue_from_spec(
+            os.getenv("THERMOTERS_JOB_QUEUE", "memory"),
+            _process_job_task,
+            workers=int(os.getenv("THERMOTERS_JOB_WORKERS", "2")),
+        )
+    return _job_queue
+
+
+# Identical jobs submitted at the same moment (e.g. a workshop running the
+# same example promoter) share one in-flight computation. Results are not
+# cached: once the leader finishes, the next request recomputes.
+_BRICKPLOT_FLIGHTS = SingleFlight()
+
+
+def _coalesced_brickplot(**params: Any) -> Dict[str, Any]:
+    """Run ``get_brickplot`` (or ``get_batch_brickplot``) once per fingerprint among concurrent callers."""
+    compute = get_batch_brickplot if "records" in params else get_brickplot
+    if "records" in params and not isinstance(params["records"], list):
+        # A streamed upload is consumed while it is scored; nothing to share.
+        return compute(**params)
+    key = fingerprint(**params)
+    result, shared = _BRICKPLOT_FLIGHTS.do(key, lambda: compute(**params))
+    if shared:
+        logger.info("Coalesced brickplot request onto in-flight job %s", key[:12])
+    # Each caller gets its own top-level dict so per-job edits stay local.
+    return dict(result)
+
+
 def get_brickplot(
     *,
     model: str,
@@ -438,6 +736,41 @@ def get_brickplot(
         raise ValueError(f"Failed to generate brickplot: {exc}")
 
 
+def get_batch_brickplot(
+    *,
+    model: str,
+    records: Iterable,
+    is_plus_one: bool = True,
+    is_rc: bool = False,
+    max_value: float = -2.5,
+    min_value: float = -6,
+    threshold: float = -2.5,
+    is_prefix_suffix: bool = True,
+) -> Dict[str, Any]:
+    """Score every ``(record_id, sequence)`` pair of a batch job."""
+    logger.info("Scoring batch of %s records", len(records) if isinstance(records, list) else "streamed")
+    output_dir = BASE_DIR / "brickplots"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        brickplotter = BrickPlotter(
+            model=model,
+            output_folder=str(output_dir),
+            is_plus_one=is_plus_one,
+            is_rc=is_rc,
+            max_value=max_value,
+            min_value=min_value,
+            threshold=threshold,
+            is_prefix_suffix=is_prefix_suffix,
+        )
+        return brickplotter.score_batch(records)
+    except UploadError:
+        raise
+    except Exception as exc:
+        logger.error("Error in get_batch_brickplot: %s", exc)
+        raise ValueError(f"Failed to score batch: {exc}")
+
+
 @identity_fn.before_user_created(region="europe-west2")
 def create_user_document(event: identity_fn.AuthBlockingEvent):
     """Create the initial Firestore user document and placeholder job."""
@@ -450,15 +783,12 @@ def create_user_document(event: identity_fn.AuthBlockingEvent):
         user_ref = db.collection("users").document(user_id)
         job_ref = user_ref.collection("jobhistory").document("placeholder")
 
-        batch.set(
-            user_ref,
-            _build_user_profile(
-                uid=user.uid,
-                email=getattr(user, "email", None),
-                auth_provider=_resolve_auth_provider(user),
-            ),
-            merge=True,
+        profile = _build_user_profile(
+            uid=user.uid,
+            email=getattr(user, "email", None),
+            auth_provider=_resolve_auth_provider(user),
         )
+        batch.set(user_ref, profile, merge=True)
 
         batch.set(
             job_ref,
@@ -480,6 +810,7 @@ def create_user_document(event: identity_fn.AuthBlockingEvent):
         )
 
         batch.commit()
+        _profile_cache.put(user_id, {k: v for k, v in profile.items() if k != "monthlyUsage"})
         logger.info("Successfully created user bootstrap data for %s", user.uid)
         return identity_fn.BeforeCreateResponse()
     except Exception as exc:  # pragma: no cover - defensive logging
@@ -500,70 +831,227 @@ def generate_signed_url(bucket_name: str, blob_name: str, expiration_days: int =
     )
 
 
-def handle_image(brick_data: Dict[str, Any], job_id: str) -> Dict[str, Any]:
-    """Return inline image data or persist large payloads to Cloud Storage."""
-    logger.info("Handling image for job %s", job_id)
-    image_bytes = base64.b64decode(brick_data["image_base64"])
+# Large brickplot artifacts (PNG, matrix) live in a blob store; job documents
+# keep statistics plus pointers so history listings stay small.
+_blob_store: Any = None
+
+
+def _get_blob_store() -> Any:
+    """Return the configured blob store, creating it on first use."""
+    global _blob_store
+    if _blob_store is None:
+        spec = os.getenv("THERMOTERS_BLOB_STORE")
+        if spec:
+            _blob_store = blob_store_from_spec(spec)
+        elif storage is not None and not USING_FIREBASE_ADMIN_STUBS:
+            _blob_store = GCSBlobStore(DEFAULT_BUCKET)
+        else:
+            _blob_store = LocalBlobStore(BASE_DIR / "blobs")
+    return _blob_store
+
+
+def _tier_brickplot(brickplot: Dict[str, Any], user_id: str, job_id: str) -> Dict[str, Any]:
+    """Move the image and matrix to the blob store; return the job-document payload."""
+    store = _get_blob_store()
+    prefix = f"jobs/{user_id}/{job_id}"
+    artifacts: Dict[str, Any] = {}
+    if brickplot.get("image_base64"):
+        artifacts["image"] = store.put(
+            f"{prefix}/brickplot.png", base64.b64decode(brickplot["image_base64"]), content_type="image/png"
+        )
+    if brickplot.get("matrix") is not None:
+        matrix_json = json.dumps(brickplot["matrix"], separators=(",", ":")).encode("utf-8")
+        artifacts["matrix"] = store.put(
+            f"{prefix}/matrix.json.gz", gzip.compress(matrix_json), content_type="application/gzip"
+        )
+    if brickplot.get("records") is not None:
+        records_json = json.dumps(brickplot["records"], separators=(",", ":")).encode("utf-8")
+        artifacts["records"] = store.put(
+            f"{prefix}/records.json.gz", gzip.compress(records_json), content_type="application/gzip"
+        )
+    heavy = {"image_base64", "thumbnail_base64", "matrix", "sequence", "records"}
+    stored = {key: value for key, value in brickplot.items() if key not in heavy}
+    stored["artifacts"] = artifacts
+    return stored
 
-    if len(image_bytes) > 1_000_000:  # 1 MB threshold
-        if storage is None:  # pragma: no cover - requires google-cloud-storage at runtime
-            raise RuntimeError("google-cloud-storage is required to persist brickplot images")
-        bucket = storage.Client().bucket("thermoters-jobs")
-        blob = bucket.blob(f"images/{job_id}.png")
-        blob.upload_from_string(image_bytes, content_type="image/png")
-        return {"url": blob.generate_signed_url(3600)}
 
-    return {"image": brick_data["image_base64"]}
+@https_fn.on_request(region="europe-west2")
+def get_job_artifact(req: https_fn.Request) -> https_fn.Response:
+    """Load one full-size brickplot artifact (``image``, ``matrix`` or ``records``) on demand."""
+    _decode_test_auth(req)
+    if not getattr(req, "auth", None):
+        return https_fn.Response(
+            status=401,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": "Unauthorized"}),
+        )
 
+    try:
+        data = req.get_json() or {}
+    except Exception:
+        data = {}
+    args = getattr(req, "args", {}) or {}
+    job_id = data.get("jobId") or args.get("jobId")
+    artifact = data.get("artifact") or args.get("artifact") or "image"
+    if not job_id:
+        return https_fn.Response(
+            status=400,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": "jobId is required"}),
+        )
 
-def process_file_content(content: str, file_extension: str) -> list[str]:
+    try:
+        user_id = req.auth.uid  # type: ignore[attr-defined]
+        job_ref = db.collection("users").document(user_id).collection("jobhistory").document(job_id)
+        snapshot = job_ref.get(field_paths=["brickplot.artifacts"])
+        pointer = ((snapshot.to_dict() or {}).get("brickplot") or {}).get("artifacts", {}).get(artifact) if snapshot.exists else None
+        if not pointer:
+            return https_fn.Response(
+                status=404,
+                headers={"Content-Type": "application/json"},
+                response=json.dumps({"error": f"No {artifact} artifact for job {job_id}"}),
+            )
+
+        store = _get_blob_store()
+        payload = {"jobId": job_id, "artifact": artifact, "contentType": pointer.get("contentType"), "size": pointer.get("size")}
+        if getattr(store, "kind", None) == "gcs":
+            payload["url"] = store.url(pointer["key"])
+        else:
+            # Local stores have no URL a browser can reach; inline the bytes.
+            payload["data"] = base64.b64encode(store.get(pointer["key"])).decode("ascii")
+        return https_fn.Response(
+            status=200,
+            headers={"Content-Type": "application/json", "Cache-Control": "private, max-age=3600"},
+            response=json.dumps(payload),
+        )
+    except Exception as exc:
+        logger.exception("Error loading artifact %s for job %s: %s", artifact, job_id, exc)
+        return https_fn.Response(
+            status=500,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": "Failed to load artifact"}),
+        )
+
+
+JOB_STATUS_FIELDS = ("status", "error", "thumbnail", "brickplot", "uploadedAt", "updatedAt")
+
+
+@https_fn.on_request(region="europe-west2")
+def get_job_status(req: https_fn.Request) -> https_fn.Response:
+    """Poll the status of one job; the result fields are included once it completes."""
+    _decode_test_auth(req)
+    if not getattr(req, "auth", None):
+        return https_fn.Response(
+            status=401,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": "Unauthorized"}),
+        )
+
+    try:
+        data = req.get_json() or {}
+    except Exception:
+        data = {}
+    args = getattr(req, "args", {}) or {}
+    job_id = data.get("jobId") or args.get("jobId")
+    if not job_id:
+        return https_fn.Response(
+            status=400,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": "jobId is required"}),
+        )
+
+    try:
+        user_id = req.auth.uid  # type: ignore[attr-defined]
+        job_ref = db.collection("users").document(user_id).collection("jobhistory").document(job_id)
+        snapshot = job_ref.get(field_paths=list(JOB_STATUS_FIELDS))
+        if not snapshot.exists:
+            return https_fn.Response(
+                status=404,
+                headers={"Content-Type": "application/json"},
+                response=json.dumps({"error": f"Job {job_id} not found"}),
+            )
+        job = snapshot.to_dict() or {}
+        headers = {"Content-Type": "application/json"}
+        if job.get("status") in (JOB_STATUS["PENDING"], JOB_STATUS["PROCESSING"]):
+            headers["Retry-After"] = "2"
+        return https_fn.Response(
+            status=200,
+            headers=headers,
+            response=json.dumps(_serialize_for_json({"jobId": job_id, **job})),
+        )
+    except Exception as exc:
+        logger.exception("Error reading status for job %s: %s", job_id, exc)
+        return https_fn.Response(
+            status=500,
+            headers={"Content-Type": "application/json"},
+            response=json.dumps({"error": "Failed to read job status"}),
+        )
+
+
+def _decode_upload(content: str, file_name: str) -> str | TextIO:
+    """Compressed uploads (``.gz``/``.bgz``) arrive base64-encoded; return a size-limited text view of them."""
+    if len(content) > UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(f"Upload exceeds the limit of {UPLOAD_MAX_BYTES} bytes")
+    if Path(file_name).suffix.lower() not in GZIP_SUFFIXES:
+        return content
+    try:
+        raw = base64.b64decode(content, validate=True)
+    except ValueError as exc:
+        raise ValueError("Compressed uploads must be base64-encoded") from exc
+    return open_upload_text(io.BytesIO(raw), UPLOAD_MAX_DECOMPRESSED_BYTES)
+
+
+def _open_multipart_upload(req: Any) -> Optional[MultipartUpload]:
+    """Read the form fields of a multipart body, leaving its file part unread; None for JSON bodies."""
+    boundary = multipart_boundary(req.headers.get("Content-Type", ""))
+    if boundary is None:
+        return None
+    return MultipartUpload(req.stream, boundary, UPLOAD_MAX_BYTES)
+
+
+def _stream_upload_records(upload: MultipartUpload) -> Iterator[tuple[str, str]]:
+    """Parse the file part of a multipart upload as its bytes are read from the request."""
+    text = open_upload_text(upload.file(), UPLOAD_MAX_DECOMPRESSED_BYTES)
+    try:
+        yield from iter_text(text, sequence_suffix(upload.file_name or ""))
+    except (OSError, EOFError, zlib.error) as exc:  # truncated or corrupt gzip
+        raise UploadError(f"Could not decompress uploaded file: {exc}") from exc
+
+
+def _bounded_records(records: Iterable[tuple[str, str]]) -> Iterator[tuple[str, str]]:
+    """Pass batch records through, failing once there are more than ``BATCH_MAX_RECORDS`` or none at all."""
+    count = 0
+    for record in records:
+        count += 1
+        if count > BATCH_MAX_RECORDS:
+            raise UploadError(f"Too many records in batch. Maximum is {BATCH_MAX_RECORDS}.")
+        yield record
+    if not count:
+        raise UploadError("No sequences found in uploaded file")
+
+
+def process_file_content(content: str | bytes | TextIO, file_extension: str) -> list[str]:
     """Process uploaded files to extract DNA sequences."""
     logger.info("Processing uploaded content (extension=%s)", file_extension)
-    file_extension = file_extension.lower()
+    return [sequence for _, sequence in process_file_records(content, file_extension) if is_valid_sequence(sequence)]
 
-    if file_extension == ".csv":
-        return process_csv(content)
-    if file_extension in [".fna", ".ffn", ".faa", ".fasta"]:
-        return process_fasta(content)
-    raise ValueError(f"Unsupported file type: {file_extension}")
+
+def process_file_records(content: str | bytes | TextIO, file_extension: str) -> list[tuple[str, str]]:
+    """Extract every ``(record_id, sequence)`` pair, including invalid sequences."""
+    try:
+        return list(iter_text(content, file_extension))
+    except (OSError, EOFError, zlib.error) as exc:  # truncated or corrupt gzip
+        raise ValueError(f"Could not decompress uploaded file: {exc}") from exc
 
 
 def process_csv(content: str) -> list[str]:
     """Extract sequences from CSV content."""
-    import csv
-    from io import StringIO
-
-    sequences: list[str] = []
-    reader = csv.DictReader(StringIO(content))
-    for row in reader:
-        seq = (row.get("sequence") or "").upper().replace(" ", "")
-        if seq and re.fullmatch(r"[ACGTU]+", seq):
-            sequences.append(seq)
-    return sequences
+    return [sequence for _, sequence in iter_csv(content) if is_valid_sequence(sequence)]
 
 
 def process_fasta(content: str) -> list[str]:
     """Extract sequences from FASTA-like content."""
-    sequences: list[str] = []
-    current_seq: list[str] = []
-
-    for line in content.splitlines():
-        line = line.strip()
-        if line.startswith(">"):
-            if current_seq:
-                candidate = "".join(current_seq).upper()
-                if re.fullmatch(r"[ACGTU]+", candidate):
-                    sequences.append(candidate)
-                current_seq = []
-        elif line:
-            current_seq.append(line.upper().replace(" ", ""))
-
-    if current_seq:
-        candidate = "".join(current_seq).upper()
-        if re.fullmatch(r"[ACGTU]+", candidate):
-            sequences.append(candidate)
-
-    return sequences
+    return [sequence for _, sequence in iter_fasta(content) if is_valid_sequence(sequence)]
 
 
 @https_fn.on_request(region="europe-west2")
@@ -573,6 +1061,15 @@ def ping(req: https_fn.Request) -> https_fn.Response:  # noqa: D401 - short resp
         status=200,
         headers={"Content-Type": "application/json"},
         response=json.dumps(
-            {"status": "success", "message": f"Ping received at {datetime.now().isoformat()}"}
+            {
+                "status": "success",
+                "message": f"Ping received at {datetime.now().isoformat()}",
+                "metrics": {
+                    "profileCache": _profile_cache.metrics(),
+                    "quota": dict(_job_quota.stats),
+                    "coalescing": dict(_BRICKPLOT_FLIGHTS.stats),
+                    "jobQueue": {"pending": _job_queue.pending() if _job_queue is not None else 0},
+                },
+            }
         ),
     )
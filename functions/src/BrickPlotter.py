@@ -1,16 +1,15 @@
-from Bio.Seq import Seq
 import base64
 import copy
-import csv
 import logging
 import pickle
-import re
 import warnings
-from io import BytesIO, StringIO
+from collections import defaultdict
+from io import BytesIO
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
+from PIL import Image
 
 try:
     from sklearn.exceptions import InconsistentVersionWarning  # type: ignore
@@ -20,14 +19,29 @@ except ModuleNotFoundError:  # pragma: no cover - scikit-learn not installed
 try:
     from ..utils.general_functions import *  # type: ignore
     from ..utils.model_functions import *  # type: ignore
+    from ..utils.dedup import dedup_stats, unique_indices
+    from ..utils.encoding import IUPAC_CODES, MASKED, encode_batch, encode_sequence
+    from ..utils.length_buckets import plan_length_buckets, total_overhead
+    from ..utils.peaks import PeakStream, call_peaks
+    from ..utils.sequence_io import (
+        NUCLEOTIDES, is_valid_sequence, iter_csv, iter_fasta, iter_records, open_text, sequence_suffix,
+    )
+    from ..utils.tracks import SIGNALS, TRACK_SUFFIX, BedGraphWriter, BinaryTrackWriter, iter_genome_tiles, position_signals
+    from ..utils.upstream import group_by_chrom, iter_genome_codes, read_gene_starts, upstream_windows, window_bounds
 except ImportError:  # pragma: no cover - allow direct execution
     import sys
     sys.path.append(str(Path(__file__).resolve().parents[1]))
     from utils.general_functions import *  # type: ignore
     from utils.model_functions import *  # type: ignore
-
-BASES = "acgt"
-LETTER_TO_INDEX = dict(zip(BASES, range(4)))
+    from utils.dedup import dedup_stats, unique_indices
+    from utils.encoding import IUPAC_CODES, MASKED, encode_batch, encode_sequence
+    from utils.length_buckets import plan_length_buckets, total_overhead
+    from utils.peaks import PeakStream, call_peaks
+    from utils.sequence_io import (
+        NUCLEOTIDES, is_valid_sequence, iter_csv, iter_fasta, iter_records, open_text, sequence_suffix,
+    )
+    from utils.tracks import SIGNALS, TRACK_SUFFIX, BedGraphWriter, BinaryTrackWriter, iter_genome_tiles, position_signals
+    from utils.upstream import group_by_chrom, iter_genome_codes, read_gene_starts, upstream_windows, window_bounds
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +59,8 @@ class BrickPlotter:
         min_value: float = -6,
         threshold: float = -2.5,
         is_prefix_suffix: bool = True,
+        n_policy: str = "reject",
+        max_candidates: int = 50,
     ) -> None:
         model_path = Path(model)
         if not model_path.is_file():
@@ -70,6 +86,13 @@ class BrickPlotter:
         self.min_value = min_value
         self.threshold = threshold
         self.is_prefix_suffix = is_prefix_suffix
+        self.max_candidates = max_candidates
+        # "mask" is not offered: masked codes cannot index the model matrices.
+        if n_policy not in ("reject", "random"):
+            raise ValueError(f"Unsupported N policy for scoring: {n_policy!r}")
+        self.n_policy = n_policy
+        self._alphabet = NUCLEOTIDES + IUPAC_CODES if n_policy == "random" else NUCLEOTIDES
+        self._rng = np.random.default_rng(0)
 
         self.default_value = self.max_value
         self.color_map = "hot"
@@ -80,50 +103,31 @@ class BrickPlotter:
         """Generate the brickplot bundle for a DNA sequence or file path."""
         try:
             input_path = Path(input_data)
-            if input_path.is_file():
-                file_ext = input_path.suffix.lower()
-                content = input_path.read_text(encoding="utf-8")
-                if file_ext == ".csv":
-                    sequences = self._process_csv(content)
-                elif file_ext in {".fasta", ".fna", ".ffn", ".faa"}:
-                    sequences = self._process_fasta(content)
-                else:
-                    raise ValueError(f"Unsupported file type: {file_ext}")
-                if not sequences:
+            try:
+                is_file = input_path.is_file()
+            except OSError:  # long sequences exceed the filename length limit
+                is_file = False
+            if is_file:
+                sequence = next(
+                    (seq for _, seq in iter_records(input_path) if is_valid_sequence(seq, self._alphabet)),
+                    None,
+                )
+                if sequence is None:
                     raise ValueError("No valid sequences found in file")
-                sequence = sequences[0]
             else:
                 sequence = input_data.upper().replace(" ", "")
 
-            if not re.fullmatch(r"[ACGTU]+", sequence):
+            if not is_valid_sequence(sequence, self._alphabet):
                 raise ValueError("Invalid characters in sequence")
 
-            numeric_sequence = np.array([LETTER_TO_INDEX[b.lower()] for b in sequence]).reshape(1, -1)
-
-            try:
-                brick_data = getBrickDict(
-                    {"sequence": numeric_sequence},
-                    self.model,
-                    dinucl=False,
-                    subtractChemPot=True,
-                    useChemPot="chem.pot",
-                    makeLengthConsistent=False,
-                )
-            except UnboundLocalError:
-                logger.warning("Chemical potential unavailable; regenerating without subtraction")
-                brick_data = getBrickDict(
-                    {"sequence": numeric_sequence},
-                    self.model,
-                    dinucl=False,
-                    subtractChemPot=False,
-                    useChemPot="chem.pot",
-                    makeLengthConsistent=False,
-                )
-
-            brick_matrix = np.asarray(brick_data.get("sequence", []), dtype=float)
+            brick_data = self._brick_dict(self._encode(sequence).reshape(1, -1), both_strands=True)
+            brick_matrix = np.asarray(brick_data["sequence"], dtype=float)
             if brick_matrix.size == 0:
                 logger.warning("Model returned an empty brick matrix; using fallback heatmap")
                 brick_matrix = self._fallback_matrix(len(sequence))
+                candidates = []
+            else:
+                candidates = self._candidates(brick_data, 0)
 
             brick_matrix = np.squeeze(brick_matrix)
             if brick_matrix.ndim == 1:
@@ -151,22 +155,16 @@ class BrickPlotter:
             buffer.seek(0)
             image_base64 = base64.b64encode(buffer.getvalue()).decode()
             plt.close()
+            thumbnail_base64 = base64.b64encode(self.render_thumbnail(brick_matrix)).decode()
 
-            stats = {
-                "min_energy": float(np.min(brick_matrix)),
-                "max_energy": float(np.max(brick_matrix)),
-                "mean_energy": float(np.mean(brick_matrix)),
-            }
-            best_positions = np.unravel_index(np.argmin(brick_matrix), brick_matrix.shape)
-            stats["best_position"] = {
-                "spacer_config": int(best_positions[0]),
-                "sequence_position": int(best_positions[1]),
-            }
+            stats = self._statistics(brick_matrix)
 
             return {
                 "image_base64": image_base64,
+                "thumbnail_base64": thumbnail_base64,
                 "matrix": brick_matrix.tolist(),
                 "statistics": stats,
+                "candidates": candidates,
                 "sequence_length": len(sequence),
                 "sequence": sequence,
             }
@@ -174,6 +172,522 @@ class BrickPlotter:
             logger.error("Error generating brickplot: %s", exc)
             raise
 
+    def score_batch(self, records, chunk_size: int = 512) -> dict:
+        """Score every ``(record_id, sequence)`` pair of an upload.
+
+        Valid sequences are grouped by length and each group goes through
+        ``getBrickDict`` as one ``(nSeq, L)`` array of at most ``chunk_size``
+        rows. ``records`` may be a generator over an upload that is still
+        arriving: a length group is scored as soon as it holds ``chunk_size``
+        sequences, and the remainder once the input ends. Every record gets
+        its own entry in ``records``; invalid or unscorable records carry an
+        ``error`` instead of results. No full-size figure is rendered per
+        record. Duplicate sequences are scored once and the result is copied
+        to every copy.
+        """
+        results: list = []
+        first_seen: dict = {}
+        copies = []
+        groups = defaultdict(list)
+        lengths = set()
+        valid = 0
+        for index, (record_id, sequence) in enumerate(records):
+            sequence = (sequence or "").upper().replace(" ", "")
+            if not is_valid_sequence(sequence, self._alphabet):
+                results.append({"id": record_id, "status": "error", "error": "Invalid characters in sequence"})
+                continue
+            results.append(None)
+            valid += 1
+            source = first_seen.setdefault(sequence.replace("U", "T"), index)
+            if source != index:
+                copies.append((index, record_id, sequence, source))
+                continue
+            lengths.add(len(sequence))
+            members = groups[len(sequence)]
+            members.append((index, record_id, sequence))
+            if len(members) >= chunk_size:
+                self._score_length_group(len(sequence), members, results)
+                groups[len(sequence)] = []
+        for length, members in groups.items():
+            if members:
+                self._score_length_group(length, members, results)
+
+        for index, record_id, sequence, source in copies:
+            results[index] = {**results[source], "id": record_id}
+            if "sequence" in results[source]:
+                results[index]["sequence"] = sequence
+
+        scored = [result for result in results if result["status"] == "completed"]
+        best = min(scored, key=lambda result: result["statistics"]["min_energy"], default=None)
+        return {
+            "mode": "batch",
+            "records": results,
+            "summary": {
+                "total": len(results),
+                "completed": len(scored),
+                "failed": len(results) - len(scored),
+                "lengthGroups": len(lengths),
+                "dedup": dedup_stats(valid, len(first_seen)),
+                "best": {"id": best["id"], "statistics": best["statistics"]} if best else None,
+            },
+            "thumbnail_base64": best["thumbnail_base64"] if best else None,
+        }
+
+    def _score_length_group(self, length: int, chunk: list, results: list) -> None:
+        """Score equal-length ``(index, record_id, sequence)`` members into ``results``."""
+        try:
+            numeric = encode_batch([sequence for _, _, sequence in chunk], self.n_policy, self._rng)
+            brick_data = self._brick_dict(numeric, both_strands=True)
+            bricks = np.asarray(brick_data["sequence"], dtype=float)
+            if bricks.size == 0:
+                raise ValueError("Sequence is shorter than the model footprint")
+        except Exception as exc:
+            logger.warning("Failed to score %d records of length %d: %s", len(chunk), length, exc)
+            for index, record_id, _ in chunk:
+                results[index] = {"id": record_id, "status": "error", "error": str(exc)}
+            return
+        for row, (index, record_id, sequence) in enumerate(chunk):
+            brick_matrix = self.remove_high_values(np.asarray(bricks[row], dtype=float))
+            results[index] = {
+                "id": record_id,
+                "status": "completed",
+                "sequence": sequence,
+                "sequence_length": length,
+                "statistics": self._statistics(brick_matrix),
+                "candidates": self._candidates(brick_data, row),
+                "thumbnail_base64": base64.b64encode(self.render_thumbnail(brick_matrix)).decode(),
+                "matrix": brick_matrix.tolist(),
+            }
+
+    def score_padded(self, dict_seqs, waste_tolerance: float = 0.1, max_batch: int = 512) -> dict:
+        """Score sequences through ``preprocess`` padding, one length bucket at a time.
+
+        Sequences are binned by ``plan_length_buckets`` so that no bucket
+        pads more than ``waste_tolerance`` beyond its members' own lengths,
+        and each bucket is padded with ``preprocess`` and scored as one
+        array. Each record's bricks are then trimmed to what an unbatched
+        ``preprocess`` at the sequence's own length would give, so row
+        ``r`` means the same thing for every record and the first base of
+        the sequence sits at padded position ``origin``. Without prefix and
+        suffix padding, only equal-length sequences share a bucket.
+        Duplicate sequences are scored once.
+        """
+        seq_ids = list(dict_seqs)
+        sequences = [dict_seqs[seq_id].lower().replace("u", "t") for seq_id in seq_ids]
+        results: list = [None] * len(seq_ids)
+        valid = []
+        for index, sequence in enumerate(sequences):
+            if is_valid_sequence(sequence, self._alphabet.lower()):
+                valid.append(index)
+            else:
+                results[index] = {"id": seq_ids[index], "status": "error", "error": "Invalid characters in sequence"}
+
+        representatives, inverse = unique_indices([sequences[index] for index in valid])
+        unique = [valid[position] for position in representatives]
+        if self.is_prefix_suffix:
+            flank, origin = 2 * self.shift + 39, self.shift + 5
+        else:
+            flank, origin, waste_tolerance = 0, 0, 0.0
+        buckets = plan_length_buckets(
+            [len(sequences[index]) for index in unique], flank=flank, waste_tolerance=waste_tolerance, max_batch=max_batch
+        )
+        reports = []
+        for bucket in buckets:
+            members = [unique[position] for position in bucket.indices]
+            numeric, _, _ = self.preprocess({index: sequences[index] for index in members}, bucket.max_length)
+            bricks = self._score_bricks(numeric)
+            for row, index in enumerate(members):
+                trim = bucket.max_length - len(sequences[index])
+                results[index] = {
+                    "id": seq_ids[index],
+                    "status": "completed",
+                    "sequence_length": len(sequences[index]),
+                    "origin": origin,
+                    "bricks": bricks[row, trim:],
+                }
+            reports.append(bucket.report())
+        for position, index in enumerate(valid):
+            source = unique[inverse[position]]
+            if source != index:
+                results[index] = {**results[source], "id": seq_ids[index]}
+        return {
+            "records": results,
+            "batches": reports,
+            "overhead": total_overhead(buckets),
+            "dedup": dedup_stats(len(valid), len(unique)),
+        }
+
+    def _encode(self, sequence: str) -> np.ndarray:
+        return encode_sequence(sequence, self.n_policy, self._rng)
+
+    def _score_bricks(self, numeric_sequences: np.ndarray) -> np.ndarray:
+        """Brick energies for an ``(nSeq, L)`` array, shaped ``(nSeq, Lbrick, nSpacer)``."""
+        brick_data = self._brick_dict(numeric_sequences)
+        return np.asarray(brick_data.get("sequence", []), dtype=float)
+
+    def _footprint(self) -> int:
+        """Bases covered by one brick row across all spacer configurations."""
+        n1, n2 = (matrix.shape[0] for matrix in self.model["matrices"])
+        return n1 + n2 + self.model["min.spacer"] + len(self.model["sp.penalties"]) - 1
+
+    def _candidates(self, brick_data, index: int, data_id: str = "sequence") -> list:
+        """Ranked promoter candidates of one row of ``_brick_dict(..., both_strands=True)`` output.
+
+        Peaks are called on the energies the plot shows, against the
+        request's ``threshold``; ``logPon`` applies ``en.scale`` and the
+        chemical potential of the model's first data id, like ``brick2lps``.
+        """
+        chem_pot = (self.model.get("chem.pot") or {}).get(self.model["DataIDs"][0], 0.0)
+        return call_peaks(
+            {"+": brick_data[data_id][index], "-": brick_data[data_id + "_rc"][index]},
+            self.threshold,
+            self._footprint(),
+            chem_pot=chem_pot,
+            limit=self.max_candidates,
+            scale=self.model.get("en.scale", 1.0),
+        )
+
+    def _brick_dict(self, numeric_sequences: np.ndarray, data_id: str = "sequence", both_strands: bool = False):
+        """``getBrickDict`` for one data id, subtracting its chemical potential when the model has one.
+
+        ``both_strands`` adds the ``_rc`` bricks even when the model was fitted without them.
+        """
+        chem_pot = self.model.get("chem.pot") or {}
+        # getBrickDict resolves the key exactly or by substring and fails only
+        # after scoring, so check up front rather than scoring twice.
+        subtract = data_id in chem_pot or any(data_id in key for key in chem_pot)
+        if not subtract:
+            logger.debug("Chemical potential unavailable for %s; scoring without subtraction", data_id)
+        return getBrickDict(
+            {data_id: numeric_sequences},
+            {**self.model, "includeRC": 1} if both_strands else self.model,
+            dinucl=False,
+            subtractChemPot=subtract,
+            useChemPot="chem.pot",
+            makeLengthConsistent=False,
+        )
+
+    def score_occupancy(
+        self, records, data_id: str | None = None, max_batch: int = 512, waste_tolerance: float = 0.0
+    ) -> dict:
+        """Log10 occupancy and strongest site for every ``(record_id, sequence)`` pair.
+
+        Records are binned by ``plan_length_buckets``; each bucket is padded
+        by ``preprocess`` to its longest member and scored as one array. The
+        leading rows the extra padding adds are trimmed from every record's
+        bricks before ``brick2lps``, so each record scores as if padded on
+        its own and results do not depend on how records are batched. A
+        ``waste_tolerance`` of 0 keeps exact-length buckets; larger values
+        trade padding for fewer, larger arrays (as in ``score_padded``).
+        Duplicate sequences are scored once. ``data_id`` picks the model's
+        chemical potential and threshold position (default: the first of
+        ``DataIDs``). Energies are reported in brick units; ``bestRow`` and
+        ``bestSpacer`` index the record's own padded brick matrix.
+        """
+        data_id = data_id or self.model["DataIDs"][0]
+        records = list(records)
+        results: list = [None] * len(records)
+        valid, sequences = [], []
+        for index, (record_id, sequence) in enumerate(records):
+            sequence = (sequence or "").lower().replace(" ", "").replace("u", "t")
+            if is_valid_sequence(sequence, self._alphabet.lower()):
+                valid.append(index)
+                sequences.append(sequence)
+            else:
+                results[index] = {"id": record_id, "status": "error", "error": "Invalid characters in sequence"}
+
+        representatives, inverse = unique_indices(sequences)
+        flank = 2 * self.shift + 39 if self.is_prefix_suffix else 0
+        if not self.is_prefix_suffix:
+            waste_tolerance = 0.0  # unpadded rows cannot be aligned by trimming
+        buckets = plan_length_buckets(
+            [len(sequences[position]) for position in representatives],
+            flank=flank,
+            waste_tolerance=waste_tolerance,
+            max_batch=max_batch,
+        )
+        for bucket in buckets:
+            members = [representatives[slot] for slot in bucket.indices]
+            try:
+                numeric, _, _ = self.preprocess({position: sequences[position] for position in members}, bucket.max_length)
+                scores = self._occupancy(numeric, data_id, trims=[bucket.max_length - len(sequences[position]) for position in members])
+            except Exception as exc:
+                logger.warning("Failed to score %d records of length %d: %s", len(members), bucket.max_length, exc)
+                for position in members:
+                    index = valid[position]
+                    results[index] = {"id": records[index][0], "status": "error", "error": str(exc)}
+                continue
+            for position, score in zip(members, scores):
+                index = valid[position]
+                results[index] = {
+                    "id": records[index][0],
+                    "status": "completed",
+                    "sequence_length": len(sequences[position]),
+                    **score,
+                }
+
+        for position, index in enumerate(valid):
+            source = valid[representatives[inverse[position]]]
+            if source != index:
+                results[index] = {**results[source], "id": records[index][0]}
+        return {
+            "records": results,
+            "batches": [bucket.report() for bucket in buckets],
+            "overhead": total_overhead(buckets),
+            "dedup": dedup_stats(len(valid), len(representatives)),
+        }
+
+    def _occupancy(self, numeric_sequences: np.ndarray, data_id: str, trims=None) -> list:
+        """``logPon`` and strongest site (energy, row, spacer, strand) for each row of an ``(nSeq, L)`` array.
+
+        ``trims`` drops that many leading brick rows of each sequence first,
+        e.g. the extra prefix of a record padded to a longer bucket.
+        """
+        brick_data = self._brick_dict(numeric_sequences, data_id)
+        if brick_data[data_id].size == 0:
+            raise ValueError("Sequence is shorter than the model footprint")
+        if trims is None or not any(trims):
+            return self._occupancy_of_bricks(brick_data, data_id)
+        trims = np.asarray(trims)
+        scores: list = [None] * len(trims)
+        for trim in np.unique(trims):
+            rows = np.flatnonzero(trims == trim)
+            group = {key: value[rows, trim:] for key, value in brick_data.items()}
+            for row, score in zip(rows, self._occupancy_of_bricks(group, data_id)):
+                scores[row] = score
+        return scores
+
+    def _occupancy_of_bricks(self, brick_data: dict, data_id: str) -> list:
+        scale = self.model.get("en.scale", 1.0)
+        log_pon = brick2lps({key: value * scale for key, value in brick_data.items()}, self.model)[data_id]
+
+        strands = [("+", brick_data[data_id])]
+        if data_id + "_rc" in brick_data:
+            strands.append(("-", brick_data[data_id + "_rc"]))
+        best = []
+        for strand, bricks in strands:
+            flat = bricks.reshape(len(bricks), -1)
+            cells = np.argmin(flat, axis=1)
+            best.append((strand, flat[np.arange(len(flat)), cells], cells, bricks.shape[2]))
+        scores = []
+        for row in range(len(log_pon)):
+            strand, energies, cells, n_spacer = min(best, key=lambda item: item[1][row])
+            scores.append({
+                "logPon": float(log_pon[row]),
+                "bestEnergy": float(energies[row]),
+                "bestRow": int(cells[row] // n_spacer),
+                "bestSpacer": int(cells[row] % n_spacer),
+                "bestStrand": strand,
+            })
+        return scores
+
+    def score_upstream(self, genome, genes, upstream: int = 100, data_id: str | None = None, chunk_size: int = 4096) -> dict:
+        """Log10 occupancy and strongest site of the upstream region of every gene.
+
+        ``genome`` is a FASTA (plain or gzipped) or ``.2bp`` path; ``genes``
+        is a list of ``GeneStart`` or a GFF3/GTF/BED path. Each window holds
+        ``upstream`` bases before the gene start on the gene's strand, plus
+        the flanks ``preprocess`` would add (``shift + 5`` before, ``34 +
+        shift`` after) taken from the genome instead of ``g`` padding, so
+        ``bestRow`` and threshold positions mean what they do for uploads.
+        Windows are cut from strided views of one chromosome at a time
+        (``utils/upstream.py``) and scored ``chunk_size`` rows per
+        ``getBrickDict``/``brick2lps`` call. Genes whose window leaves the
+        chromosome or covers an ``N`` get an ``error`` row.
+        """
+        if not isinstance(genes, list):
+            genes = read_gene_starts(genes)
+        data_id = data_id or self.model["DataIDs"][0]
+        before, after = (upstream + self.shift + 5, 34 + self.shift) if self.is_prefix_suffix else (upstream, 0)
+
+        results: list = []
+        for gene in genes:
+            window_start, window_end = window_bounds(gene, before, after)
+            results.append({
+                "gene": gene.name,
+                "chrom": gene.chrom,
+                "strand": gene.strand,
+                "start": gene.start,
+                "windowStart": window_start,
+                "windowEnd": window_end,
+                "status": "error",
+                "error": f"Chromosome {gene.chrom} not found in genome",
+            })
+        groups = group_by_chrom(genes)
+        for chrom, codes in iter_genome_codes(genome, groups):
+            members = np.asarray(groups[chrom])
+            batch, inside = upstream_windows(
+                codes,
+                np.array([genes[index].start for index in members]),
+                np.array([genes[index].strand == "-" for index in members]),
+                before,
+                after,
+            )
+            for index in members[~inside]:
+                results[index]["error"] = "Upstream window leaves the chromosome or contains ambiguous bases"
+            rows = np.flatnonzero(inside)
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                try:
+                    scores = self._occupancy(batch[chunk], data_id)
+                except Exception as exc:
+                    logger.warning("Failed to score %d upstream windows on %s: %s", len(chunk), chrom, exc)
+                    for row in chunk:
+                        results[members[row]]["error"] = str(exc)
+                    continue
+                for row, score in zip(chunk, scores):
+                    result = results[members[row]]
+                    del result["error"]
+                    result.update(status="completed", **score)
+
+        completed = sum(result["status"] == "completed" for result in results)
+        return {
+            "genes": results,
+            "summary": {"total": len(results), "completed": completed, "failed": len(results) - completed, "windowLength": before + after},
+        }
+
+    def scan_tracks(
+        self,
+        genome,
+        out_prefix,
+        signals=SIGNALS,
+        formats=("bedGraph", "binary"),
+        data_id: str | None = None,
+        tile: int = 65536,
+        row_block: int = 256,
+        peak_threshold: float | None = None,
+    ) -> dict:
+        """Write per-position binding tracks for a whole genome (see ``utils/tracks.py``).
+
+        Every chromosome of ``genome`` (FASTA, bgzip FASTA or ``.2bp``) is
+        scored on both strands in tiles of ``tile`` brick rows. Each tile is
+        reduced over spacers and strands to the requested ``signals`` and
+        handed to the writers, so memory is bounded by the tile size and not
+        by the chromosome. Writes ``<out_prefix>.<signal>.bedGraph`` and/or
+        ``<out_prefix>.<signal>.trk`` and returns the paths with per-run counts.
+        With ``peak_threshold`` (in the same units as the tracks), promoter
+        candidates are called tile by tile (``utils/peaks.py``) and written to
+        ``<out_prefix>.peaks.bed`` in position order, with the energy as score
+        and the spacer and ``logPon`` as extra columns.
+        """
+        data_id = data_id or self.model["DataIDs"][0]
+        scale = self.model.get("en.scale", 1.0)
+        footprint = self._footprint()
+        out_prefix = Path(out_prefix)
+        out_prefix.parent.mkdir(parents=True, exist_ok=True)
+        writers: dict = {}
+        for signal in signals:
+            if "bedGraph" in formats:
+                writers[(signal, "bedGraph")] = BedGraphWriter(f"{out_prefix}.{signal}.bedGraph", name=f"{out_prefix.name}.{signal}")
+            if "binary" in formats:
+                writers[(signal, "binary")] = BinaryTrackWriter(f"{out_prefix}.{signal}{TRACK_SUFFIX}")
+        peaks = PeakStream(peak_threshold, footprint) if peak_threshold is not None else None
+        peak_path = Path(f"{out_prefix}.peaks.bed")
+        peak_file = peak_path.open("w") if peaks is not None else None
+
+        chroms = positions = peak_count = 0
+        try:
+            for chrom, length, tiles in iter_genome_tiles(genome, tile, footprint):
+                for writer in writers.values():
+                    writer.begin(chrom, length)
+                written = 0
+                for first_row, codes in tiles:
+                    # Row r covers bases r+1..r+footprint on the forward strand
+                    # and r..r+footprint-1 on the reverse one.
+                    masked = np.concatenate(([0], np.cumsum(codes == MASKED)))
+                    rows = len(codes) - footprint
+                    covered = masked[footprint + 1: footprint + 1 + rows] == masked[:rows]
+                    # slideSingleMatrix loops over window offsets, so the tile
+                    # is scored as a (blocks, row_block + footprint) strided
+                    # batch of overlapping pieces rather than one long row.
+                    blocks = -(-rows // row_block)
+                    padded = np.zeros(blocks * row_block + footprint, dtype=np.int8)
+                    padded[: len(codes)] = np.where(codes == MASKED, 0, codes)
+                    batch = np.lib.stride_tricks.sliding_window_view(padded, row_block + footprint)[::row_block]
+                    brick_data = self._brick_dict(batch, data_id, both_strands=True)
+                    strand_bricks = {
+                        strand: brick_data[key].reshape(-1, brick_data[key].shape[2])[:rows] * scale
+                        for strand, key in (("+", data_id), ("-", data_id + "_rc"))
+                    }
+                    values = position_signals(list(strand_bricks.values()), covered)
+                    if peaks is not None:
+                        for bricks in strand_bricks.values():
+                            bricks[~covered] = np.nan
+                        peaks.push(strand_bricks)
+                    gap = first_row + 1 - written
+                    for (signal, _), writer in writers.items():
+                        if gap:
+                            writer.write(np.full(gap, np.nan))
+                        writer.write(values[signal])
+                    written = first_row + 1 + rows
+                    positions += int(covered.sum())
+                for writer in writers.values():
+                    writer.end()
+                if peaks is not None:
+                    calls = sorted(peaks.finish(), key=lambda call: call["start"])
+                    peak_file.write("".join(
+                        f"{chrom}\t{call['start']}\t{call['end']}\t{chrom}.{call['rank']}\t{call['energy']:.3f}\t"
+                        f"{call['strand']}\t{call['spacer']}\t{call['logPon']:.3f}\n"
+                        for call in calls
+                    ))
+                    peak_count += len(calls)
+                chroms += 1
+        finally:
+            for writer in writers.values():
+                writer.close()
+            if peak_file is not None:
+                peak_file.close()
+        files = {f"{signal}.{kind}": str(writer.path) for (signal, kind), writer in writers.items()}
+        result = {"files": files, "chromosomes": chroms, "positions": positions, "footprint": footprint}
+        if peaks is not None:
+            files["peaks.bed"] = str(peak_path)
+            result["peaks"] = peak_count
+        return result
+
+    @staticmethod
+    def _statistics(brick_matrix: np.ndarray) -> dict:
+        stats = {
+            "min_energy": float(np.min(brick_matrix)),
+            "max_energy": float(np.max(brick_matrix)),
+            "mean_energy": float(np.mean(brick_matrix)),
+        }
+        best_positions = np.unravel_index(np.argmin(brick_matrix), brick_matrix.shape)
+        stats["best_position"] = {
+            "spacer_config": int(best_positions[0]),
+            "sequence_position": int(best_positions[1]),
+        }
+        return stats
+
+    def render_thumbnail(self, brick_matrix, width: int = 256, colors: int = 16) -> bytes:
+        """Render a small palette PNG preview straight from the brick matrix.
+
+        Positions run left to right and spacer configurations top to bottom,
+        coloured with the same colormap and value range as the full plot.
+        """
+        matrix = np.asarray(brick_matrix, dtype=float)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis, :]
+        matrix = matrix.T  # (positions, spacers) -> (spacers, positions)
+        if matrix.shape[1] > width:
+            # Keep the strongest (lowest) energy of each pixel column so
+            # binding sites survive the downsampling.
+            edges = np.linspace(0, matrix.shape[1], width + 1).astype(int)[:-1]
+            matrix = np.minimum.reduceat(matrix, edges, axis=1)
+
+        span = self.max_value - self.min_value
+        scaled = (np.clip(matrix, self.min_value, self.max_value) - self.min_value) / (span or 1.0)
+        levels = np.rint(np.nan_to_num(scaled, nan=1.0) * (colors - 1)).astype(np.uint8)
+
+        palette = (plt.get_cmap(self.color_map, colors)(np.arange(colors))[:, :3] * 255).astype(np.uint8)
+        image = Image.fromarray(levels, mode="P")
+        image.putpalette(palette.ravel().tolist())
+
+        height = int(np.clip(matrix.shape[0] * 8, 16, 64))
+        image = image.resize((min(width, max(matrix.shape[1], 1) * 4), height), Image.NEAREST)
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
     def preprocess(self, dict_seqs, max_seq_len):
         """Unify sequences to a fixed length and encode them numerically."""
         unified_seqs_dict = {}
@@ -186,9 +700,7 @@ class BrickPlotter:
                 unified_seqs_dict[seq_id] = seq.lower()
 
         seq_ids = list(unified_seqs_dict.keys())
-        num_unified_seqs = np.array(
-            [np.array([LETTER_TO_INDEX[l] for l in s]) for s in unified_seqs_dict.values()]
-        )
+        num_unified_seqs = encode_batch(list(unified_seqs_dict.values()), self.n_policy, self._rng)
         return num_unified_seqs, seq_ids, unified_seqs_dict
 
     def remove_high_values(self, brick_in):
@@ -204,63 +716,18 @@ class BrickPlotter:
 
 
     def _read_fasta_like(self, filepath):
-        """Shared reader for FASTA-style files (.fasta/.fna/.ffn/.faa)."""
-        dict_seqs = {}
-        max_seq_len = 0
-        current_id = None
-        with open(filepath, 'r') as handle:
-            for raw_line in handle:
-                line = raw_line.strip()
-                if not line:
-                    continue
-                if line.startswith('>'):
-                    current_id = line.strip('>').strip()
-                    dict_seqs.setdefault(current_id, '')
-                else:
-                    seq = line.strip('"').strip()
-                    if not seq:
-                        continue
-                    if self.is_rc:
-                        seq = str(Seq(seq).reverse_complement())
-                    dict_seqs[current_id] = dict_seqs.get(current_id, '') + seq
-                    if max_seq_len < len(dict_seqs[current_id]):
-                        max_seq_len = len(dict_seqs[current_id])
-        return dict_seqs, max_seq_len
-
-    def _process_csv(self, content: str) -> list[str]:
-        sequences: list[str] = []
-        reader = csv.DictReader(StringIO(content))
-        for row in reader:
-            seq = (row.get("sequence") or "").upper().replace(" ", "")
-            if seq and re.fullmatch(r"[ACGTU]+", seq):
-                sequences.append(seq)
-        return sequences
-
-    def _process_fasta(self, content: str) -> list[str]:
-        sequences: list[str] = []
-        current: list[str] = []
-        for line in content.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith(">"):
-                if current:
-                    seq = "".join(current).upper()
-                    if re.fullmatch(r"[ACGTU]+", seq):
-                        sequences.append(seq)
-                    current = []
-            else:
-                current.append(line.upper().replace(" ", ""))
-        if current:
-            seq = "".join(current).upper()
-            if re.fullmatch(r"[ACGTU]+", seq):
-                sequences.append(seq)
-        return sequences
+        """Shared reader for FASTA-style files (.fasta/.fa/.fna/.ffn/.faa, optionally gzipped)."""
+        dict_seqs: dict[str, str] = {}
+        with open_text(filepath) as handle:
+            for seq_id, seq in iter_fasta(handle, rc=self.is_rc):
+                # Repeated headers are concatenated, as before.
+                dict_seqs[seq_id] = dict_seqs[seq_id] + seq if seq_id in dict_seqs else seq
+        return dict_seqs, max(map(len, dict_seqs.values()), default=0)
 
     def read_sequence_file(self, filepath):
-        filetype = Path(filepath).suffix.lower().lstrip('.')
+        filetype = sequence_suffix(filepath).lstrip('.')  # genome.fa.gz reads as fa
         match filetype:
-            case "fasta":
+            case "fasta" | "fa":
                 return self.read_fasta(filepath)
             case "csv":
                 return self.read_csv(filepath)
@@ -270,6 +737,8 @@ class BrickPlotter:
                 return self.read_ffn(filepath)
             case "faa":
                 return self.read_faa(filepath)
+            case "2bp":
+                return self.read_packed(filepath)
             case _:
                 logger.error("Filetype not supported: %s", filetype)
                 return {}, 0
@@ -279,20 +748,9 @@ class BrickPlotter:
         return self._read_fasta_like(fasta_filepath)
 
     def read_csv(self, csv_filepath):
-        dict_seqs: dict[str, str] = {}
-        max_seq_len = 0
-        with open(csv_filepath, "r") as handle:
-            for line in handle:
-                parts = line.strip().split(",")
-                if len(parts) != 2:
-                    continue
-                seq_id, seq = parts
-                seq = seq.strip()
-                if self.is_rc:
-                    seq = str(Seq(seq).reverse_complement())
-                dict_seqs[seq_id] = seq
-                max_seq_len = max(max_seq_len, len(seq))
-        return dict_seqs, max_seq_len
+        with open_text(csv_filepath) as handle:
+            dict_seqs = dict(iter_csv(handle, rc=self.is_rc))
+        return dict_seqs, max(map(len, dict_seqs.values()), default=0)
 
     def read_fna(self, fna_filepath):
         ''' Read FASTA Nucleic Acids file '''
@@ -306,3 +764,8 @@ class BrickPlotter:
         ''' Read FASTA Amino Acids file '''
         return self._read_fasta_like(faa_filepath)
 
+    def read_packed(self, packed_filepath):
+        ''' Read a 2-bit packed store (see utils/packed_store.py) '''
+        dict_seqs = dict(iter_records(packed_filepath, rc=self.is_rc))
+        return dict_seqs, max(map(len, dict_seqs.values()), default=0)
+
@@ -0,0 +1,112 @@
+"""Throughput of the shared FASTA/CSV parser on synthetic input.
+
+Generates a multi-line FASTA (genome-like long records) and a CSV library
+in memory, then reports parse throughput in MB/s::
+
+    python tests/benchmark_sequence_io.py --records 20000 --length 5000
+
+It also times encoding a ``--genome-mb`` sequence to base indices.
+``--legacy`` adds the previous per-line string concatenation reader and
+per-character dict encoder for comparison; the reader is quadratic in
+record length, so keep ``--length`` modest when using it.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Tuple
+
+import numpy as np
+
+try:
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.sequence_io import is_valid_sequence, iter_csv, iter_fasta
+except ModuleNotFoundError:  # pragma: no cover - allow running from repo root
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.sequence_io import is_valid_sequence, iter_csv, iter_fasta
+
+
+def synthetic_fasta(records: int, length: int, line_width: int = 60, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    out = io.StringIO()
+    for index in range(records):
+        sequence = bases[rng.integers(0, 4, length)].tobytes().decode("ascii")
+        out.write(f">seq{index}\n")
+        for start in range(0, length, line_width):
+            out.write(sequence[start:start + line_width])
+            out.write("\n")
+    return out.getvalue()
+
+
+def synthetic_csv(records: int, length: int, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    rows = ["id,sequence"]
+    rows.extend(f"seq{index},{bases[rng.integers(0, 4, length)].tobytes().decode('ascii')}" for index in range(records))
+    return "\n".join(rows) + "\n"
+
+
+def legacy_fasta(text: str) -> Dict[str, str]:
+    """The per-line concatenation reader this parser replaced."""
+    dict_seqs: Dict[str, str] = {}
+    current_id = None
+    for raw_line in io.StringIO(text):
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith(">"):
+            current_id = line.strip(">").strip()
+            dict_seqs.setdefault(current_id, "")
+        else:
+            dict_seqs[current_id] = dict_seqs.get(current_id, "") + line
+    return dict_seqs
+
+
+def _time(label: str, text: str, parse: Callable[[str], Iterable[Tuple[str, str]]]) -> None:
+    started = time.perf_counter()
+    count = sum(1 for _ in parse(text))
+    elapsed = time.perf_counter() - started
+    megabytes = len(text) / 2**20
+    print(f"{label:<28} {count:>8} records  {megabytes:8.1f} MB  {elapsed:7.3f}s  {megabytes / elapsed:8.1f} MB/s")
+
+
+def _time_encoding(megabases: float, legacy: bool) -> None:
+    genome = synthetic_fasta(1, int(megabases * 1e6), line_width=int(megabases * 1e6))
+    sequence = genome.split("\n", 1)[1].strip()
+    encoders = [("encode (lookup table)", encode_sequence)]
+    if legacy:
+        lookup = dict(zip("acgt", range(4)))
+        encoders.append(("encode (dict, legacy)", lambda seq: np.array([lookup[b] for b in seq.lower()])))
+    for label, encode in encoders:
+        started = time.perf_counter()
+        encode(sequence)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<28} {len(sequence) / 1e6:8.1f} Mb  {elapsed:7.3f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the streaming sequence parser")
+    parser.add_argument("--records", type=int, default=2000, help="Records per synthetic file")
+    parser.add_argument("--length", type=int, default=5000, help="Bases per record")
+    parser.add_argument("--genome-mb", type=float, default=5.0, help="Megabases of the encoding benchmark sequence")
+    parser.add_argument("--legacy", action="store_true", help="Also time the old concatenating reader and dict encoder")
+    args = parser.parse_args()
+
+    fasta = synthetic_fasta(args.records, args.length)
+    csv_text = synthetic_csv(args.records, args.length)
+    _time("fasta", fasta, iter_fasta)
+    _time("fasta + validate", fasta, lambda text: (r for r in iter_fasta(text) if is_valid_sequence(r[1])))
+    _time("fasta + reverse complement", fasta, lambda text: iter_fasta(text, rc=True))
+    _time("csv", csv_text, iter_csv)
+    if args.legacy:
+        _time("fasta (legacy)", fasta, lambda text: legacy_fasta(text).items())
+    _time_encoding(args.genome_mb, args.legacy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Convert a FASTA/CSV sequence file to the 2-bit packed ``.2bp`` store.
+
+    python tests/pack_sequences.py genome.fasta genome.2bp
+
+The packed file is read by ``BrickPlotter.read_sequence_file`` and
+``tests/score_library.py`` like any other input, without re-parsing.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+try:
+    from functions.utils.sequence_io import convert_to_packed
+except ModuleNotFoundError:  # pragma: no cover - allow running from repo root
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.sequence_io import convert_to_packed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack a FASTA/CSV file into a .2bp sequence store")
+    parser.add_argument("input", help="FASTA or CSV (with a sequence column) file")
+    parser.add_argument("output", help="Target .2bp file")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    counts = convert_to_packed(args.input, args.output)
+    source, target = Path(args.input).stat().st_size, Path(args.output).stat().st_size
+    print(
+        f"[pack_sequences] {counts['records']} records, {counts['bases']} bases in "
+        f"{time.monotonic() - started:.1f}s; {source} -> {target} bytes",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 from __future__ import annotations
 
 import argparse
+import base64
+import io
 import os
 os.environ.setdefault('THERMOTERS_FORCE_FIREBASE_ADMIN_STUBS', '1')
 os.environ.setdefault('THERMOTERS_FORCE_FUNCTIONS_STUBS', '1')
@@ -25,6 +27,7 @@ class LocalRequest:
         self.headers = headers or {}
         self.auth = None
         self.args: Dict[str, Any] = {}
+        self.stream: Any = None
 
     def get_json(self) -> Dict[str, Any]:
         return self._payload
@@ -58,6 +61,19 @@ def _extract_body(response: Any) -> Any:
     return payload
 
 
+def _multipart_request(payload: Dict[str, Any], path: Path, headers: Dict[str, str]) -> LocalRequest:
+    """Send the options as a ``payload`` part and the file as-is, the way a FormData upload arrives."""
+    boundary = "thermoters-manual-trigger"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"payload\"\r\n\r\n{json.dumps(payload)}\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{path.name}\"\r\n"
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + path.read_bytes() + f"\r\n--{boundary}--\r\n".encode()
+    request = LocalRequest({}, headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"})
+    request.stream = io.BytesIO(body)
+    return request
+
+
 def run_submit_job(args: argparse.Namespace) -> None:
     sequence = args.sequence
     payload: Dict[str, Any] = {
@@ -70,25 +86,38 @@ def run_submit_job(args: argparse.Namespace) -> None:
         sequence_path = Path(args.sequence_file)
         if not sequence_path.is_file():
             raise FileNotFoundError(f"Sequence file not found: {sequence_path}")
-        content = sequence_path.read_text()
         suffix = sequence_path.suffix.lower()
-        if suffix in {".fasta", ".fna", ".ffn", ".faa", ".csv"}:
-            payload["fileContent"] = content
+        if suffix in {".gz", ".bgz"}:
+            # Compressed uploads travel base64-encoded inside the JSON body.
+            payload["fileContent"] = base64.b64encode(sequence_path.read_bytes()).decode("ascii")
+            payload["fileName"] = sequence_path.name
+        elif suffix in {".fasta", ".fa", ".fna", ".ffn", ".faa", ".csv"}:
+            payload["fileContent"] = sequence_path.read_text()
             payload["fileName"] = sequence_path.name
         else:
-            sequence = content.strip()
+            sequence = sequence_path.read_text().strip()
 
     if sequence:
         payload["sequence"] = sequence
 
     if "sequence" not in payload and "fileContent" not in payload:
         raise ValueError("A sequence or --sequence-file must be provided")
+    if args.run_async:
+        payload["async"] = True
+    if args.batch:
+        payload["batch"] = True
     headers = {"X-Test-Auth": "true", "Authorization": f"Bearer {args.token}"}
-    request = LocalRequest(payload, headers=headers)
+    if args.multipart and "fileContent" in payload:
+        del payload["fileContent"], payload["fileName"]
+        request = _multipart_request(payload, Path(args.sequence_file), headers)
+    else:
+        request = LocalRequest(payload, headers=headers)
     response = main.submit_job(request)
     body = _extract_body(response)
     if isinstance(body, dict) and isinstance(body.get("brickplot"), dict):
         brickplot = dict(body["brickplot"])
+        if isinstance(brickplot.get("records"), list) and len(brickplot["records"]) > 5:
+            brickplot["records"] = brickplot["records"][:5] + [f"... ({len(brickplot['records']) - 5} more)"]
         image_value = brickplot.get("image_base64")
         if isinstance(image_value, str) and len(image_value) > 50:
             brickplot["image_base64"] = image_value[:50] + "... (truncated)"
@@ -96,6 +125,20 @@ def run_submit_job(args: argparse.Namespace) -> None:
         body["brickplot"] = brickplot
     print(f"status={_extract_status(response)}")
     print(json.dumps(body, indent=2, default=str))
+    if args.run_async and isinstance(body, dict) and body.get("jobId"):
+        # The worker pool lives in this process; wait for it before exiting.
+        main._get_job_queue().join()
+        status_request = LocalRequest({"jobId": body["jobId"]}, headers=headers)
+        status_response = main.get_job_status(status_request)
+        print(f"status={_extract_status(status_response)}")
+        print(json.dumps(_extract_body(status_response), indent=2, default=str))
+
+
+def run_get_job_status(args: argparse.Namespace) -> None:
+    headers = {"X-Test-Auth": "true", "Authorization": f"Bearer {args.token}"}
+    response = main.get_job_status(LocalRequest({"jobId": args.job_id}, headers=headers))
+    print(f"status={_extract_status(response)}")
+    print(json.dumps(_extract_body(response), indent=2, default=str))
 
 
 def run_get_job_history(args: argparse.Namespace) -> None:
@@ -104,6 +147,14 @@ def run_get_job_history(args: argparse.Namespace) -> None:
     request.args = {}
     if args.user_id:
         request.args['userId'] = args.user_id
+    if args.limit:
+        request.args['limit'] = args.limit
+    if args.start_after:
+        request.args['startAfter'] = args.start_after
+    if args.include:
+        request.args['include'] = args.include
+    if args.since:
+        request.args['since'] = args.since
     response = main.get_job_history(request)
     print(f"status={_extract_status(response)}")
     print(json.dumps(_extract_body(response), indent=2, default=str))
@@ -127,7 +178,7 @@ def build_parser() -> argparse.ArgumentParser:
 
     submit = sub.add_parser("submit-job", help="Invoke submit_job locally")
     submit.add_argument("sequence", nargs="?", help="DNA sequence to evaluate")
-    submit.add_argument("--sequence-file", help="Path to a sequence file (txt/fasta/csv)")
+    submit.add_argument("--sequence-file", help="Path to a sequence file (txt/fasta/csv, optionally .gz)")
     submit.add_argument("--job-title", default="manual-test", help="Job title/document id")
     submit.add_argument(
         "--model",
@@ -135,10 +186,22 @@ def build_parser() -> argparse.ArgumentParser:
         help="Path to the model file (defaults to repository model)",
     )
     submit.add_argument("--token", default="local-test-token", help="Mock bearer token")
+    submit.add_argument("--batch", action="store_true", help="Score every record of --sequence-file")
+    submit.add_argument("--async", dest="run_async", action="store_true", help="Queue the job and poll its status")
+    submit.add_argument("--multipart", action="store_true", help="Upload --sequence-file as multipart/form-data")
     submit.set_defaults(func=run_submit_job)
 
+    status = sub.add_parser("get-job-status", help="Poll the status of one job")
+    status.add_argument("job_id", help="Job id returned by submit-job")
+    status.add_argument("--token", default="local-test-token", help="Mock bearer token")
+    status.set_defaults(func=run_get_job_status)
+
     history = sub.add_parser("get-job-history", help="Fetch job history for a user")
     history.add_argument("--user-id", help="Target user ID (defaults to the authenticated user)")
+    history.add_argument("--limit", type=int, help="Page size")
+    history.add_argument("--start-after", help="Job id of the last entry on the previous page")
+    history.add_argument("--include", help="Comma-separated heavy fields to return (brickplot,sequence)")
+    history.add_argument("--since", help="Watermark from a previous response; returns only changed jobs")
     history.add_argument("--token", default="local-test-token", help="Mock bearer token")
     history.set_defaults(func=run_get_job_history)
 
@@ -0,0 +1,55 @@
+"""Scan a whole genome and write per-position binding tracks.
+
+    python tests/scan_tracks.py genome.fasta tracks/genome --formats bedGraph binary
+
+The genome may be FASTA (plain, gzipped or bgzipped) or a packed ``.2bp``
+store. One file is written per signal and format, e.g.
+``tracks/genome.minEnergy.bedGraph`` and ``tracks/genome.pon.trk``; see
+``utils/tracks.py`` for the signals and the binary layout.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.tracks import SIGNALS
+except ModuleNotFoundError:  # pragma: no cover - allow running from repo root
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.tracks import SIGNALS
+
+DEFAULT_MODEL = Path(__file__).resolve().parents[1] / "models" / "fitted_on_Pr" / "model_[3]_stm+flex+cumul+rbs.dmp"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write genome-wide binding tracks")
+    parser.add_argument("genome", help="Genome FASTA (plain, gzipped or bgzipped) or packed .2bp file")
+    parser.add_argument("out_prefix", help="Output path prefix; files are <prefix>.<signal>.<format>")
+    parser.add_argument("--signals", nargs="+", choices=SIGNALS, default=list(SIGNALS), help="Signals to write (default: all)")
+    parser.add_argument("--formats", nargs="+", choices=("bedGraph", "binary"), default=["bedGraph", "binary"])
+    parser.add_argument("--tile", type=int, default=65536, help="Brick rows scored per tile (default 65536)")
+    parser.add_argument("--model", default=str(DEFAULT_MODEL), help="Path to the model file")
+    parser.add_argument("--data-id", help="Model data id for the chemical potential (default: first DataID)")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    plotter = BrickPlotter(model=args.model, output_folder=tempfile.gettempdir())
+    result = plotter.scan_tracks(
+        args.genome, args.out_prefix, signals=args.signals, formats=args.formats, data_id=args.data_id, tile=args.tile
+    )
+    print(
+        f"[scan_tracks] {result['positions']} positions on {result['chromosomes']} chromosomes "
+        f"in {time.monotonic() - started:.1f}s",
+        file=sys.stderr,
+    )
+    for path in result["files"].values():
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
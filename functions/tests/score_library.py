@@ -0,0 +1,278 @@
+"""Offline library-scale scoring of FASTA/CSV promoter libraries.
+
+Streams records from the input, scores them in chunks sized to a memory
+budget across worker processes, and writes per-record log10 occupancy and
+strongest sites as columnar part files under an output directory::
+
+    python tests/score_library.py library.fasta out/ --workers 8 --memory-mb 4096
+
+Within a chunk, records of similar length are padded to a shared length and
+scored together as long as that adds at most ``--waste-tolerance`` padding
+(``BrickPlotter.score_occupancy``); the scores are the same as for
+exact-length batches, and each part's padding overhead is kept in the manifest.
+
+``out/manifest.json`` records finished parts, so an interrupted run picks up
+where it stopped when re-run with the same arguments. Once every part is
+written they are merged into ``out/scores.parquet`` (with pyarrow) or
+``out/scores.npz``.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover - parquet output is optional
+    pa = pq = None
+
+try:
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.sequence_io import iter_records
+except ModuleNotFoundError:  # pragma: no cover - allow running from repo root
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.sequence_io import iter_records
+
+DEFAULT_MODEL = Path(__file__).resolve().parents[1] / "models" / "fitted_on_Pr" / "model_[3]_stm+flex+cumul+rbs.dmp"
+COLUMNS = ("id", "status", "length", "logPon", "bestEnergy", "bestRow", "bestSpacer", "bestStrand", "error")
+MANIFEST = "manifest.json"
+
+_PLOTTER: Optional[BrickPlotter] = None
+_DATA_ID: Optional[str] = None
+_WASTE_TOLERANCE = 0.0
+
+
+def _make_plotter(args: argparse.Namespace) -> BrickPlotter:
+    return BrickPlotter(
+        model=args.model,
+        output_folder=tempfile.gettempdir(),
+        is_plus_one=not args.no_plus_one,
+        is_prefix_suffix=not args.no_prefix_suffix,
+    )
+
+
+def _init_worker(args: argparse.Namespace) -> None:
+    global _PLOTTER, _DATA_ID, _WASTE_TOLERANCE
+    _PLOTTER = _make_plotter(args)
+    _DATA_ID = args.data_id
+    _WASTE_TOLERANCE = args.waste_tolerance
+
+
+def _score_chunk(index: int, chunk: List[Tuple[str, str]]) -> Tuple[int, Dict[str, np.ndarray], Dict[str, Any]]:
+    assert _PLOTTER is not None, "worker not initialised"
+    scored = _PLOTTER.score_occupancy(chunk, data_id=_DATA_ID, waste_tolerance=_WASTE_TOLERANCE)
+    return index, _to_columns(scored["records"]), {**scored["dedup"], "overhead": scored["overhead"], "batches": len(scored["batches"])}
+
+
+def _to_columns(results: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    def column(key: str, default: Any, dtype: Any) -> np.ndarray:
+        return np.array([result.get(key, default) for result in results], dtype=dtype)
+
+    return {
+        "id": column("id", "", str),
+        "status": column("status", "", str),
+        "length": np.array([result.get("sequence_length", -1) for result in results], dtype=np.int32),
+        "logPon": column("logPon", np.nan, np.float64),
+        "bestEnergy": column("bestEnergy", np.nan, np.float64),
+        "bestRow": column("bestRow", -1, np.int32),
+        "bestSpacer": column("bestSpacer", -1, np.int16),
+        "bestStrand": column("bestStrand", "", str),
+        "error": column("error", "", str),
+    }
+
+
+def record_bytes(length: int, flank: int, n_spacer: int, strands: int) -> int:
+    """Rough peak memory to score one record: bricks, scaled copies and window energies."""
+    padded = length + flank
+    return 8 * padded * (3 * n_spacer * strands + 6)
+
+
+def iter_chunks(
+    records: Iterable[Tuple[str, str]],
+    budget_bytes: int,
+    cost: Any,
+    max_records: int = 50_000,
+) -> Iterator[List[Tuple[str, str]]]:
+    """Group streamed records into chunks whose estimated cost stays within ``budget_bytes``."""
+    chunk: List[Tuple[str, str]] = []
+    used = 0
+    for record in records:
+        size = cost(len(record[1]))
+        if chunk and (used + size > budget_bytes or len(chunk) >= max_records):
+            yield chunk
+            chunk, used = [], 0
+        chunk.append(record)
+        used += size
+    if chunk:
+        yield chunk
+
+
+def _fingerprint(args: argparse.Namespace) -> str:
+    stat = Path(args.input).stat()
+    params = {
+        "input": str(Path(args.input).resolve()),
+        "inputSize": stat.st_size,
+        "inputMtime": int(stat.st_mtime),
+        "model": str(Path(args.model).resolve()),
+        "dataId": args.data_id,
+        "memoryMb": args.memory_mb,
+        "workers": args.workers,
+        "maxChunk": args.max_chunk,
+        "wasteTolerance": args.waste_tolerance,
+        "plusOne": not args.no_plus_one,
+        "prefixSuffix": not args.no_prefix_suffix,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _write_json(path: Path, payload: Dict[str, Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=2))
+    tmp.replace(path)
+
+
+def _write_part(out_dir: Path, index: int, columns: Dict[str, np.ndarray]) -> str:
+    name = f"part-{index:06d}.npz"
+    tmp = out_dir / (name + ".tmp")
+    with tmp.open("wb") as handle:
+        np.savez(handle, **columns)
+    tmp.replace(out_dir / name)
+    return name
+
+
+def load_parts(out_dir: Path, manifest: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Concatenate every part listed in ``manifest`` in input order."""
+    parts: Dict[str, List[np.ndarray]] = {column: [] for column in COLUMNS}
+    for index in sorted(manifest["parts"], key=int):
+        with np.load(out_dir / manifest["parts"][index]["file"]) as data:
+            for column in COLUMNS:
+                parts[column].append(data[column])
+    return {column: np.concatenate(values) if values else np.array([]) for column, values in parts.items()}
+
+
+def _merge(out_dir: Path, manifest: Dict[str, Any]) -> Path:
+    columns = load_parts(out_dir, manifest)
+    if pq is not None:
+        target = out_dir / "scores.parquet"
+        pq.write_table(pa.table({name: values.tolist() if values.dtype.kind == "U" else values for name, values in columns.items()}), target)
+    else:
+        target = out_dir / "scores.npz"
+        np.savez(target, **columns)
+    return target
+
+
+def run(args: argparse.Namespace) -> Path:
+    out_dir = Path(args.output)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    fingerprint = _fingerprint(args)
+    manifest: Dict[str, Any] = {"fingerprint": fingerprint, "parts": {}, "complete": False}
+    if manifest_path.exists():
+        previous = json.loads(manifest_path.read_text())
+        if previous.get("fingerprint") == fingerprint:
+            manifest = previous
+        elif not args.overwrite:
+            raise SystemExit(f"{out_dir} holds a run with different inputs; pass --overwrite to start over")
+    done = set(manifest["parts"])
+
+    plotter = _make_plotter(args)
+    args.data_id = args.data_id or plotter.model["DataIDs"][0]
+    flank = 2 * plotter.shift + 39 if plotter.is_prefix_suffix else 0
+    n_spacer = len(plotter.model["sp.penalties"])
+    strands = 2 if plotter.model.get("includeRC") else 1
+    # Each worker holds up to two chunks (one scoring, one queued).
+    budget = args.memory_mb * 2**20 // (2 * args.workers)
+    chunks = iter_chunks(
+        iter_records(args.input),
+        budget,
+        lambda length: record_bytes(length, flank, n_spacer, strands),
+        max_records=args.max_chunk,
+    )
+
+    started = time.monotonic()
+    scored = 0
+
+    def finish(index: int, columns: Dict[str, np.ndarray], stats: Dict[str, Any]) -> None:
+        nonlocal scored
+        manifest["parts"][str(index)] = {
+            "file": _write_part(out_dir, index, columns),
+            "records": len(columns["id"]),
+            "unique": stats["unique"],
+            "batches": stats["batches"],
+            "overhead": round(stats["overhead"], 6),
+        }
+        _write_json(manifest_path, manifest)
+        scored += len(columns["id"])
+        elapsed = time.monotonic() - started
+        print(
+            f"[score_library] part {index}: {scored} records scored in {elapsed:.1f}s "
+            f"({scored / elapsed if elapsed else 0:.0f} records/s, {stats['duplicates']} duplicates, "
+            f"{stats['batches']} batches at {stats['overhead']:.1%} padding in part)",
+            file=sys.stderr,
+        )
+
+    pending_chunks = ((index, chunk) for index, chunk in enumerate(chunks) if str(index) not in done)
+    if args.workers == 1:
+        _init_worker(args)
+        for index, chunk in pending_chunks:
+            finish(*_score_chunk(index, chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args,)) as pool:
+            in_flight = set()
+            for index, chunk in pending_chunks:
+                in_flight.add(pool.submit(_score_chunk, index, chunk))
+                if len(in_flight) >= 2 * args.workers:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(*future.result())
+            for future in in_flight:
+                finish(*future.result())
+
+    manifest["complete"] = True
+    manifest["records"] = sum(part["records"] for part in manifest["parts"].values())
+    manifest["uniqueWithinParts"] = sum(part.get("unique", part["records"]) for part in manifest["parts"].values())
+    _write_json(manifest_path, manifest)
+    target = _merge(out_dir, manifest)
+    print(f"[score_library] {manifest['records']} records written to {target}", file=sys.stderr)
+    return target
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Score a FASTA/CSV promoter library offline")
+    parser.add_argument("input", help="FASTA, CSV (with a sequence column) or packed .2bp library")
+    parser.add_argument("output", help="Output directory for parts, manifest and merged scores")
+    parser.add_argument("--model", default=str(DEFAULT_MODEL), help="Path to the model file")
+    parser.add_argument("--data-id", help="Model data id for chemical potential and threshold (default: first DataID)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: all cores)")
+    parser.add_argument("--memory-mb", type=int, default=1024, help="Approximate memory budget for scoring")
+    parser.add_argument("--max-chunk", type=int, default=50_000, help="Upper bound on records per chunk")
+    parser.add_argument(
+        "--waste-tolerance",
+        type=float,
+        default=0.1,
+        help="Padding overhead allowed when batching records of different lengths (0: exact-length batches)",
+    )
+    parser.add_argument("--no-plus-one", action="store_true", help="Pad without the +1 shift")
+    parser.add_argument("--no-prefix-suffix", action="store_true", help="Score sequences without g flanks")
+    parser.add_argument("--overwrite", action="store_true", help="Discard an existing run in the output directory")
+    return parser
+
+
+def main_cli() -> None:
+    run(build_parser().parse_args())
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,38 @@
+"""Tests for the blob storage tier."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+try:
+    from functions.utils.blob_store import LocalBlobStore, blob_store_from_spec
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.blob_store import LocalBlobStore, blob_store_from_spec
+
+
+def test_local_blob_store_round_trip(tmp_path: Path) -> None:
+    store = LocalBlobStore(tmp_path)
+    pointer = store.put("jobs/u1/j1/brickplot.png", b"\x89PNG-data", content_type="image/png")
+
+    assert pointer == {"store": "local", "key": "jobs/u1/j1/brickplot.png", "contentType": "image/png", "size": 9}
+    assert store.get(pointer["key"]) == b"\x89PNG-data"
+    assert store.url(pointer["key"]).startswith("file://")
+    with pytest.raises(KeyError):
+        store.get("jobs/u1/j1/missing.png")
+
+
+def test_local_blob_store_rejects_escaping_keys(tmp_path: Path) -> None:
+    store = LocalBlobStore(tmp_path / "blobs")
+    for key in ("../outside", "/etc/passwd", ""):
+        with pytest.raises(ValueError):
+            store.put(key, b"x")
+
+
+def test_blob_store_from_spec(tmp_path: Path) -> None:
+    store = blob_store_from_spec(f"file://{tmp_path}")
+    assert isinstance(store, LocalBlobStore)
+    assert store.root == tmp_path
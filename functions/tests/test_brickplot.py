@@ -92,6 +92,115 @@ def test_brickplot_statistics_present(brickplotter: BrickPlotter) -> None:
     assert expected_keys.issubset(stats.keys())
 
 
+def test_score_batch_matches_single_sequence_scoring(brickplotter: BrickPlotter) -> None:
+    rng = np.random.default_rng(1)
+    records = [(f"r{i}", "".join(rng.choice(list("ACGT"), size=size))) for i, size in enumerate([120, 150, 120, 150, 120])]
+    records += [("bad", "ACGTNNACGT"), ("short", "ACGTACGTAC")]
+
+    result = brickplotter.score_batch(records, chunk_size=2)
+
+    summary = result["summary"]
+    assert (summary["total"], summary["completed"], summary["failed"]) == (7, 5, 2)
+    assert summary["lengthGroups"] == 3
+    assert [record["id"] for record in result["records"]] == [record_id for record_id, _ in records]
+    assert result["records"][5]["status"] == "error"
+    assert result["records"][6]["status"] == "error"
+    for (_, sequence), record in zip(records[:5], result["records"]):
+        single = brickplotter.get_brickplot(sequence)
+        assert np.allclose(record["matrix"], single["matrix"])
+        assert record["statistics"] == single["statistics"]
+    best = min(result["records"][:5], key=lambda record: record["statistics"]["min_energy"])
+    assert summary["best"]["id"] == best["id"]
+
+
+def test_score_padded_unpads_to_own_length(brickplotter: BrickPlotter) -> None:
+    rng = np.random.default_rng(2)
+    lengths = [60, 64, 62, 150, 155, 300]
+    seqs = {f"s{i}": "".join(rng.choice(list("acgt"), size=size)) for i, size in enumerate(lengths)}
+    seqs["bad"] = "acgtn"
+
+    result = brickplotter.score_padded(seqs, waste_tolerance=0.05)
+
+    assert len(result["batches"]) == 3
+    assert all(batch["overhead"] <= 0.05 for batch in result["batches"])
+    assert result["records"][-1]["status"] == "error"
+    for (seq_id, sequence), record in zip(seqs.items(), result["records"][:-1]):
+        own, _, _ = brickplotter.preprocess({seq_id: sequence}, len(sequence))
+        expected = brickplotter._score_bricks(own)[0]
+        assert record["origin"] == brickplotter.shift + 5
+        assert np.allclose(record["bricks"], expected)
+
+
+def test_score_occupancy_buckets_mixed_lengths_without_changing_scores(brickplotter: BrickPlotter) -> None:
+    rng = np.random.default_rng(6)
+    records = [(f"r{i}", "".join(rng.choice(list("acgt"), size=size))) for i, size in enumerate([60, 64, 62, 150, 155, 300])]
+
+    exact = brickplotter.score_occupancy(records)
+    bucketed = brickplotter.score_occupancy(records, waste_tolerance=0.05)
+
+    assert len(exact["batches"]) == 6 and len(bucketed["batches"]) == 3
+    assert all(batch["overhead"] <= 0.05 for batch in bucketed["batches"])
+    for expected, record in zip(exact["records"], bucketed["records"]):
+        assert record["logPon"] == pytest.approx(expected["logPon"])
+        assert {key: record[key] for key in ("sequence_length", "bestRow", "bestSpacer", "bestStrand")} == {
+            key: expected[key] for key in ("sequence_length", "bestRow", "bestSpacer", "bestStrand")
+        }
+
+
+def test_batch_scoring_scores_duplicates_once(brickplotter: BrickPlotter, monkeypatch: pytest.MonkeyPatch) -> None:
+    rng = np.random.default_rng(4)
+    unique = ["".join(rng.choice(list("ACGT"), size=80)) for _ in range(3)]
+    records = [(f"r{i}", unique[i % 3]) for i in range(9)] + [("u", unique[0].replace("T", "U"))]
+    rows = []
+    original = brickplotter._brick_dict
+
+    def counting(numeric, data_id="sequence", **kwargs):
+        rows.append(len(numeric))
+        return original(numeric, data_id, **kwargs)
+
+    monkeypatch.setattr(brickplotter, "_brick_dict", counting)
+
+    batch = brickplotter.score_batch(records)
+    assert sum(rows) == 3
+    assert batch["summary"]["dedup"] == {"records": 10, "unique": 3, "duplicates": 7, "dedupRatio": pytest.approx(10 / 3, rel=1e-5)}
+    assert [record["id"] for record in batch["records"]] == [record_id for record_id, _ in records]
+    assert batch["records"][3]["matrix"] == batch["records"][0]["matrix"]
+    assert batch["records"][9]["sequence"] == records[9][1]
+
+    rows.clear()
+    occupancy = brickplotter.score_occupancy(records)
+    assert sum(rows) == 3
+    assert occupancy["dedup"]["unique"] == 3
+    assert occupancy["records"][9]["id"] == "u"
+    assert occupancy["records"][9]["logPon"] == occupancy["records"][0]["logPon"]
+
+
+def test_random_n_policy_scores_ambiguous_bases(tmp_path: Path) -> None:
+    plotter = BrickPlotter(model=str(MODEL_PATH), output_folder=str(tmp_path), n_policy="random")
+    sequence = "ACGTRACGTN" * 12
+    result = plotter.score_batch([("ambiguous", sequence), ("rna", "ACGU" * 30)])
+    assert [record["status"] for record in result["records"]] == ["completed", "completed"]
+    with pytest.raises(ValueError, match="Unsupported N policy"):
+        BrickPlotter(model=str(MODEL_PATH), output_folder=str(tmp_path), n_policy="mask")
+
+
+def test_render_thumbnail_is_small_palette_png(brickplotter: BrickPlotter) -> None:
+    rng = np.random.default_rng(0)
+    matrix = rng.uniform(-4.0, -1.0, size=(2000, 5))
+    matrix[1234, 2] = -20.0  # a single strong site must survive downsampling
+
+    raw = brickplotter.render_thumbnail(matrix)
+    assert len(raw) < 8_000
+    with Image.open(BytesIO(raw)) as img:
+        assert img.mode == "P"
+        assert img.size[0] == 256
+        levels = np.array(img)  # palette indices; 0 is the strongest binding
+    column = int(np.argmin(levels.min(axis=0)))
+    assert levels[:, column].min() == 0
+    assert abs(column - 1234 * 256 / 2000) <= 1
+    assert np.delete(levels, column, axis=1).min() > 0
+
+
 def _enable_interactive_backend() -> None:
     """Switch to an interactive backend when available for manual demos."""
     try:
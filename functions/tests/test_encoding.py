@@ -0,0 +1,52 @@
+"""Tests for the lookup-table nucleotide encoder."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.utils.encoding import MASKED, encode_batch, encode_sequence
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.encoding import MASKED, encode_batch, encode_sequence
+
+
+def test_matches_dict_lookup_and_maps_u_to_t() -> None:
+    sequence = "ACGTacgtUu"
+    codes = encode_sequence(sequence)
+    expected = [dict(zip("acgt", range(4)))[base] for base in sequence.lower().replace("u", "t")]
+    assert codes.dtype == np.int8
+    assert codes.tolist() == expected
+    assert encode_sequence(b"GATC").tolist() == [2, 0, 3, 1]
+
+
+def test_n_policies() -> None:
+    with pytest.raises(ValueError, match="Ambiguous base 'N'"):
+        encode_sequence("ACNT")
+    assert encode_sequence("ACNt", n_policy="mask").tolist() == [0, 1, MASKED, 3]
+
+    rng = np.random.default_rng(1)
+    drawn = encode_sequence("R" * 200 + "N" * 200, n_policy="random", rng=rng)
+    assert set(drawn[:200].tolist()) == {0, 2}  # R is A or G
+    assert set(drawn[200:].tolist()) == {0, 1, 2, 3}
+
+    with pytest.raises(ValueError, match="Unknown N policy"):
+        encode_sequence("ACGT", n_policy="skip")
+
+
+def test_rejects_invalid_characters() -> None:
+    for sequence in ("ACGX", "AC-T", "ACGé"):
+        with pytest.raises(ValueError, match="Invalid character"):
+            encode_sequence(sequence, n_policy="mask")
+
+
+def test_batch_encoding_is_two_dimensional() -> None:
+    batch = encode_batch(["ACGT", "TTGA"])
+    assert batch.shape == (2, 4) and batch.dtype == np.int8
+    assert batch[1].tolist() == [3, 3, 2, 0]
+    with pytest.raises(ValueError, match="equal length"):
+        encode_batch(["ACGT", "A"])
@@ -0,0 +1,70 @@
+"""Tests for bgzip block access and indexed FASTA region fetches."""
+from __future__ import annotations
+
+import gzip
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.utils.indexed_fasta import BgzfReader, IndexedFasta, bgzip_compress
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.indexed_fasta import BgzfReader, IndexedFasta, bgzip_compress
+
+
+@pytest.fixture()
+def genome(tmp_path: Path) -> tuple[Path, dict[str, str]]:
+    rng = np.random.default_rng(0)
+    records = {name: "".join(rng.choice(list("ACGT"), size=size)) for name, size in [("chr1", 200_000), ("plasmid", 1_234)]}
+    path = tmp_path / "genome.fa"
+    with path.open("w") as handle:
+        for name, sequence in records.items():
+            handle.write(f">{name} description\n")
+            handle.write("\n".join(sequence[i:i + 60] for i in range(0, len(sequence), 60)) + "\n")
+    return path, records
+
+
+def test_bgzip_blocks_decompress_independently(genome: tuple[Path, dict[str, str]]) -> None:
+    path, _ = genome
+    compressed = bgzip_compress(path, path.with_name("genome.fa.gz"))
+    raw = path.read_bytes()
+    assert gzip.decompress(compressed.read_bytes()) == raw
+
+    reader = BgzfReader(compressed)
+    assert len(reader.compressed) > 3  # several 64 KiB blocks plus the EOF marker
+    for start, size in [(0, 10), (65_270, 40), (100_000, 70_000), (len(raw) - 5, 100)]:
+        assert reader.read(start, size) == raw[start:start + size]
+    reader.close()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_fetch_regions_with_and_without_saved_index(genome: tuple[Path, dict[str, str]], compress: bool) -> None:
+    path, records = genome
+    if compress:
+        path = bgzip_compress(path, path.with_name("genome.fa.gz"))
+    regions = [("chr1", 0, 100), ("chr1", 65_000, 140_000), ("chr1", 199_990, 300_000), ("plasmid", 1_200, 1_234)]
+    with IndexedFasta(path) as fasta:
+        assert fasta.lengths() == {name: len(sequence) for name, sequence in records.items()}
+        for name, start, end in regions:
+            assert fasta.fetch(name, start, end) == records[name][start:end]
+        fasta.save_index()
+    assert path.with_name(path.name + ".fai").is_file()
+    assert path.with_name(path.name + ".gzi").is_file() == compress
+    with IndexedFasta(path) as fasta:
+        assert fasta.fetch("chr1", 123_456, 123_999) == records["chr1"][123_456:123_999]
+
+
+def test_plain_gzip_and_uneven_lines_are_rejected(tmp_path: Path) -> None:
+    plain_gzip = tmp_path / "plain.fa.gz"
+    plain_gzip.write_bytes(gzip.compress(b">a\nACGT\n"))
+    with pytest.raises(ValueError, match="not bgzip"):
+        IndexedFasta(plain_gzip)
+
+    uneven = tmp_path / "uneven.fa"
+    uneven.write_text(">a\nACG\nACGTACGT\nAC\n")
+    with pytest.raises(ValueError, match="uneven line lengths"):
+        IndexedFasta(uneven)
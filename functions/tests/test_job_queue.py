@@ -0,0 +1,83 @@
+"""Tests for the local asynchronous job queues."""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+try:
+    from functions.utils.job_queue import InProcessJobQueue, SQLiteJobQueue, job_queue_from_spec
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.job_queue import InProcessJobQueue, SQLiteJobQueue, job_queue_from_spec
+
+
+def test_in_process_queue_drains_with_worker_pool() -> None:
+    seen = []
+    lock = threading.Lock()
+
+    def handler(task):
+        with lock:
+            seen.append(task["n"])
+
+    queue = InProcessJobQueue(handler, workers=3)
+    for n in range(20):
+        queue.enqueue({"n": n})
+    assert queue.join(timeout=5)
+    queue.close()
+    assert sorted(seen) == list(range(20))
+
+
+def test_in_process_queue_survives_handler_errors() -> None:
+    seen = []
+
+    def handler(task):
+        if task["n"] == 0:
+            raise RuntimeError("boom")
+        seen.append(task["n"])
+
+    queue = InProcessJobQueue(handler, workers=1)
+    queue.enqueue({"n": 0})
+    queue.enqueue({"n": 1})
+    assert queue.join(timeout=5)
+    queue.close()
+    assert seen == [1]
+
+
+def test_sqlite_queue_keeps_tasks_across_restarts(tmp_path: Path) -> None:
+    path = tmp_path / "queue.sqlite3"
+    blocked = threading.Event()
+    stopped = SQLiteJobQueue(path, lambda _task: blocked.wait(5), workers=1)
+    stopped.close()  # no worker left running: tasks stay on disk
+    blocked.set()
+    stopped.enqueue({"jobId": "a"})
+    stopped.enqueue({"jobId": "b"})
+    assert stopped.pending() == 2
+
+    seen = []
+    queue = job_queue_from_spec(f"sqlite:{path}", lambda task: seen.append(task["jobId"]), workers=1)
+    assert isinstance(queue, SQLiteJobQueue)
+    assert queue.join(timeout=5)
+    queue.close()
+    assert seen == ["a", "b"]
+    assert queue.pending() == 0
+
+
+def test_sqlite_queue_closes_every_connection(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    opened = []
+    connect = SQLiteJobQueue._connect
+    monkeypatch.setattr(SQLiteJobQueue, "_connect", lambda self: opened.append(connect(self)) or opened[-1])
+
+    queue = SQLiteJobQueue(tmp_path / "queue.sqlite3", lambda _task: None, workers=1)
+    queue.enqueue({"jobId": "a"})
+    assert queue.join(timeout=5)
+    queue.close()
+
+    assert len(opened) >= 4  # schema, worker, enqueue and at least one pending poll
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
@@ -0,0 +1,43 @@
+"""Tests for length-bucketed batch planning."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+try:
+    from functions.utils.length_buckets import plan_length_buckets, total_overhead
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.length_buckets import plan_length_buckets, total_overhead
+
+
+def test_buckets_respect_waste_tolerance() -> None:
+    lengths = [100, 300, 105, 310, 98, 1000, 295]
+    buckets = plan_length_buckets(lengths, flank=20, waste_tolerance=0.1)
+
+    assert sorted(index for bucket in buckets for index in bucket.indices) == list(range(len(lengths)))
+    assert [sorted(lengths[i] for i in bucket.indices) for bucket in buckets] == [[98, 100, 105], [295, 300, 310], [1000]]
+    assert all(bucket.overhead <= 0.1 for bucket in buckets)
+    report = buckets[0].report()
+    assert report["paddedLength"] == 125
+    assert report["paddedBases"] == 3 * 125
+    assert report["usefulBases"] == 98 + 100 + 105 + 3 * 20
+
+
+def test_global_padding_is_worse_than_bucketing() -> None:
+    lengths = [50] * 10 + [500] * 10
+    bucketed = total_overhead(plan_length_buckets(lengths, waste_tolerance=0.1))
+    single = total_overhead(plan_length_buckets(lengths, waste_tolerance=10.0))
+    assert bucketed == 0.0
+    assert single == pytest.approx(20 * 500 / (10 * 50 + 10 * 500) - 1)
+
+
+def test_zero_tolerance_and_batch_cap() -> None:
+    buckets = plan_length_buckets([10, 10, 10, 11], waste_tolerance=0.0, max_batch=2)
+    assert [len(bucket.indices) for bucket in buckets] == [2, 1, 1]
+    assert [bucket.max_length for bucket in buckets] == [10, 10, 11]
+    with pytest.raises(ValueError):
+        plan_length_buckets([10], waste_tolerance=-1)
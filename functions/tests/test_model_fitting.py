@@ -0,0 +1,119 @@
+"""Tests for refitting thermodynamic models by L-BFGS."""
+from __future__ import annotations
+
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.utils import model_functions as mf
+    from functions.utils.model_fitting import GROUPS, _Layout, _logistic, _numericData, _objective, fitModel, mlogLAndGradient
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils import model_functions as mf
+    from functions.utils.model_fitting import GROUPS, _Layout, _logistic, _numericData, _objective, fitModel, mlogLAndGradient
+
+pytestmark = pytest.mark.filterwarnings("ignore::sklearn.exceptions.InconsistentVersionWarning")
+
+MODELS = Path(__file__).resolve().parents[1] / "models" / "fitted_on_Pr"
+
+
+def _load(name: str) -> dict:
+    with (MODELS / name).open("rb") as handle:
+        model = pickle.load(handle, encoding="latin1")
+    model["ThDict"] = {"Pr.Pl": 30, "36N": -1}  # a threshold inside the short test sequences
+    return model
+
+
+def _random_data(model: dict, n: int = 40, length: int = 90, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    data = {}
+    for data_id in model["DataIDs"]:
+        classes = len(mf.logisticParams(model["logisticRegression"][data_id]).classes)
+        data[data_id] = {
+            "seqs": rng.integers(0, 4, size=(n, length)).astype(np.int8),
+            "digiLums": rng.integers(0, classes, n),
+            "weights": rng.uniform(0.5, 2.0, n),
+        }
+    return {"training": data}
+
+
+@pytest.mark.parametrize(
+    "name, extra",
+    [
+        ("model_[3]_stm+flex+cumul+rbs.dmp", {}),
+        ("model_[4]_stm+flex+cumul+rbs+rc.dmp", {"logClearanceRate": -1.0}),
+        ("model_[1]_stm+flex.dmp", {}),  # bindMode "max"
+    ],
+)
+def test_gradient_matches_lps2eval_and_finite_differences(name: str, extra: dict) -> None:
+    if not (MODELS / name).exists():
+        pytest.skip("model file missing")
+    model = {**_load(name), **extra}
+    numData = _random_data(model)
+    value, grad, _ = mlogLAndGradient(model, numData, chunk=15)
+    assert value == pytest.approx(sum(mf.lps2eval(model, "mlogL", numData).values()), rel=1e-10)
+
+    layout = _Layout(model, GROUPS)
+    base = layout.values()
+    evaluate = _objective(layout, base, _numericData(model, numData, "training"), model["bindMode"], model["includeRC"], int(model["min.spacer"]), 15, 0.0)
+    x = layout.pack(base)
+    for index in np.random.default_rng(1).choice(len(x), 15, replace=False):
+        step = np.zeros_like(x)
+        step[index] = 1e-5
+        numeric = (evaluate(x + step)[0] - evaluate(x - step)[0]) / 2e-5
+        assert grad[index] == pytest.approx(numeric, rel=1e-5, abs=1e-5)
+
+
+def test_fit_model_lowers_mlogl_and_keeps_the_model_layout() -> None:
+    name = "model_[3]_stm+flex+cumul+rbs.dmp"
+    if not (MODELS / name).exists():
+        pytest.skip("model file missing")
+    model = _load(name)
+    model["DataIDs"] = ["36N"]
+    numData = _random_data(model, n=200)
+    start = sum(mf.lps2eval(model, "mlogL", numData).values())
+
+    refit, report = fitModel(model, numData, maxiter=30)
+    assert report["initial"] == pytest.approx(start)
+    assert report["final"] < start
+    assert sum(mf.lps2eval(refit, "mlogL", numData).values()) == pytest.approx(report["final"])
+    assert refit.keys() == model.keys()
+    assert [m.shape for m in refit["matrices"]] == [m.shape for m in model["matrices"]]
+    assert refit["sp.penalties"][model["spFlex"]] == 0
+    assert refit["chem.pot"]["Pr.Pl"] == model["chem.pot"]["Pr.Pl"]  # not fitted, left alone
+    assert refit["logisticRegression"]["36N"] is not model["logisticRegression"]["36N"]
+
+    fixed, _ = fitModel(model, numData, optimize=["chem.pot", "logistic"], maxiter=5)
+    assert all(np.array_equal(a, b) for a, b in zip(fixed["matrices"], model["matrices"]))
+    assert fixed["en.scale"] == model["en.scale"]
+
+
+def test_fit_and_evaluation_share_the_prl_threshold_fallback() -> None:
+    name = "model_[3]_stm+flex+cumul+rbs.dmp"
+    if not (MODELS / name).exists():
+        pytest.skip("model file missing")
+    model = _load(name)
+    model["ThDict"] = {"Prl": 30, "36N_old": -1}  # no entry for either data ID; brick2lps falls back to Prl
+    numData = _random_data(model, n=60)
+
+    value, _, _ = mlogLAndGradient(model, numData, chunk=25)
+    assert value == pytest.approx(sum(mf.lps2eval(model, "mlogL", numData).values()), rel=1e-10)
+    refit, report = fitModel(model, numData, optimize=["chem.pot", "logistic"], maxiter=5)
+    assert sum(mf.lps2eval(refit, "mlogL", numData).values()) == pytest.approx(report["final"])
+
+
+@pytest.mark.parametrize("ovr", [True, False])
+def test_binary_logistic_term_matches_log_proba(ovr: bool) -> None:
+    x = np.linspace(-4.0, 1.0, 11)
+    labels = np.arange(11) % 2
+    coef, intercept = np.array([1.3]), np.array([0.4])
+    params = mf.logisticParams({"coef": coef, "intercept": intercept, "classes": np.array([0, 1]), "ovr": ovr})
+    logLik, dz = _logistic(x, labels, coef, intercept, params.classes, ovr)
+    assert np.allclose(logLik, mf.logisticLogProba(params, x[:, None], labels))
+    shifted = mf.logisticLogProba(mf.logisticParams({**params._asdict(), "coef": coef, "intercept": intercept + 1e-6}), x[:, None], labels)
+    assert np.allclose(dz[:, 0], (shifted - logLik) / 1e-6, atol=1e-5)
@@ -0,0 +1,102 @@
+"""Tests for the thermodynamic scoring helpers."""
+from __future__ import annotations
+
+import copy
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from functions.utils import model_functions as mf
+    from functions.utils.general_functions import bindingEnergies
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils import model_functions as mf
+    from functions.utils.general_functions import bindingEnergies
+
+
+def _slide_reference(m: np.ndarray, seqs: np.ndarray) -> np.ndarray:
+    n = m.shape[0]
+    return np.array([bindingEnergies(m, seqs[:, offset:offset + n]) for offset in range(seqs.shape[1] - n + 1)]).T
+
+
+def test_constant_flank_widths() -> None:
+    padded = np.array([[2, 2, 2, 0, 1, 2, 2], [2, 2, 2, 3, 3, 2, 2]])
+    assert mf.constantFlankWidths(padded) == (3, 2)
+    assert mf.constantFlankWidths(padded[:1]) == (3, 2)
+    assert mf.constantFlankWidths(np.array([[1, 1, 1]])) == (3, 0)
+
+
+def test_slide_single_matrix_matches_reference_with_flanks() -> None:
+    rng = np.random.default_rng(0)
+    m = rng.normal(size=(12, 4))
+    for _ in range(200):
+        n_seq, length = int(rng.integers(1, 5)), int(rng.integers(1, 60))
+        seqs = rng.integers(0, 4, size=(n_seq, length))
+        head, tail = int(rng.integers(0, length + 1)), int(rng.integers(0, length + 1))
+        seqs[:, :head] = 2 if rng.random() < 0.5 else seqs[0, :head]
+        if tail:
+            seqs[:, length - tail:] = seqs[0, length - tail:]
+        expected = _slide_reference(m, seqs)
+        result = mf.slideSingleMatrix(m, seqs)
+        assert result.shape == expected.shape
+        assert np.allclose(result, expected)
+
+
+def test_brick2lps_profile_matches_every_threshold() -> None:
+    rng = np.random.default_rng(1)
+    bricks = {"36N": rng.normal(2.0, 3.0, size=(3, 40, 5)), "36N_rc": rng.normal(2.0, 3.0, size=(3, 40, 5))}
+    variants = [
+        {"bindMode": "add"},
+        {"bindMode": "add", "logClearanceRate": -1.5},
+        {"bindMode": "max"},
+        {"bindMode": "add", "rcOcclusion": np.arange(10, 20)},
+    ]
+    for fitpars in variants:
+        for data in (bricks, {"36N": bricks["36N"]}):
+            profile = mf.brick2lps(data, fitpars, allThresholds=True)["36N"]
+            assert profile.shape == (3, 40)
+            for threshold in range(1, 41):
+                expected = mf.brick2lps(data, fitpars, thresholdPosDict_={"36N": threshold})["36N"]
+                assert np.allclose(profile[:, threshold - 1], expected)
+
+
+def test_lps2eval_closed_form_matches_sklearn() -> None:
+    from sklearn.linear_model import LinearRegression, LogisticRegression
+
+    rng = np.random.default_rng(2)
+    logPon = rng.normal(-2.0, 1.0, size=300)
+    digiLums = np.clip(np.round(1.5 * logPon + 4 + rng.normal(size=300)), 0, 3).astype(int)
+    lums = digiLums + rng.normal(0, 0.3, size=300)
+    weights = rng.uniform(0.5, 2.0, size=300)
+    numData = {"training": {"D": {"seqs": None, "digiLums": digiLums, "lums": lums, "weights": weights}}}
+    X = logPon.reshape(-1, 1)
+
+    for classes, multi_class in ((4, "ovr"), (2, "ovr"), (4, "multinomial"), (2, "multinomial")):
+        y = np.minimum(digiLums, classes - 1)
+        numData["training"]["D"]["digiLums"] = y
+        LR = LogisticRegression(C=1e15, solver="liblinear" if multi_class == "ovr" else "lbfgs", max_iter=1000)
+        LR.multi_class = multi_class
+        LR.fit(X, y, sample_weight=weights)
+        fitpar = {"DataIDs": ["D"], "logisticRegression": {"D": LR}}
+
+        params = mf.logisticParams(LR)
+        assert mf.logisticParams(LR) is params  # extracted once
+        assert np.allclose(mf.logisticLogProba(params, X), LR.predict_log_proba(X))
+        assert np.array_equal(mf.logisticPredict(params, X), LR.predict(X))
+
+        out = {objF: mf.lps2eval(fitpar, objF, numData, logPonDict_={"D": logPon})["D"] for objF in ("mlogL", "linR2", "r2")}
+        assert np.isclose(out["mlogL"], -(LR.predict_log_proba(X)[range(300), y] * weights).sum())
+        errs = LR.predict(X) - lums
+        wvar = (weights * (lums - np.sum(lums * weights) / weights.sum()) ** 2).sum()
+        assert np.isclose(out["r2"], 1 - (weights * errs**2).sum() / wvar)
+        assert np.isclose(out["linR2"], LinearRegression().fit(X, lums, sample_weight=weights).score(X, lums, sample_weight=weights))
+
+    plain = {"coef": LR.coef_.ravel(), "intercept": LR.intercept_, "classes": LR.classes_, "ovr": False}
+    assert np.allclose(mf.logisticLogProba(mf.logisticParams(plain), X), LR.predict_log_proba(X))
+
+    legacy = copy.deepcopy(LR)  # a fresh estimator, so the cached extraction is not reused
+    legacy.multi_class, legacy.solver = "warn", "warn"  # as stored by sklearn 0.20/0.21, which meant one-vs-rest
+    assert mf.logisticParams(legacy).ovr
@@ -0,0 +1,63 @@
+"""Tests for the 2-bit packed sequence store."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.utils.encoding import MASKED, encode_sequence
+    from functions.utils.packed_store import PackedSequenceStore, pack_codes, unpack_codes, write_packed_store
+    from functions.utils.sequence_io import convert_to_packed, iter_records
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.encoding import MASKED, encode_sequence
+    from functions.utils.packed_store import PackedSequenceStore, pack_codes, unpack_codes, write_packed_store
+    from functions.utils.sequence_io import convert_to_packed, iter_records
+
+
+def test_pack_roundtrip_for_any_window() -> None:
+    codes = np.random.default_rng(0).integers(0, 4, 37).astype(np.int8)
+    packed = pack_codes(codes.view(np.uint8))
+    assert packed.nbytes == 10
+    for start, end in [(0, 37), (1, 2), (3, 9), (8, 37), (36, 37)]:
+        assert unpack_codes(packed, start, end).tolist() == codes[start:end].tolist()
+
+
+def test_store_keeps_ids_lengths_and_n_mask(tmp_path: Path) -> None:
+    records = [("chr1 sample", "ACGTNNACGTRA"), ("rna", "acgu"), ("gap", "NNNN"), ("empty", "")]
+    path = tmp_path / "library.2bp"
+    assert write_packed_store(records, path) == {"records": 4, "bases": 20}
+
+    store = PackedSequenceStore(path)
+    assert store.ids == [record_id for record_id, _ in records]
+    assert store.lengths.tolist() == [12, 4, 4, 0]
+    assert list(store) == [("chr1 sample", "ACGTNNACGTNA"), ("rna", "ACGT"), ("gap", "NNNN"), ("empty", "")]
+    assert store.n_intervals(0).tolist() == [[4, 6], [10, 11]]
+    assert store.codes(0, 3, 9).tolist() == [3, MASKED, MASKED, 0, 1, 2]
+    assert store.codes(0, 3, 9, mask=False).tolist() == [3, 0, 0, 0, 1, 2]
+    assert store.sequence(store.index_of("rna"), 1, 3) == "CG"
+
+
+def test_converter_is_a_quarter_of_ascii(tmp_path: Path) -> None:
+    rng = np.random.default_rng(1)
+    genome = "".join(rng.choice(list("ACGT"), size=40_000))
+    fasta = tmp_path / "genome.fasta"
+    fasta.write_text(">chr\n" + "\n".join(genome[i:i + 60] for i in range(0, len(genome), 60)) + "\n")
+
+    packed = tmp_path / "genome.2bp"
+    convert_to_packed(fasta, packed)
+    assert packed.stat().st_size < fasta.stat().st_size / 4 + 512
+    assert list(iter_records(packed)) == [("chr", genome)]
+    window = PackedSequenceStore(packed).codes(0, 12_345, 12_400)
+    assert window.tolist() == encode_sequence(genome[12_345:12_400]).tolist()
+
+
+def test_rejects_foreign_files(tmp_path: Path) -> None:
+    bogus = tmp_path / "bogus.2bp"
+    bogus.write_bytes(b"not a packed store at all, just text")
+    with pytest.raises(ValueError, match="Not a packed sequence store"):
+        PackedSequenceStore(bogus)
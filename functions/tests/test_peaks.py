@@ -0,0 +1,82 @@
+"""Tests for promoter candidate calling on brick matrices."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.peaks import PeakStream, call_peaks, local_minima, suppress_overlaps
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.peaks import PeakStream, call_peaks, local_minima, suppress_overlaps
+
+pytestmark = pytest.mark.filterwarnings("ignore::sklearn.exceptions.InconsistentVersionWarning")
+
+MODEL_PATH = Path(__file__).resolve().parents[1] / "models" / "fitted_on_Pr" / "model_[3]_stm+flex+cumul+rbs.dmp"
+
+
+def _greedy(starts: np.ndarray, energies: np.ndarray, width: int) -> list[int]:
+    kept: list[int] = []
+    for index in np.lexsort((starts, energies)):
+        if all(abs(starts[index] - starts[other]) >= width for other in kept):
+            kept.append(int(index))
+    return kept
+
+
+def test_local_minima_and_suppression_match_greedy_reference() -> None:
+    energies = np.array([[0.0, -1.0, 0.0], [-3.0, -2.0, 0.0], [0.0, np.nan, -2.5], [0.0, 0.0, 1.0]])
+    rows, spacers = local_minima(energies, threshold=-0.5)
+    assert list(zip(rows.tolist(), spacers.tolist())) == [(1, 0), (2, 2)]  # NaN never blocks its neighbour
+
+    rng = np.random.default_rng(3)
+    for _ in range(20):
+        starts = rng.integers(0, 400, size=150)
+        energies = np.round(rng.normal(size=150), 1)  # rounding forces ties
+        assert suppress_overlaps(starts, energies, 17).tolist() == _greedy(starts, energies, 17)
+    assert suppress_overlaps(np.array([], dtype=int), np.array([]), 5).tolist() == []
+
+
+def test_streamed_tiles_give_the_same_calls_as_one_matrix() -> None:
+    rng = np.random.default_rng(8)
+    strand_bricks = {strand: rng.normal(size=(3_000, 5)) for strand in ("+", "-")}
+    strand_bricks["+"][1_200:1_260] = np.nan
+    expected = call_peaks(strand_bricks, threshold=-1.5, footprint=34, chem_pot=-0.5)
+    assert expected and [call["rank"] for call in expected] == list(range(1, len(expected) + 1))
+    assert all(b["start"] - a["start"] >= 34 or a["start"] - b["start"] >= 34 for a, b in zip(expected, expected[1:]))
+
+    stream = PeakStream(threshold=-1.5, footprint=34, chem_pot=-0.5)
+    for edges in ([0, 1, 2, 700, 701, 2_999, 3_000], [0, 3_000]):
+        for start, end in zip(edges, edges[1:]):
+            stream.push({strand: bricks[start:end] for strand, bricks in strand_bricks.items()})
+        assert stream.finish() == expected
+
+
+@pytest.mark.skipif(not MODEL_PATH.exists(), reason="model file missing")
+def test_get_brickplot_ranks_candidates_on_both_strands(tmp_path: Path) -> None:
+    sequence = "".join(np.random.default_rng(5).choice(list("ACGT"), size=2_000))
+    plotter = BrickPlotter(model=str(MODEL_PATH), output_folder=str(tmp_path), threshold=-5.0, max_candidates=10)
+    plotter.model["en.scale"] = 0.8
+    chem_pot = plotter.model["chem.pot"][plotter.model["DataIDs"][0]]
+    result = plotter.get_brickplot(sequence)
+    candidates = result["candidates"]
+    assert 0 < len(candidates) <= 10
+    assert [call["energy"] for call in candidates] == sorted(call["energy"] for call in candidates)
+    assert candidates[0]["energy"] <= result["statistics"]["min_energy"]
+
+    bricks = plotter._brick_dict(encode_sequence(sequence)[np.newaxis], both_strands=True)
+    for call in candidates:
+        key = "sequence" if call["strand"] == "+" else "sequence_rc"
+        assert bricks[key][0, call["row"], call["spacer"]] == pytest.approx(call["energy"])
+        assert call["energy"] < -5.0 and call["end"] - call["start"] == plotter._footprint()
+        assert call["logPon"] == pytest.approx(-np.logaddexp(0.0, 0.8 * (call["energy"] - chem_pot)) / np.log(10.0))
+
+    batch = plotter.score_batch([("a", sequence)])
+    assert batch["records"][0]["candidates"] == candidates
@@ -0,0 +1,94 @@
+"""Tests for the leased monthly job quota."""
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+
+try:
+    from functions._stubs import firebase_admin as firebase_admin_stub
+    from functions.utils.quota import MonthlyQuota
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions._stubs import firebase_admin as firebase_admin_stub
+    from functions.utils.quota import MonthlyQuota
+
+MONTH = datetime.now().strftime("%Y-%m")
+
+
+def _quota(**kwargs) -> MonthlyQuota:
+    return MonthlyQuota(transactional=firebase_admin_stub.transactional, **kwargs)
+
+
+def test_lease_serves_requests_without_reads() -> None:
+    db = firebase_admin_stub._FakeFirestore({})
+    user_ref = db.collection("users").document("u1")
+    quota = _quota(block_size=5)
+
+    assert all(quota.try_consume(db, user_ref, MONTH) for _ in range(5))
+    assert db.operations["reads"] == 1
+    assert db.operations["commits"] == 1
+    assert quota.stats["leases"] == 1 and quota.stats["local"] == 4
+    assert user_ref.get().to_dict()["monthlyUsage"]["reserved"] == 5
+
+
+def test_limit_holds_across_instances() -> None:
+    db = firebase_admin_stub._FakeFirestore({})
+    user_ref = db.collection("users").document("u1")
+    instances = [_quota(limit=12, block_size=5) for _ in range(3)]
+
+    granted = 0
+    for _ in range(10):
+        for quota in instances:
+            granted += quota.try_consume(db, user_ref, MONTH)
+    assert granted == 12
+    assert user_ref.get().to_dict()["monthlyUsage"]["reserved"] == 12
+
+
+def test_existing_count_blocks_new_leases() -> None:
+    db = firebase_admin_stub._FakeFirestore({})
+    user_ref = db.collection("users").document("u1")
+    user_ref.set({"monthlyUsage": {"count": 99, "monthYear": MONTH}})
+    quota = _quota(limit=100, block_size=5)
+
+    assert quota.try_consume(db, user_ref, MONTH)
+    assert not quota.try_consume(db, user_ref, MONTH)
+    assert quota.stats["denied"] == 1
+
+
+def test_expired_leases_return_units_and_month_resets() -> None:
+    db = firebase_admin_stub._FakeFirestore({})
+    user_ref = db.collection("users").document("u1")
+    user_ref.set({"monthlyUsage": {"count": 40, "monthYear": "1999-01", "reserved": 45}})
+    now = [0.0]
+    quota = _quota(limit=100, block_size=5, lease_ttl=60, clock=lambda: now[0])
+
+    assert quota.try_consume(db, user_ref, MONTH)
+    usage = user_ref.get().to_dict()["monthlyUsage"]
+    assert (usage["count"], usage["reserved"], usage["monthYear"]) == (0, 5, MONTH)
+
+    now[0] = 120.0  # lease expired with four units unused
+    assert quota.try_consume(db, user_ref, MONTH)
+    assert user_ref.get().to_dict()["monthlyUsage"]["reserved"] == 6
+
+
+def test_local_lease_expires_no_later_than_the_reservation() -> None:
+    db = firebase_admin_stub._FakeFirestore({})
+    user_ref = db.collection("users").document("u1")
+    now = [0.0]
+
+    def slow_transactional(func):
+        def run(transaction):
+            now[0] += 5.0  # the server stamps leasedAt while the transaction runs
+            return firebase_admin_stub.transactional(func)(transaction)
+
+        return run
+
+    quota = MonthlyQuota(transactional=slow_transactional, block_size=5, lease_ttl=60, clock=lambda: now[0])
+    assert quota.try_consume(db, user_ref, MONTH)
+    assert db.operations["commits"] == 1
+
+    now[0] = 60.5  # within lease_ttl of the commit, but not of the request
+    assert quota.try_consume(db, user_ref, MONTH)
+    assert db.operations["commits"] == 2 and quota.stats["local"] == 0
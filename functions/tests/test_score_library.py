@@ -0,0 +1,115 @@
+"""Tests for the offline library scoring CLI."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.tests import score_library
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.tests import score_library
+
+pytestmark = pytest.mark.filterwarnings("ignore::sklearn.exceptions.InconsistentVersionWarning")
+
+
+def _write_library(path: Path, count: int) -> list[tuple[str, str]]:
+    rng = np.random.default_rng(3)
+    records = [(f"p{i}", "".join(rng.choice(list("ACGT"), size=int(rng.choice([36, 60]))))) for i in range(count)]
+    records[5] = ("p5", "ACGTNACGT")
+    path.write_text("".join(f">{record_id}\n{sequence}\n" for record_id, sequence in records))
+    return records
+
+
+def _args(library: Path, out_dir: Path, *extra: str):
+    return score_library.build_parser().parse_args([str(library), str(out_dir), "--max-chunk", "10", "--workers", "1", *extra])
+
+
+def test_scores_library_in_chunks_and_merges(tmp_path: Path) -> None:
+    library = tmp_path / "lib.fasta"
+    records = _write_library(library, 35)
+
+    target = score_library.run(_args(library, tmp_path / "out"))
+
+    manifest = json.loads((tmp_path / "out" / score_library.MANIFEST).read_text())
+    assert manifest["complete"] and manifest["records"] == 35
+    assert len(manifest["parts"]) == 4
+    with np.load(target) as scores:
+        assert scores["id"].tolist() == [record_id for record_id, _ in records]
+        assert scores["status"][5] == "error"
+        assert np.isfinite(np.delete(scores["logPon"], 5)).all()
+
+    plotter = score_library._make_plotter(_args(library, tmp_path / "out"))
+    (expected,) = plotter.score_occupancy([records[0]])["records"]
+    assert scores_equal(target, 0, expected)
+
+
+def test_waste_tolerance_batches_lengths_without_changing_scores(tmp_path: Path) -> None:
+    library = tmp_path / "lib.fasta"
+    _write_library(library, 35)
+
+    bucketed = score_library.run(_args(library, tmp_path / "bucketed", "--waste-tolerance", "0.5"))
+    exact = score_library.run(_args(library, tmp_path / "exact", "--waste-tolerance", "0"))
+
+    parts = json.loads((tmp_path / "bucketed" / score_library.MANIFEST).read_text())["parts"].values()
+    assert all(part["overhead"] <= 0.5 for part in parts)
+    assert any(part["overhead"] > 0 for part in parts)
+    with np.load(bucketed) as got, np.load(exact) as expected:
+        assert got["length"].tolist() == expected["length"].tolist()
+        assert np.allclose(got["logPon"], expected["logPon"], equal_nan=True)
+        assert got["bestRow"].tolist() == expected["bestRow"].tolist()
+
+
+def scores_equal(target: Path, row: int, expected: dict) -> bool:
+    with np.load(target) as scores:
+        return bool(
+            np.isclose(scores["logPon"][row], expected["logPon"])
+            and scores["bestRow"][row] == expected["bestRow"]
+            and scores["bestStrand"][row] == expected["bestStrand"]
+        )
+
+
+def test_resumes_only_missing_parts(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    library = tmp_path / "lib.fasta"
+    _write_library(library, 35)
+    out_dir = tmp_path / "out"
+    score_library.run(_args(library, out_dir))
+
+    manifest_path = out_dir / score_library.MANIFEST
+    manifest = json.loads(manifest_path.read_text())
+    lost = manifest["parts"].pop("2")
+    (out_dir / lost["file"]).unlink()
+    manifest["complete"] = False
+    manifest_path.write_text(json.dumps(manifest))
+
+    scored = []
+    original = score_library._score_chunk
+    monkeypatch.setattr(score_library, "_score_chunk", lambda index, chunk: scored.append(index) or original(index, chunk))
+    score_library.run(_args(library, out_dir))
+
+    assert scored == [2]
+    assert json.loads(manifest_path.read_text())["records"] == 35
+
+    with pytest.raises(SystemExit):
+        score_library.run(_args(library, out_dir, "--max-chunk", "7"))
+
+
+def test_parallel_workers_match_single_process(tmp_path: Path) -> None:
+    library = tmp_path / "lib.fasta"
+    _write_library(library, 25)
+    single = score_library.run(_args(library, tmp_path / "single"))
+    parallel = score_library.run(_args(library, tmp_path / "parallel", "--workers", "2"))
+    with np.load(single) as a, np.load(parallel) as b:
+        assert a["id"].tolist() == b["id"].tolist()
+        assert np.allclose(a["logPon"], b["logPon"], equal_nan=True)
+
+
+def test_iter_chunks_respects_budget() -> None:
+    records = [("r", "A" * length) for length in [10, 10, 10, 50, 10]]
+    chunks = list(score_library.iter_chunks(records, budget_bytes=30, cost=lambda length: length))
+    assert [len(chunk) for chunk in chunks] == [3, 1, 1]
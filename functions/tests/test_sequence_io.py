@@ -0,0 +1,80 @@
+"""Tests for the shared streaming FASTA/CSV parser."""
+from __future__ import annotations
+
+import gzip
+import io
+from pathlib import Path
+
+import pytest
+
+try:
+    from functions.utils.sequence_io import (
+        is_valid_sequence,
+        iter_csv,
+        iter_fasta,
+        iter_records,
+        iter_text,
+        reverse_complement,
+        sequence_suffix,
+    )
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.utils.sequence_io import (
+        is_valid_sequence,
+        iter_csv,
+        iter_fasta,
+        iter_records,
+        iter_text,
+        reverse_complement,
+        sequence_suffix,
+    )
+
+
+def test_fasta_joins_multiline_records_from_text_and_handles() -> None:
+    text = ">chr1 test\nacgt\nAC GT\n\n>\nTTTT\nGG\n"
+    expected = [("chr1 test", "ACGTACGT"), ("record_2", "TTTTGG")]
+    assert list(iter_fasta(text)) == expected
+    assert list(iter_fasta(io.StringIO(text))) == expected
+
+
+def test_reverse_complement_applies_to_the_whole_record() -> None:
+    # Reverse-complementing line by line would give "GGTTAACCT".
+    assert list(iter_fasta(">a\nAACC\nGGTT\nA\n", rc=True)) == [("a", "TAACCGGTT")]
+    assert reverse_complement("ACGTUNRY") == "RYNAACGT"
+
+
+def test_validation_uses_the_nucleotide_alphabet() -> None:
+    assert is_valid_sequence("ACGTU")
+    assert not is_valid_sequence("")
+    assert not is_valid_sequence("ACGN")
+    assert not is_valid_sequence("ACGTé")
+    assert is_valid_sequence("acgt", b"acgt")
+
+
+def test_csv_with_header_and_headerless_rows() -> None:
+    with_header = "name,sequence\nfirst,acgt\n,TTTT\nempty,\n"
+    assert list(iter_csv(with_header)) == [("first", "ACGT"), ("record_2", "TTTT")]
+    headerless = "p1,ACGT\nbad row\np2,GG CC\n"
+    assert list(iter_csv(headerless, rc=True)) == [("p1", "ACGT"), ("p2", "GGCC")]
+
+
+def test_iter_records_dispatches_on_suffix(tmp_path: Path) -> None:
+    fasta = tmp_path / "library.fa"
+    fasta.write_text(">x\nACGT\n")
+    assert list(iter_records(fasta)) == [("x", "ACGT")]
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        iter_text("", ".txt")
+
+
+def test_gzip_input_streams_from_paths_and_bytes(tmp_path: Path) -> None:
+    content = b">a\nACGT\nTT\n>b\nGG\n"
+    expected = [("a", "ACGTTT"), ("b", "GG")]
+    path = tmp_path / "genome.fa.gz"
+    path.write_bytes(gzip.compress(content))
+    assert sequence_suffix(path) == ".fa"
+    assert sequence_suffix("library.CSV") == ".csv"
+    assert list(iter_records(path)) == expected
+    assert list(iter_text(gzip.compress(content), ".fa")) == expected
+    assert list(iter_text(content, ".fa")) == expected
@@ -2,164 +2,47 @@
 from __future__ import annotations
 
 import base64
+import gzip
+import io
 import json
+import threading
+import time
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Any, Dict, Tuple
+from typing import Any, Dict
 
 import pytest
 
 try:
     from functions import main
+    from functions._stubs import firebase_admin as firebase_admin_stub
+    from functions.utils.job_queue import InProcessJobQueue
 except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
     import sys
 
     sys.path.append(str(Path(__file__).resolve().parents[2]))
     from functions import main
+    from functions._stubs import firebase_admin as firebase_admin_stub
+    from functions.utils.job_queue import InProcessJobQueue
 
 TEST_DATA_DIR = Path(__file__).resolve().parent
 TEXT_SEQUENCE = (TEST_DATA_DIR / 'test_sequence.txt').read_text().strip()
 FASTA_SEQUENCE_PATH = TEST_DATA_DIR / 'test_sequence.fasta'
 FASTA_SEQUENCE = ''.join(line.strip() for line in FASTA_SEQUENCE_PATH.read_text().splitlines() if not line.startswith('>'))
 
-class FakeSnapshot:
-    def __init__(self, doc_id: str, data: Dict[str, Any] | None) -> None:
-        self.id = doc_id
-        self._data = data
+class FakeFirestore(firebase_admin_stub._FakeFirestore):
+    """Stub Firestore client with helpers for inspecting stored documents."""
 
-    @property
-    def exists(self) -> bool:
-        return self._data is not None
-
-    def to_dict(self) -> Dict[str, Any]:
-        if not self.exists:
-            return {}
-        data = dict(self._data)
-        data.pop("__subcollections__", None)
-        return data
-
-def _deep_merge(target: Dict[str, Any], source: Dict[str, Any]) -> None:
-
-    for key, value in source.items():
-
-        if key == "__subcollections__":
-
-            continue
-
-        if isinstance(value, dict) and isinstance(target.get(key), dict):
-
-            _deep_merge(target[key], value)
-
-        else:
-
-            target[key] = value
-
-
-class FakeDocument:
-    def __init__(self, store: Dict[str, Any], doc_id: str) -> None:
-        self._store = store
-        self._doc_id = doc_id
-
-    @property
-    def id(self) -> str:
-        return self._doc_id
-
-    def _ensure_doc(self) -> Dict[str, Any]:
-        doc = self._store.setdefault(self._doc_id, {})
-        doc.setdefault("__subcollections__", {})
-        return doc
-
-    def get(self) -> FakeSnapshot:
-        doc = self._store.get(self._doc_id)
-        return FakeSnapshot(self._doc_id, doc)
-
-    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
-        doc = self._ensure_doc()
-        if merge:
-            _deep_merge(doc, data)
-        else:
-            subcollections = doc.get("__subcollections__", {})
-            doc.clear()
-            doc["__subcollections__"] = subcollections
-            _deep_merge(doc, data)
-
-    def update(self, updates: Dict[str, Any]) -> None:
-        doc = self._ensure_doc()
-        for key, value in updates.items():
-            parts = key.split(".")
-            target = doc
-            for part in parts[:-1]:
-                target = target.setdefault(part, {})
-            target[parts[-1]] = value
-
-    def collection(self, name: str) -> "FakeCollection":
-        doc = self._ensure_doc()
-        sub_store = doc["__subcollections__"].setdefault(name, {})
-        return FakeCollection(sub_store)
-
-
-class FakeCollection:
-    def __init__(self, store: Dict[str, Any]) -> None:
-        self._store = store
-
-    def document(self, doc_id: str) -> FakeDocument:
-        return FakeDocument(self._store, doc_id)
-
-    def stream(self) -> list[FakeSnapshot]:
-        return [FakeSnapshot(doc_id, data) for doc_id, data in self._store.items()]
-
-    def order_by(self, field: str, direction: str | None = None) -> "FakeCollectionView":
-        reverse = False
-        if direction is not None:
-            reverse = str(direction).upper().endswith('DESCENDING')
-        return FakeCollectionView(self._store, field, reverse)
-
-class FakeCollectionView:
-    def __init__(self, store: Dict[str, Any], field: str, reverse: bool) -> None:
-        self._store = store
-        self._field = field
-        self._reverse = reverse
-
-    def stream(self) -> list[FakeSnapshot]:
-        def sort_key(item: tuple[str, Dict[str, Any]]):
-            value = item[1].get(self._field)
-            return (value is None, value)
-
-        ordered = sorted(self._store.items(), key=sort_key, reverse=self._reverse)
-        return [FakeSnapshot(doc_id, data) for doc_id, data in ordered]
-
-class FakeBatch:
-    def __init__(self) -> None:
-        self._ops: list[Tuple[str, FakeDocument, Dict[str, Any], bool]] = []
-
-    def set(self, doc_ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
-        self._ops.append(("set", doc_ref, data, merge))
-
-    def commit(self) -> None:
-        for action, doc_ref, data, merge in self._ops:
-            if action == "set":
-                doc_ref.set(data, merge=merge)
-        self._ops.clear()
-
-
-class FakeFirestore:
     def __init__(self) -> None:
-        self._collections: Dict[str, Dict[str, Any]] = {}
-
-    def collection(self, name: str) -> FakeCollection:
-        store = self._collections.setdefault(name, {})
-        return FakeCollection(store)
-
-    def batch(self) -> FakeBatch:
-        return FakeBatch()
+        super().__init__({})
 
     def get_document_data(self, collection: str, doc_id: str) -> Dict[str, Any]:
-        docs = self._collections.get(collection, {})
-        snapshot = FakeSnapshot(doc_id, docs.get(doc_id))
+        docs = self._store.get(collection, {})
+        snapshot = firebase_admin_stub._FakeSnapshot(doc_id, docs.get(doc_id))
         return snapshot.to_dict()
 
     def get_subcollection_docs(self, collection: str, doc_id: str, subcollection: str) -> Dict[str, Any]:
-        docs = self._collections.get(collection, {})
+        docs = self._store.get(collection, {})
         doc = docs.get(doc_id) or {}
         subcollections = doc.get("__subcollections__", {})
         result: Dict[str, Any] = {}
@@ -171,11 +54,12 @@ class FakeFirestore:
 
 
 class FakeRequest:
-    def __init__(self, payload: Dict[str, Any], headers: Dict[str, str] | None = None, args: Dict[str, Any] | None = None) -> None:
+    def __init__(self, payload: Dict[str, Any], headers: Dict[str, str] | None = None, args: Dict[str, Any] | None = None, stream: Any = None) -> None:
         self._payload = payload
         self.headers = headers or {}
         self.auth: Any = None
         self.args = args or {}
+        self.stream = stream
 
     def get_json(self) -> Dict[str, Any]:
         return self._payload
@@ -208,9 +92,13 @@ def _extract_json(response: Any) -> Dict[str, Any]:
 
 
 @pytest.fixture()
-def fake_firestore(monkeypatch: pytest.MonkeyPatch) -> FakeFirestore:
+def fake_firestore(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> FakeFirestore:
     store = FakeFirestore()
     monkeypatch.setattr(main, "db", store)
+    monkeypatch.setattr(main, "_blob_store", main.LocalBlobStore(tmp_path / "blobs"))
+    # Leases and cached profiles are per-instance state; start each test cold.
+    main._job_quota.reset()
+    main._profile_cache.clear()
     return store
 
 
@@ -296,7 +184,16 @@ def test_submit_job_success(fake_firestore: FakeFirestore, model_path_stub: Path
     assert job_doc["nextTitle"] is None
     assert job_doc["predictor"] == "standard"
     assert job_doc["predictors"]["standard"] is True
-    assert job_doc["brickplot"] == brickplot_stub
+    stored = job_doc["brickplot"]
+    assert stored["statistics"] == brickplot_stub["statistics"]
+    assert stored["sequence_length"] == brickplot_stub["sequence_length"]
+    assert {"image_base64", "matrix", "sequence"}.isdisjoint(stored)
+    blobs = main._get_blob_store()
+    image_pointer = stored["artifacts"]["image"]
+    assert image_pointer["key"] == f"jobs/test_user_123/{job_id}/brickplot.png"
+    assert blobs.get(image_pointer["key"]) == base64.b64decode(brickplot_stub["image_base64"])
+    matrix_blob = blobs.get(stored["artifacts"]["matrix"]["key"])
+    assert json.loads(gzip.decompress(matrix_blob)) == brickplot_stub["matrix"]
 
 
 def test_get_job_history_returns_documents(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any]) -> None:
@@ -327,6 +224,323 @@ def test_get_job_history_returns_documents(fake_firestore: FakeFirestore, model_
     assert history_body["jobs"][0]["jobTitle"] == "history-job"
 
 
+def _seed_history(store: FakeFirestore, count: int) -> list[str]:
+    from datetime import datetime, timedelta
+
+    jobs = store.collection("users").document("test_user_123").collection("jobhistory")
+    jobs.document("placeholder").set({"status": "placeholder", "uploadedAt": datetime(2020, 1, 1)})
+    base = datetime(2024, 1, 1)
+    job_ids = []
+    for index in range(count):
+        job_id = f"job_{index:02d}"
+        jobs.document(job_id).set(
+            {
+                "jobTitle": f"job-{index}",
+                "status": main.JOB_STATUS["COMPLETED"],
+                "uploadedAt": base + timedelta(minutes=index),
+                "sequence": "ATCG" * 10,
+                "brickplot": {"image_base64": "x" * 1000, "matrix": [[0.0]]},
+            }
+        )
+        job_ids.append(job_id)
+    return job_ids[::-1]  # newest first
+
+
+def test_get_job_history_paginates_with_cursor(fake_firestore: FakeFirestore) -> None:
+    newest_first = _seed_history(fake_firestore, 5)
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+
+    seen: list[str] = []
+    cursor = None
+    for _ in range(3):
+        args = {"limit": "2"}
+        if cursor:
+            args["startAfter"] = cursor
+        body = _extract_json(main.get_job_history(FakeRequest(payload={}, headers=headers, args=args)))
+        seen.extend(job["id"] for job in body["jobs"])
+        cursor = body["nextCursor"]
+        if cursor is None:
+            break
+
+    assert seen == newest_first
+    assert cursor is None
+
+
+def test_get_job_history_projects_summary_fields(fake_firestore: FakeFirestore) -> None:
+    _seed_history(fake_firestore, 2)
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+
+    summary = _extract_json(main.get_job_history(FakeRequest(payload={}, headers=headers)))
+    assert [job["jobTitle"] for job in summary["jobs"]] == ["job-1", "job-0"]
+    assert all("brickplot" not in job and "sequence" not in job for job in summary["jobs"])
+
+    full = _extract_json(main.get_job_history(FakeRequest(payload={"include": ["brickplot", "sequence"]}, headers=headers)))
+    assert all(job["brickplot"]["matrix"] == [[0.0]] and job["sequence"] for job in full["jobs"])
+
+    bad = main.get_job_history(FakeRequest(payload={"include": "everything"}, headers=headers))
+    assert _extract_status(bad) == 400
+    bad_limit = main.get_job_history(FakeRequest(payload={"limit": "many"}, headers=headers))
+    assert _extract_status(bad_limit) == 400
+
+
+def test_get_job_history_delta_sync_and_etag(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any]) -> None:
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    first_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG"}, headers=headers)))["jobId"]
+    second_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG"}, headers=headers)))["jobId"]
+
+    full = main.get_job_history(FakeRequest(payload={}, headers=headers))
+    body = _extract_json(full)
+    assert [job["id"] for job in body["jobs"]] == [second_id, first_id]
+    etag = full.headers["ETag"]
+    watermark = body["watermark"]
+
+    fake_firestore.reset_operations()
+    unchanged = main.get_job_history(FakeRequest(payload={}, headers={**headers, "If-None-Match": etag}))
+    assert _extract_status(unchanged) == 304
+    assert fake_firestore.operations.round_trips == 1
+    assert fake_firestore.operations["query_results"] == 1
+
+    third_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG"}, headers=headers)))["jobId"]
+    changed = main.get_job_history(FakeRequest(payload={"since": watermark}, headers={**headers, "If-None-Match": etag}))
+    assert _extract_status(changed) == 200
+    delta = _extract_json(changed)
+    # The new job, plus the previous tail whose nextTitle now points at it.
+    assert [job["id"] for job in delta["jobs"]] == [second_id, third_id]
+    assert delta["jobs"][0]["nextTitle"] == third_id
+    assert delta["watermark"] > watermark
+
+    quiet = _extract_json(main.get_job_history(FakeRequest(payload={"since": delta["watermark"]}, headers=headers)))
+    assert quiet["jobs"] == [] and quiet["watermark"] == delta["watermark"]
+
+    bad = main.get_job_history(FakeRequest(payload={"since": "yesterday"}, headers=headers))
+    assert _extract_status(bad) == 400
+
+
+def test_history_lists_thumbnails_and_loads_full_image_lazily(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any]) -> None:
+    brickplot_stub["thumbnail_base64"] = base64.b64encode(b"tiny-png").decode("ascii")
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    job_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG"}, headers=headers)))["jobId"]
+
+    history = _extract_json(main.get_job_history(FakeRequest(payload={}, headers=headers)))
+    (job,) = history["jobs"]
+    assert job["thumbnail"] == brickplot_stub["thumbnail_base64"]
+    assert "brickplot" not in job
+
+    artifact = main.get_job_artifact(FakeRequest(payload={"jobId": job_id, "artifact": "image"}, headers=headers))
+    assert _extract_status(artifact) == 200
+    body = _extract_json(artifact)
+    assert body["contentType"] == "image/png"
+    assert body["data"] == brickplot_stub["image_base64"]
+
+    missing = main.get_job_artifact(FakeRequest(payload={"jobId": "job_missing"}, headers=headers))
+    assert _extract_status(missing) == 404
+
+
+def test_submit_job_batch_scores_every_record(fake_firestore: FakeFirestore, model_path_stub: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    seen: Dict[str, Any] = {}
+
+    def fake_batch(**kwargs: Any) -> Dict[str, Any]:
+        seen.update(kwargs)
+        records = [
+            {"id": "p1", "status": "completed", "sequence_length": 12, "statistics": {"min_energy": -5.0}, "thumbnail_base64": "dGh1bWI=", "matrix": [[-5.0]]},
+            {"id": "p2", "status": "error", "error": "Invalid characters in sequence"},
+        ]
+        summary = {"total": 2, "completed": 1, "failed": 1, "lengthGroups": 1, "best": {"id": "p1", "statistics": {"min_energy": -5.0}}}
+        return {"mode": "batch", "records": records, "summary": summary, "thumbnail_base64": "dGh1bWI="}
+
+    monkeypatch.setattr(main, "get_batch_brickplot", fake_batch)
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    fasta = ">p1 first\nATCGATCGATCG\n>p2\nATCGNNCGATCG\n"
+    response = main.submit_job(FakeRequest(payload={"fileContent": fasta, "fileName": "lib.fasta", "batch": True}, headers=headers))
+
+    assert _extract_status(response) == 200
+    body = _extract_json(response)
+    assert seen["records"] == [["p1 first", "ATCGATCGATCG"], ["p2", "ATCGNNCGATCG"]]
+    assert [record["status"] for record in body["brickplot"]["records"]] == ["completed", "error"]
+    assert "matrix" not in body["brickplot"]["records"][0]
+
+    job_doc = fake_firestore.get_subcollection_docs("users", "test_user_123", "jobhistory")[body["jobId"]]
+    assert job_doc["status"] == main.JOB_STATUS["COMPLETED"]
+    assert job_doc["mode"] == "batch"
+    assert job_doc["batch"]["failed"] == 1
+    assert job_doc["thumbnail"] == "dGh1bWI="
+    pointer = job_doc["brickplot"]["artifacts"]["records"]
+    stored_records = json.loads(gzip.decompress(main._get_blob_store().get(pointer["key"])))
+    assert stored_records[0]["matrix"] == [[-5.0]]
+
+
+def test_submit_job_batch_fails_when_no_record_scores(fake_firestore: FakeFirestore, model_path_stub: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    summary = {"total": 1, "completed": 0, "failed": 1, "lengthGroups": 0, "best": None}
+    monkeypatch.setattr(
+        main,
+        "get_batch_brickplot",
+        lambda **_kwargs: {"mode": "batch", "records": [{"id": "p1", "status": "error", "error": "x"}], "summary": summary},
+    )
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    response = main.submit_job(FakeRequest(payload={"fileContent": ">p1\nNNNN\n", "fileName": "lib.fasta", "batch": True}, headers=headers))
+
+    assert _extract_status(response) == 400
+    (job_doc,) = fake_firestore.get_subcollection_docs("users", "test_user_123", "jobhistory").values()
+    assert job_doc["status"] == main.JOB_STATUS["ERROR"]
+
+
+def test_submit_job_batch_accepts_gzipped_upload(fake_firestore: FakeFirestore, model_path_stub: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    seen: Dict[str, Any] = {}
+
+    def fake_batch(**kwargs: Any) -> Dict[str, Any]:
+        seen.update(kwargs)
+        records = [{"id": record_id, "status": "completed", "statistics": {"min_energy": -5.0}} for record_id, _ in kwargs["records"]]
+        summary = {"total": len(records), "completed": len(records), "failed": 0, "lengthGroups": 1, "best": None}
+        return {"mode": "batch", "records": records, "summary": summary}
+
+    monkeypatch.setattr(main, "get_batch_brickplot", fake_batch)
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    compressed = base64.b64encode(gzip.compress(b">p1\nATCGATCG\nATCG\n>p2\nGGGGCCCCAAAA\n")).decode("ascii")
+    payload = {"fileContent": compressed, "fileName": "lib.fa.gz", "batch": True}
+    response = main.submit_job(FakeRequest(payload=payload, headers=headers))
+
+    assert _extract_status(response) == 200
+    assert seen["records"] == [["p1", "ATCGATCGATCG"], ["p2", "GGGGCCCCAAAA"]]
+
+    truncated = base64.b64encode(gzip.compress(b">p1\nATCGATCGATCG\n")[:-6]).decode("ascii")
+    response = main.submit_job(FakeRequest(payload={**payload, "fileContent": truncated}, headers=headers))
+    assert _extract_status(response) == 400
+    assert "decompress" in _extract_json(response)["error"]
+
+
+class TrickleStream(io.RawIOBase):
+    """Request body that hands out a few bytes per read and counts them."""
+
+    def __init__(self, body: bytes) -> None:
+        self._body = body
+        self.consumed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:  # type: ignore[override]
+        chunk = self._body[self.consumed: self.consumed + min(len(buffer), 1024)]
+        buffer[: len(chunk)] = chunk
+        self.consumed += len(chunk)
+        return len(chunk)
+
+
+def _multipart_request(payload: Dict[str, Any], file_name: str, file_bytes: bytes) -> tuple[FakeRequest, TrickleStream]:
+    boundary = "thermoters-test-boundary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"payload\"\r\n\r\n{json.dumps(payload)}\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{file_name}\"\r\n"
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + file_bytes + f"\r\n--{boundary}--\r\n".encode()
+    stream = TrickleStream(body)
+    headers = {
+        "X-Test-Auth": "true",
+        "Authorization": "Bearer token",
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+    }
+    return FakeRequest(payload={}, headers=headers, stream=stream), stream
+
+
+def test_submit_job_streams_multipart_batch_while_reading(fake_firestore: FakeFirestore, model_path_stub: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    fasta = "".join(f">p{i}\nATCGATCGATCG\n" for i in range(2000)).encode()
+    request, stream = _multipart_request({"batch": True, "jobTitle": "Streamed"}, "lib.fa", fasta)
+    seen: Dict[str, Any] = {}
+
+    def fake_batch(**kwargs: Any) -> Dict[str, Any]:
+        records = []
+        for record_id, _ in kwargs["records"]:
+            seen.setdefault("consumed_at_first_record", stream.consumed)
+            records.append({"id": record_id, "status": "completed", "statistics": {"min_energy": -5.0}})
+        summary = {"total": len(records), "completed": len(records), "failed": 0, "lengthGroups": 1, "best": None}
+        return {"mode": "batch", "records": records, "summary": summary}
+
+    monkeypatch.setattr(main, "get_batch_brickplot", fake_batch)
+    response = main.submit_job(request)
+
+    assert _extract_status(response) == 200
+    assert _extract_json(response)["brickplot"]["summary"]["total"] == 2000
+    assert seen["consumed_at_first_record"] < len(fasta) / 4
+    job = fake_firestore.get_subcollection_docs("users", "test_user_123", "jobhistory")[_extract_json(response)["jobId"]]
+    assert job["jobTitle"] == "Streamed"
+    assert job["batch"]["total"] == 2000
+
+
+def test_submit_job_multipart_single_sequence_and_size_limits(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any], monkeypatch: pytest.MonkeyPatch) -> None:
+    request, _ = _multipart_request({}, "promoters.fa.gz", gzip.compress(b">bad\nXXXX\n>p1\nATCGATCGATCG\n"))
+    response = main.submit_job(request)
+    assert _extract_status(response) == 200
+    assert _extract_json(response)["brickplot"] == brickplot_stub
+
+    def consuming_batch(**kwargs: Any) -> Dict[str, Any]:
+        records = [{"id": record_id, "status": "completed"} for record_id, _ in kwargs["records"]]
+        return {"mode": "batch", "records": records, "summary": {"total": len(records), "completed": len(records)}}
+
+    monkeypatch.setattr(main, "get_batch_brickplot", consuming_batch)
+    monkeypatch.setattr(main, "UPLOAD_MAX_DECOMPRESSED_BYTES", 4096)
+    bomb, _ = _multipart_request({"batch": True}, "lib.fa.gz", gzip.compress(b">p1\n" + b"A" * 100_000 + b"\n"))
+    response = main.submit_job(bomb)
+    assert _extract_status(response) == 413
+    assert "Decompressed upload" in _extract_json(response)["error"]
+
+    monkeypatch.setattr(main, "UPLOAD_MAX_BYTES", 2048)
+    large, stream = _multipart_request({"batch": True}, "lib.fa", b">p1\n" + b"ACGT" * 10_000 + b"\n")
+    response = main.submit_job(large)
+    assert _extract_status(response) == 413
+    assert stream.consumed <= 2048 + 1024
+
+
+@pytest.fixture()
+def job_queue(monkeypatch: pytest.MonkeyPatch):
+    queue = InProcessJobQueue(main._process_job_task, workers=1)
+    monkeypatch.setattr(main, "_job_queue", queue)
+    yield queue
+    queue.close()
+
+
+def test_submit_job_async_returns_pending_and_worker_completes(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any], job_queue: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    release = threading.Event()
+
+    def slow_brickplot(**_kwargs: Any) -> Dict[str, Any]:
+        release.wait(timeout=5)
+        return brickplot_stub
+
+    monkeypatch.setattr(main, "get_brickplot", slow_brickplot)
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    response = main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG", "async": True}, headers=headers))
+    assert _extract_status(response) == 202
+    body = _extract_json(response)
+    assert body["status"] == main.JOB_STATUS["PENDING"]
+    assert "brickplot" not in body
+
+    polled = main.get_job_status(FakeRequest(payload={"jobId": body["jobId"]}, headers=headers))
+    assert _extract_status(polled) == 200
+    assert _extract_json(polled)["status"] in (main.JOB_STATUS["PENDING"], main.JOB_STATUS["PROCESSING"])
+    assert polled.headers["Retry-After"] == "2"
+
+    release.set()
+    assert job_queue.join(timeout=5)
+    done = _extract_json(main.get_job_status(FakeRequest(payload={"jobId": body["jobId"]}, headers=headers)))
+    assert done["status"] == main.JOB_STATUS["COMPLETED"]
+    assert done["brickplot"]["statistics"] == brickplot_stub["statistics"]
+
+    missing = main.get_job_status(FakeRequest(payload={"jobId": "job_missing"}, headers=headers))
+    assert _extract_status(missing) == 404
+
+
+def test_submit_job_async_records_worker_errors(fake_firestore: FakeFirestore, model_path_stub: Path, job_queue: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    def failing_brickplot(**_kwargs: Any) -> Dict[str, Any]:
+        raise ValueError("model exploded")
+
+    monkeypatch.setattr(main, "get_brickplot", failing_brickplot)
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    job_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG", "async": True}, headers=headers)))["jobId"]
+    assert job_queue.join(timeout=5)
+
+    status = _extract_json(main.get_job_status(FakeRequest(payload={"jobId": job_id}, headers=headers)))
+    assert status["status"] == main.JOB_STATUS["ERROR"]
+    assert status["error"] == "model exploded"
+
+
 def test_submit_job_appends_linked_list(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any]) -> None:
     main.create_user_document(
         SimpleNamespace(data=SimpleNamespace(uid="test_user_123", email="user@example.com", provider_id="google.com"))
@@ -367,6 +581,121 @@ def test_submit_job_appends_linked_list(fake_firestore: FakeFirestore, model_pat
     assert job_docs[job_id_two]["nextTitle"] is None
 
 
+def test_submit_job_round_trip_budget(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any]) -> None:
+    main.create_user_document(
+        SimpleNamespace(data=SimpleNamespace(uid="test_user_123", email="user@example.com", provider_id="google.com"))
+    )
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    first = main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG", "jobTitle": "job-1"}, headers=headers))
+    assert _extract_status(first) == 200
+
+    fake_firestore.reset_operations()
+    second = main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG", "jobTitle": "job-2"}, headers=headers))
+    assert _extract_status(second) == 200
+
+    # Cached profile, one bookkeeping batch, one result write.
+    ops = fake_firestore.operations
+    assert (ops["reads"], ops["commits"], ops["writes"], ops["queries"]) == (0, 1, 1, 0)
+    assert ops.round_trips == 2
+
+
+def test_submit_job_round_trip_budget_without_profile_cache(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main._profile_cache, "enabled", False)
+    main.create_user_document(
+        SimpleNamespace(data=SimpleNamespace(uid="test_user_123", email="user@example.com", provider_id="google.com"))
+    )
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG", "jobTitle": "job-1"}, headers=headers))
+
+    fake_firestore.reset_operations()
+    response = main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG", "jobTitle": "job-2"}, headers=headers))
+    assert _extract_status(response) == 200
+
+    # One profile read, one bookkeeping batch, one result write.
+    ops = fake_firestore.operations
+    assert (ops["reads"], ops["commits"], ops["writes"]) == (1, 1, 1)
+    assert main._profile_cache.metrics()["size"] == 0
+
+
+def test_profile_cache_writes_through_submit_job(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any]) -> None:
+    headers = {"X-Test-Auth": "true", "Authorization": "Bearer token"}
+    first_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG"}, headers=headers)))["jobId"]
+    second_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG"}, headers=headers)))["jobId"]
+    third_id = _extract_json(main.submit_job(FakeRequest(payload={"sequence": "ATCGATCGATCG"}, headers=headers)))["jobId"]
+
+    job_docs = fake_firestore.get_subcollection_docs("users", "test_user_123", "jobhistory")
+    assert job_docs[first_id]["nextTitle"] == second_id
+    assert job_docs[second_id]["nextTitle"] == third_id
+    user_doc = fake_firestore.get_document_data("users", "test_user_123")
+    assert user_doc["monthlyUsage"]["count"] == 3
+
+    metrics = main._profile_cache.metrics()
+    assert metrics["misses"] == 1 and metrics["hits"] == 2
+
+    history = main.get_job_history(FakeRequest(payload={}, headers=headers))
+    body = _extract_json(history)
+    assert (body["firstJob"], body["lastJob"]) == (first_id, third_id)
+
+
+def test_submit_job_bootstraps_missing_user_in_one_batch(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any]) -> None:
+    request = FakeRequest(
+        payload={"sequence": "ATCGATCGATCG", "jobTitle": "first"},
+        headers={"X-Test-Auth": "true", "Authorization": "Bearer token", "X-Test-Provider": "google.com", "X-Test-Email": "user@example.com"},
+    )
+    response = main.submit_job(request)
+    assert _extract_status(response) == 200
+    # Profile read, quota lease transaction (read + commit), bookkeeping batch, result write.
+    assert fake_firestore.operations.round_trips == 5
+
+    job_id = _extract_json(response)["jobId"]
+    user_doc = fake_firestore.get_document_data("users", "test_user_123")
+    assert user_doc["authProvider"] == "google.com"
+    assert user_doc["email"] == "user@example.com"
+    assert user_doc["monthlyUsage"]["count"] == 1
+    assert user_doc["firstJob"] == job_id == user_doc["lastJob"]
+
+
+def test_submit_job_coalesces_concurrent_identical_requests(fake_firestore: FakeFirestore, model_path_stub: Path, brickplot_stub: Dict[str, Any], monkeypatch: pytest.MonkeyPatch) -> None:
+    flights = main.SingleFlight()
+    monkeypatch.setattr(main, "_BRICKPLOT_FLIGHTS", flights)
+    release = threading.Event()
+    calls: list[Dict[str, Any]] = []
+
+    def slow_brickplot(**kwargs: Any) -> Dict[str, Any]:
+        calls.append(kwargs)
+        assert release.wait(timeout=5)
+        return brickplot_stub
+
+    monkeypatch.setattr(main, "get_brickplot", slow_brickplot)
+
+    responses: list[Any] = []
+
+    def submit(index: int) -> None:
+        request = FakeRequest(
+            payload={"sequence": "ATCGATCGATCG", "jobTitle": f"workshop-{index}"},
+            headers={"X-Test-Auth": "true", "Authorization": "Bearer token"},
+        )
+        responses.append(main.submit_job(request))
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flights.stats["coalesced"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(calls) == 1
+    assert flights.in_flight() == 0
+    assert [_extract_status(r) for r in responses] == [200] * 4
+    job_ids = {_extract_json(r)["jobId"] for r in responses}
+    assert len(job_ids) == 4
+    job_docs = fake_firestore.get_subcollection_docs("users", "test_user_123", "jobhistory")
+    assert all(job_docs[job_id]["status"] == main.JOB_STATUS["COMPLETED"] for job_id in job_ids)
+
+
 def test_submit_job_unauthorized(fake_firestore: FakeFirestore, model_path_stub: Path) -> None:
     request = FakeRequest(payload={})
     response = main.submit_job(request)
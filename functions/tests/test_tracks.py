@@ -0,0 +1,106 @@
+"""Tests for genome-wide track writers and scans."""
+from __future__ import annotations
+
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.sequence_io import convert_to_packed
+    from functions.utils.tracks import BedGraphWriter, BinaryTrackWriter, TrackFile
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.sequence_io import convert_to_packed
+    from functions.utils.tracks import BedGraphWriter, BinaryTrackWriter, TrackFile
+
+pytestmark = pytest.mark.filterwarnings("ignore::sklearn.exceptions.InconsistentVersionWarning")
+
+MODEL_PATH = Path(__file__).resolve().parents[1] / "models" / "fitted_on_Pr" / "model_[3]_stm+flex+cumul+rbs.dmp"
+
+
+def _write_in_chunks(writer, chrom: str, values: np.ndarray, sizes: list[int]) -> None:
+    writer.begin(chrom, len(values))
+    position = 0
+    for size in sizes:
+        writer.write(values[position: position + size])
+        position += size
+    writer.end()  # pads the rest with NaN
+
+
+def test_writers_round_trip_values_runs_and_zoom_levels(tmp_path: Path) -> None:
+    values = np.random.default_rng(0).normal(size=5_000)
+    values[:3] = np.nan
+    values[100:140] = 1.25
+    values[2_000:2_500] = np.nan
+    sizes = [7, 500, 1, 1_333, 2_000]  # leaves the last 159 values unwritten
+
+    with BedGraphWriter(tmp_path / "t.bedGraph") as bedgraph, BinaryTrackWriter(tmp_path / "t.trk", zoom_bins=(16, 256)) as binary:
+        for writer in (bedgraph, binary):
+            _write_in_chunks(writer, "chrA", values, sizes)
+            _write_in_chunks(writer, "chrB", values[:300], [300])
+    expected = values.copy()
+    expected[sum(sizes):] = np.nan
+
+    lines = [line.split("\t") for line in (tmp_path / "t.bedGraph").read_text().splitlines()[1:]]
+    covered = np.full(len(values), np.nan)
+    for chrom, start, end, value in lines:
+        if chrom == "chrA":
+            covered[int(start):int(end)] = float(value)
+    assert np.allclose(covered, np.round(expected, 3), equal_nan=True)
+    assert ["chrA", "100", "140", "1.250"] in lines
+
+    track = TrackFile(tmp_path / "t.trk")
+    assert track.chroms == {"chrA": 5_000, "chrB": 300}
+    assert np.allclose(track.values("chrA", 90, 4_900), expected[90:4_900].astype(np.float32), equal_nan=True)
+    assert np.allclose(track.values("chrB"), values[:300].astype(np.float32), equal_nan=True)
+
+    for start, end, bins in [(0, 4_096, 4), (512, 4_608, 16), (1_000, 1_010, 5)]:  # zoom-aligned, then per-base
+        summary = track.summary("chrA", start, end, bins=bins)
+        blocks = expected[start:end].astype(np.float32).reshape(bins, -1)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            assert np.allclose(summary["min"], np.nanmin(blocks, axis=1), equal_nan=True)
+            assert np.allclose(summary["max"], np.nanmax(blocks, axis=1), equal_nan=True)
+            assert np.allclose(summary["mean"], np.nanmean(blocks, axis=1), equal_nan=True)
+
+
+@pytest.mark.skipif(not MODEL_PATH.exists(), reason="model file missing")
+def test_scan_tracks_matches_whole_chromosome_scoring(tmp_path: Path) -> None:
+    sequence = "".join(np.random.default_rng(4).choice(list("ACGT"), size=12_000))
+    sequence = sequence[:5_000] + "NNN" + sequence[5_003:]
+    genome = tmp_path / "genome.fa"
+    genome.write_text(">chr1\n" + "\n".join(sequence[i:i + 60] for i in range(0, len(sequence), 60)) + "\n>tiny\nACGT\n")
+
+    plotter = BrickPlotter(model=str(MODEL_PATH), output_folder=str(tmp_path))
+    result = plotter.scan_tracks(genome, tmp_path / "out" / "scan", tile=2_500, row_block=100, peak_threshold=10.0)
+    assert result["chromosomes"] == 2
+    footprint = result["footprint"]
+
+    data_id = plotter.model["DataIDs"][0]
+    bricks = plotter._brick_dict(encode_sequence(sequence[:5_000])[np.newaxis], data_id, both_strands=True)
+    reference = np.minimum(bricks[data_id][0].min(axis=1), bricks[data_id + "_rc"][0].min(axis=1))
+
+    track = TrackFile(tmp_path / "out" / "scan.minEnergy.trk")
+    values = np.asarray(track.values("chr1"))
+    assert len(reference) == 5_000 - footprint
+    assert np.isnan(values[0]) and np.isnan(values[12_000 - footprint + 1:]).all()
+    assert np.allclose(values[1: len(reference) + 1], reference, atol=1e-4)
+    assert np.isnan(values[5_000 - footprint + 1: 5_004]).all()  # every site touching the N run
+    assert np.isfinite(values[5_004: 12_000 - footprint + 1]).all()
+    assert np.isnan(np.asarray(track.values("tiny"))).all()
+
+    packed = tmp_path / "genome.2bp"
+    convert_to_packed(genome, packed)
+    plotter.scan_tracks(packed, tmp_path / "packed" / "scan", formats=("binary",), signals=("minEnergy",), tile=4_000, peak_threshold=10.0)
+    assert np.array_equal(np.asarray(TrackFile(tmp_path / "packed" / "scan.minEnergy.trk").values("chr1")), values, equal_nan=True)
+    peaks = (tmp_path / "out" / "scan.peaks.bed").read_text()
+    assert result["peaks"] == len(peaks.splitlines()) > 0
+    assert (tmp_path / "packed" / "scan.peaks.bed").read_text() == peaks  # independent of tile size
@@ -0,0 +1,112 @@
+"""Tests for annotation-driven upstream-region scoring."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+try:
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.sequence_io import convert_to_packed, reverse_complement
+    from functions.utils.upstream import GeneStart, read_gene_starts, upstream_windows
+except ModuleNotFoundError:  # pragma: no cover - fallback when tests run from repo root
+    import sys
+
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from functions.src.BrickPlotter import BrickPlotter
+    from functions.utils.encoding import encode_sequence
+    from functions.utils.sequence_io import convert_to_packed, reverse_complement
+    from functions.utils.upstream import GeneStart, read_gene_starts, upstream_windows
+
+pytestmark = pytest.mark.filterwarnings("ignore::sklearn.exceptions.InconsistentVersionWarning")
+
+MODEL_PATH = Path(__file__).resolve().parents[1] / "models" / "fitted_on_Pr" / "model_[3]_stm+flex+cumul+rbs.dmp"
+
+
+@pytest.fixture()
+def genome(tmp_path: Path) -> tuple[Path, str]:
+    sequence = "".join(np.random.default_rng(7).choice(list("ACGT"), size=5_000))
+    sequence = sequence[:4_000] + "N" * 10 + sequence[4_010:]
+    path = tmp_path / "genome.fa"
+    path.write_text(">chr1 test genome\n" + "\n".join(sequence[i:i + 70] for i in range(0, len(sequence), 70)) + "\n")
+    return path, sequence
+
+
+def test_gff_and_bed_give_the_same_gene_starts(tmp_path: Path) -> None:
+    gff = tmp_path / "genes.gff3"
+    gff.write_text(
+        "##gff-version 3\n"
+        "chr1\tsrc\tgene\t1001\t1500\t.\t+\t.\tID=gene-a;Name=geneA\n"
+        "chr1\tsrc\tCDS\t1001\t1500\t.\t+\t0\tID=cds-a\n"
+        "chr1\tsrc\tgene\t2001\t2600\t.\t-\t.\tID=gene-b;Name=gene%20B\n"
+    )
+    bed = tmp_path / "genes.bed"
+    bed.write_text("track name=genes\nchr1\t1000\t1500\tgeneA\t0\t+\nchr1\t2000\t2600\tgene B\t0\t-\n")
+
+    expected = [GeneStart("geneA", "chr1", 1000, "+"), GeneStart("gene B", "chr1", 2599, "-")]
+    assert read_gene_starts(gff) == expected
+    assert read_gene_starts(bed) == expected
+
+    gtf = tmp_path / "genes.gtf"
+    gtf.write_text('chr1\tsrc\tgene\t1001\t1500\t.\t+\t.\tgene_id "g1"; gene_name "geneA";\n')
+    assert read_gene_starts(gtf) == expected[:1]
+
+
+def test_windows_follow_the_gene_strand(genome: tuple[Path, str]) -> None:
+    _, sequence = genome
+    codes = encode_sequence(sequence, "mask")
+    starts = np.array([1000, 2599, 5, 4_990, 4_020])
+    strands = np.array([False, True, False, True, False])
+    batch, inside = upstream_windows(codes, starts, strands, before=60, after=20)
+
+    assert inside.tolist() == [True, True, False, False, False]  # off either end, then across the N run
+    assert batch[0].tolist() == encode_sequence(sequence[940:1020]).tolist()
+    assert batch[1].tolist() == encode_sequence(reverse_complement(sequence[2580:2660])).tolist()
+    assert np.shares_memory(np.lib.stride_tricks.sliding_window_view(codes[::-1], 80), codes)
+
+
+@pytest.mark.skipif(not MODEL_PATH.exists(), reason="model file missing")
+def test_score_upstream_matches_scoring_each_window(genome: tuple[Path, str], tmp_path: Path) -> None:
+    path, sequence = genome
+    plotter = BrickPlotter(model=str(MODEL_PATH), output_folder=str(tmp_path))
+    genes = [
+        GeneStart("a", "chr1", 1_000, "+"),
+        GeneStart("b", "chr1", 2_599, "-"),
+        GeneStart("edge", "chr1", 10, "+"),
+        GeneStart("lost", "chrX", 500, "+"),
+        GeneStart("c", "chr1", 3_500, "-"),
+    ]
+    table = plotter.score_upstream(path, genes, upstream=80, chunk_size=2)
+    assert [row["status"] for row in table["genes"]] == ["completed", "completed", "error", "error", "completed"]
+    assert "chrX" in table["genes"][3]["error"]
+    assert table["summary"]["completed"] == 3
+
+    data_id = plotter.model["DataIDs"][0]
+    for row in (table["genes"][0], table["genes"][1], table["genes"][4]):
+        window = sequence[row["windowStart"]:row["windowEnd"]]
+        if row["strand"] == "-":
+            window = reverse_complement(window)
+        (expected,) = plotter._occupancy(encode_sequence(window)[np.newaxis], data_id)
+        assert len(window) == table["summary"]["windowLength"]
+        assert row["logPon"] == pytest.approx(expected["logPon"])
+        assert (row["bestRow"], row["bestSpacer"]) == (expected["bestRow"], expected["bestSpacer"])
+
+    packed = tmp_path / "genome.2bp"
+    convert_to_packed(path, packed)
+    assert plotter.score_upstream(packed, genes, upstream=80, chunk_size=2) == table
+
+
+@pytest.mark.skipif(not MODEL_PATH.exists(), reason="model file missing")
+def test_score_upstream_uses_the_first_record_of_a_repeated_chromosome(genome: tuple[Path, str], tmp_path: Path) -> None:
+    path, sequence = genome
+    path.write_text(path.read_text() + ">chr1 dup\n" + sequence[::-1] + "\n")
+    plotter = BrickPlotter(model=str(MODEL_PATH), output_folder=str(tmp_path))
+    genes = [GeneStart("a", "chr1", 1_000, "+"), GeneStart("b", "chr1", 2_599, "-")]
+    table = plotter.score_upstream(path, genes, upstream=80)
+    assert table["summary"]["completed"] == 2
+
+    single = tmp_path / "single.fa"
+    single.write_text(">chr1\n" + sequence + "\n")
+    assert table["genes"] == plotter.score_upstream(single, genes, upstream=80)["genes"]
@@ -0,0 +1,99 @@
+"""Blob storage for large job artifacts kept out of Firestore documents.
+
+Stores hand back a small pointer dict that is safe to embed in a job
+document::
+
+    {"store": "gcs", "bucket": "thermoters-jobs", "key": "jobs/u/j/brickplot.png",
+     "contentType": "image/png", "size": 171234}
+
+``LocalBlobStore`` writes under a directory and stands in for Cloud Storage
+in tests and local runs; ``GCSBlobStore`` is used in production.
+"""
+from __future__ import annotations
+
+import os
+from datetime import timedelta
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Optional
+
+DEFAULT_BUCKET = "thermoters-jobs"
+
+
+def _check_key(key: str) -> str:
+    parts = PurePosixPath(key).parts
+    if not parts or key.startswith("/") or ".." in parts:
+        raise ValueError(f"Invalid blob key: {key!r}")
+    return key
+
+
+class LocalBlobStore:
+    """Filesystem-backed blob store."""
+
+    kind = "local"
+
+    def __init__(self, root: str | os.PathLike[str]) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / _check_key(key)
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> Dict[str, Any]:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)  # readers never see a partially written blob
+        return {"store": self.kind, "key": key, "contentType": content_type, "size": len(data)}
+
+    def get(self, key: str) -> bytes:
+        path = self._path(key)
+        if not path.is_file():
+            raise KeyError(key)
+        return path.read_bytes()
+
+    def url(self, key: str, expiration: timedelta = timedelta(hours=1)) -> str:
+        return self._path(key).resolve().as_uri()
+
+
+class GCSBlobStore:
+    """Cloud Storage blob store; requires ``google-cloud-storage``."""
+
+    kind = "gcs"
+
+    def __init__(self, bucket_name: str = DEFAULT_BUCKET, client: Optional[Any] = None) -> None:
+        if client is None:
+            from google.cloud import storage  # imported lazily: optional at test time
+
+            client = storage.Client()
+        self.bucket_name = bucket_name
+        self._bucket = client.bucket(bucket_name)
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> Dict[str, Any]:
+        blob = self._bucket.blob(_check_key(key))
+        blob.upload_from_string(data, content_type=content_type)
+        return {
+            "store": self.kind,
+            "bucket": self.bucket_name,
+            "key": key,
+            "contentType": content_type,
+            "size": len(data),
+        }
+
+    def get(self, key: str) -> bytes:
+        blob = self._bucket.blob(_check_key(key))
+        if not blob.exists():
+            raise KeyError(key)
+        return blob.download_as_bytes()
+
+    def url(self, key: str, expiration: timedelta = timedelta(hours=1)) -> str:
+        blob = self._bucket.blob(_check_key(key))
+        return blob.generate_signed_url(version="v4", expiration=expiration, method="GET")
+
+
+def blob_store_from_spec(spec: str) -> LocalBlobStore | GCSBlobStore:
+    """Build a store from ``gs://bucket`` or a filesystem path (``file://`` optional)."""
+    if spec.startswith("gs://"):
+        return GCSBlobStore(spec[len("gs://"):].strip("/"))
+    if spec.startswith("file://"):
+        spec = spec[len("file://"):]
+    return LocalBlobStore(spec)
@@ -0,0 +1,37 @@
+"""Within-batch deduplication of sequences before scoring.
+
+Libraries repeat sequences (replicate barcodes, controls on every plate).
+Callers score only the representatives returned by :func:`unique_indices`
+and copy each representative's result to its duplicates via ``inverse``.
+"""
+from __future__ import annotations
+
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+
+def unique_indices(keys: Sequence[Hashable]) -> Tuple[List[int], List[int]]:
+    """Return ``(representatives, inverse)`` for ``keys``.
+
+    ``representatives`` are the positions of first occurrences, in input
+    order. ``inverse[i]`` is the position in ``representatives`` of the
+    representative of ``keys[i]``.
+    """
+    seen: Dict[Hashable, int] = {}
+    representatives: List[int] = []
+    inverse: List[int] = []
+    for position, key in enumerate(keys):
+        slot = seen.get(key)
+        if slot is None:
+            slot = seen[key] = len(representatives)
+            representatives.append(position)
+        inverse.append(slot)
+    return representatives, inverse
+
+
+def dedup_stats(total: int, unique: int) -> Dict[str, float]:
+    return {
+        "records": total,
+        "unique": unique,
+        "duplicates": total - unique,
+        "dedupRatio": round(total / unique, 6) if unique else 1.0,
+    }
@@ -0,0 +1,99 @@
+"""Vectorized nucleotide encoding for scoring.
+
+Sequences are mapped to base indices (``a=0, c=1, g=2, t=3``, the column
+order of the model matrices) by pushing their raw bytes through a
+256-entry lookup table with ``np.frombuffer`` instead of looking up every
+character in a dict. ``U`` encodes as ``T``. ``N`` and the other IUPAC
+ambiguity codes follow a policy:
+
+- ``"reject"`` (default): raise ``ValueError``, like any other invalid character.
+- ``"mask"``: encode as :data:`MASKED` (``-1``). The scoring functions index
+  matrices with these codes, so masked arrays are for callers that drop or
+  blank the affected windows themselves.
+- ``"random"``: draw a base compatible with the code (``R`` gives ``A`` or
+  ``G``), from ``rng`` for reproducibility.
+"""
+from __future__ import annotations
+
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+MASKED = -1
+N_POLICIES = ("reject", "mask", "random")
+IUPAC_CODES = b"NRYKMSWBDHV"
+
+_INVALID = 255
+_AMBIGUOUS = 254
+
+# Bases compatible with each IUPAC code, in a/c/g/t order.
+_IUPAC_BASES = {
+    "N": "ACGT", "R": "AG", "Y": "CT", "K": "GT", "M": "AC", "S": "CG", "W": "AT",
+    "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG",
+}
+
+_LUT = np.full(256, _INVALID, dtype=np.uint8)
+_COMPATIBLE = np.zeros((256, 4), dtype=bool)
+for _index, _base in enumerate("ACGT"):
+    for _letter in (_base, _base.lower()):
+        _LUT[ord(_letter)] = _index
+_LUT[ord("U")] = _LUT[ord("u")] = 3
+for _code, _bases in _IUPAC_BASES.items():
+    for _letter in (_code, _code.lower()):
+        _LUT[ord(_letter)] = _AMBIGUOUS
+        _COMPATIBLE[ord(_letter), ["ACGT".index(base) for base in _bases]] = True
+
+
+def _as_bytes(sequence: Union[str, bytes]) -> bytes:
+    # Non-ASCII characters become "?", which the table marks invalid.
+    return sequence if isinstance(sequence, bytes) else sequence.encode("ascii", "replace")
+
+
+def _encode_raw(raw: np.ndarray, n_policy: str, rng: Optional[np.random.Generator]) -> np.ndarray:
+    if n_policy not in N_POLICIES:
+        raise ValueError(f"Unknown N policy: {n_policy!r}; expected one of {N_POLICIES}")
+    codes = _LUT[raw]
+    invalid = codes == _INVALID
+    if invalid.any():
+        position = int(np.argmax(invalid.ravel()))
+        raise ValueError(f"Invalid character {chr(raw.ravel()[position])!r} in sequence")
+    ambiguous = codes == _AMBIGUOUS
+    if ambiguous.any():
+        if n_policy == "reject":
+            position = int(np.argmax(ambiguous.ravel()))
+            raise ValueError(f"Ambiguous base {chr(raw.ravel()[position])!r} in sequence")
+        if n_policy == "mask":
+            codes = codes.astype(np.int8)
+            codes[ambiguous] = MASKED
+            return codes
+        # Pick uniformly among the compatible bases of each ambiguous position.
+        allowed = _COMPATIBLE[raw[ambiguous]]
+        rng = rng if rng is not None else np.random.default_rng()
+        draws = (rng.random(len(allowed)) * allowed.sum(axis=1)).astype(np.int64)
+        codes[ambiguous] = np.argmax(np.cumsum(allowed, axis=1) > draws[:, None], axis=1)
+    return codes.astype(np.int8)
+
+
+def encode_sequence(
+    sequence: Union[str, bytes],
+    n_policy: str = "reject",
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """Encode one sequence as an ``int8`` array of base indices."""
+    raw = np.frombuffer(_as_bytes(sequence), dtype=np.uint8)
+    return _encode_raw(raw, n_policy, rng)
+
+
+def encode_batch(
+    sequences: Sequence[Union[str, bytes]],
+    n_policy: str = "reject",
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """Encode equal-length sequences as an ``(nSeq, L)`` ``int8`` array."""
+    if not sequences:
+        return np.empty((0, 0), dtype=np.int8)
+    length = len(sequences[0])
+    if any(len(sequence) != length for sequence in sequences):
+        raise ValueError("encode_batch needs sequences of equal length")
+    raw = np.frombuffer(b"".join(_as_bytes(sequence) for sequence in sequences), dtype=np.uint8)
+    return _encode_raw(raw.reshape(len(sequences), length), n_policy, rng)
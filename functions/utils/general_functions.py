@@ -314,14 +314,8 @@ def bindingEnergies(matrix, sequences):
         A 1D numpy array of binding energies, where each element corresponds to the binding energy of the corresponding sequence.
     """
     assert matrix.shape[0] == sequences.shape[1]
-    ns = len(sequences)
-    L = len(sequences[0])
-    energies = np.zeros(ns)
-    for i in range(ns):
-        for j in range(L):
-            energies[i] += matrix[j, sequences[i, j]]
-    return energies
-    # return np.array([np.sum(matrix[seq]) for seq in sequences])
+    # Gather matrix[j, sequences[i, j]] for all i, j at once.
+    return matrix[np.arange(matrix.shape[0]), sequences].sum(axis=1)
 
 # def getDiNu(coord1, coord2, n1, minSpacer, n2, sequences, nSpacer):
 #     """
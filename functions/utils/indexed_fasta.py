@@ -0,0 +1,257 @@
+"""Random access into plain or bgzip-compressed FASTA.
+
+bgzip writes gzip as a series of independent members (BGZF blocks) of at
+most 64 KiB of input each, so any region can be read by decompressing only
+the blocks that cover it. :class:`BgzfReader` builds its block index by
+reading block headers and trailers, seeking past the compressed data, or it
+loads a samtools ``.gzi`` index. :class:`IndexedFasta` adds a samtools-style
+``.fai`` record index (name, length, offset, bases and bytes per line) and
+fetches ``start:end`` of a record from either kind of file. Both indexes
+are built on first use when their files are missing, and
+:meth:`IndexedFasta.save_index` writes them next to the FASTA.
+"""
+from __future__ import annotations
+
+import gzip
+import struct
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+_HEADER = struct.Struct("<4BI2BH")  # magic, method, flags, mtime, xfl, os, xlen
+_SUBFIELD = struct.Struct("<2BH")
+_UINT32 = struct.Struct("<I")
+_BLOCK_INPUT = 0xFF00  # bgzip's input bytes per block, keeping blocks under 64 KiB
+_EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def bgzip_compress(source: Union[str, Path], target: Union[str, Path]) -> Path:
+    """Compress ``source`` into BGZF blocks, as ``bgzip`` does."""
+    target = Path(target)
+    with Path(source).open("rb") as src, target.open("wb") as dst:
+        while True:
+            data = src.read(_BLOCK_INPUT)
+            if not data:
+                break
+            deflater = zlib.compressobj(6, zlib.DEFLATED, -15)
+            payload = deflater.compress(data) + deflater.flush()
+            block_size = _HEADER.size + 6 + len(payload) + 8
+            dst.write(_HEADER.pack(0x1F, 0x8B, 8, 4, 0, 0, 0xFF, 6))
+            dst.write(_SUBFIELD.pack(66, 67, 2) + struct.pack("<H", block_size - 1))
+            dst.write(payload + struct.pack("<II", zlib.crc32(data), len(data)))
+        dst.write(_EOF_BLOCK)
+    return target
+
+
+class BgzfReader:
+    """Byte-range reads from the uncompressed stream of a bgzip file."""
+
+    def __init__(self, path: Union[str, Path], cache_blocks: int = 8) -> None:
+        self.path = Path(path)
+        self._handle: BinaryIO = self.path.open("rb")
+        self._size = self.path.stat().st_size
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._cache_blocks = cache_blocks
+        gzi = self.path.with_name(self.path.name + ".gzi")
+        if gzi.is_file():
+            self.compressed, self.uncompressed = self._load_gzi(gzi)
+        else:
+            self.compressed, self.uncompressed = self._scan_blocks()
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def _scan_blocks(self) -> tuple[np.ndarray, np.ndarray]:
+        compressed: List[int] = []
+        uncompressed: List[int] = [0]
+        position = 0
+        while position < self._size:
+            self._handle.seek(position)
+            header = self._handle.read(_HEADER.size)
+            id1, id2, _, flags, _, _, _, xlen = _HEADER.unpack(header)
+            if bytes((id1, id2)) != GZIP_MAGIC:
+                raise ValueError(f"Corrupt gzip block at byte {position} of {self.path}")
+            extra = self._handle.read(xlen) if flags & 4 else b""
+            block_size = _block_size(extra)
+            if block_size is None:
+                raise ValueError(f"{self.path} is gzip but not bgzip; recompress it with bgzip for random access")
+            self._handle.seek(position + block_size - _UINT32.size)
+            (isize,) = _UINT32.unpack(self._handle.read(_UINT32.size))
+            compressed.append(position)
+            uncompressed.append(uncompressed[-1] + isize)
+            position += block_size
+        return np.asarray(compressed, dtype=np.int64), np.asarray(uncompressed[:-1], dtype=np.int64)
+
+    @staticmethod
+    def _load_gzi(path: Path) -> tuple[np.ndarray, np.ndarray]:
+        raw = path.read_bytes()
+        (count,) = struct.unpack_from("<Q", raw)
+        pairs = np.frombuffer(raw, dtype="<u8", count=2 * count, offset=8).reshape(-1, 2).astype(np.int64)
+        # .gzi leaves out the first block, which always starts at (0, 0).
+        pairs = np.vstack([[0, 0], pairs])
+        return pairs[:, 0].copy(), pairs[:, 1].copy()
+
+    def save_gzi(self, path: Optional[Union[str, Path]] = None) -> Path:
+        target = Path(path) if path else self.path.with_name(self.path.name + ".gzi")
+        pairs = np.stack([self.compressed[1:], self.uncompressed[1:]], axis=1).astype("<u8")
+        target.write_bytes(struct.pack("<Q", len(pairs)) + pairs.tobytes())
+        return target
+
+    def _block(self, index: int) -> bytes:
+        data = self._cache.get(index)
+        if data is None:
+            start = int(self.compressed[index])
+            end = int(self.compressed[index + 1]) if index + 1 < len(self.compressed) else self._size
+            self._handle.seek(start)
+            data = zlib.decompress(self._handle.read(end - start), 31)
+            self._cache[index] = data
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(index)
+        return data
+
+    def read(self, start: int, size: int) -> bytes:
+        """Up to ``size`` bytes of the uncompressed stream from offset ``start``."""
+        if size <= 0 or not len(self.compressed):
+            return b""
+        index = max(0, int(np.searchsorted(self.uncompressed, start, side="right")) - 1)
+        parts: List[bytes] = []
+        offset = start - int(self.uncompressed[index])
+        while size > 0 and index < len(self.compressed):
+            chunk = self._block(index)[offset: offset + size]
+            parts.append(chunk)
+            size -= len(chunk)
+            index += 1
+            offset = 0
+        return b"".join(parts)
+
+
+def _block_size(extra: bytes) -> Optional[int]:
+    """BSIZE + 1 from the ``BC`` subfield of a BGZF header, or None for plain gzip."""
+    position = 0
+    while position + _SUBFIELD.size <= len(extra):
+        si1, si2, length = _SUBFIELD.unpack_from(extra, position)
+        if (si1, si2) == (66, 67) and length == 2:
+            return struct.unpack_from("<H", extra, position + _SUBFIELD.size)[0] + 1
+        position += _SUBFIELD.size + length
+    return None
+
+
+@dataclass
+class FaiEntry:
+    """One ``.fai`` line: record length, byte offset of its first base, bases and bytes per line."""
+
+    name: str
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+    def position(self, base: int) -> int:
+        return self.offset + (base // self.line_bases) * self.line_width + base % self.line_bases
+
+
+class IndexedFasta:
+    """Region fetches from a plain or bgzip FASTA, via its ``.fai`` record index."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as probe:
+            self.compressed = probe.read(2) == GZIP_MAGIC
+        self._bgzf = BgzfReader(self.path) if self.compressed else None
+        self._plain: Optional[BinaryIO] = None if self.compressed else self.path.open("rb")
+        fai = self.path.with_name(self.path.name + ".fai")
+        self.entries: Dict[str, FaiEntry] = _read_fai(fai) if fai.is_file() else self._build_fai()
+
+    def close(self) -> None:
+        if self._bgzf is not None:
+            self._bgzf.close()
+        if self._plain is not None:
+            self._plain.close()
+
+    def __enter__(self) -> "IndexedFasta":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.entries)
+
+    def lengths(self) -> Dict[str, int]:
+        return {name: entry.length for name, entry in self.entries.items()}
+
+    def _lines(self) -> Iterator[bytes]:
+        opener = gzip.open if self.compressed else open
+        with opener(self.path, "rb") as handle:
+            yield from handle
+
+    def _build_fai(self) -> Dict[str, FaiEntry]:
+        entries: Dict[str, FaiEntry] = {}
+        current: Optional[FaiEntry] = None
+        position = 0
+        short_line = False
+        for line in self._lines():
+            position += len(line)
+            if line.startswith(b">"):
+                name = line[1:].split(None, 1)[0].decode("utf-8") if line[1:].strip() else f"record_{len(entries) + 1}"
+                current = entries[name] = FaiEntry(name, 0, position, 0, 0)
+                short_line = False
+                continue
+            bases = len(line.rstrip(b"\r\n"))
+            if current is None or not bases:
+                continue
+            if current.line_bases == 0:
+                current.line_bases, current.line_width = bases, len(line)
+            elif short_line or bases > current.line_bases:
+                raise ValueError(f"Record {current.name} of {self.path} has uneven line lengths; cannot index it")
+            short_line = bases < current.line_bases
+            current.length += bases
+        return entries
+
+    def save_index(self) -> Path:
+        """Write the ``.fai`` (and ``.gzi`` for bgzip) next to the FASTA."""
+        fai = self.path.with_name(self.path.name + ".fai")
+        fai.write_text(
+            "".join(
+                f"{e.name}\t{e.length}\t{e.offset}\t{e.line_bases}\t{e.line_width}\n" for e in self.entries.values()
+            )
+        )
+        if self._bgzf is not None:
+            self._bgzf.save_gzi()
+        return fai
+
+    def _read(self, start: int, size: int) -> bytes:
+        if self._bgzf is not None:
+            return self._bgzf.read(start, size)
+        assert self._plain is not None
+        self._plain.seek(start)
+        return self._plain.read(size)
+
+    def fetch(self, name: str, start: int = 0, end: Optional[int] = None) -> str:
+        """Bases ``start:end`` (0-based, half-open) of record ``name``, upper-cased."""
+        entry = self.entries[name]
+        end = entry.length if end is None else min(end, entry.length)
+        start = max(0, start)
+        if start >= end:
+            return ""
+        first, last = entry.position(start), entry.position(end - 1) + 1
+        raw = self._read(first, last - first)
+        return raw.translate(None, b"\r\n").decode("ascii").upper()
+
+
+def _read_fai(path: Path) -> Dict[str, FaiEntry]:
+    entries: Dict[str, FaiEntry] = {}
+    for line in path.read_text().splitlines():
+        if line.strip():
+            name, length, offset, line_bases, line_width = line.split("\t")[:5]
+            entries[name] = FaiEntry(name, int(length), int(offset), int(line_bases), int(line_width))
+    return entries
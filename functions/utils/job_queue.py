@@ -0,0 +1,189 @@
+"""Local work queues for asynchronous job execution.
+
+``submit_job`` in async mode writes a ``pending`` job, enqueues a task dict
+and returns immediately; a worker pool drains the queue and calls the
+handler, which owns all job-status updates. Two stand-ins ship here:
+
+- ``InProcessJobQueue``: in-memory queue drained by worker threads.
+- ``SQLiteJobQueue``: tasks persisted in a SQLite file, so queued work
+  survives a restart. Rows left ``running`` by a crashed worker are requeued
+  after ``visibility_timeout`` seconds.
+
+Production deployments would put Cloud Tasks or Pub/Sub behind the same
+``enqueue`` / ``join`` / ``close`` surface.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TaskHandler = Callable[[Dict[str, Any]], None]
+
+
+class InProcessJobQueue:
+    """Thread pool draining an in-memory FIFO."""
+
+    def __init__(self, handler: TaskHandler, workers: int = 2) -> None:
+        self._handler = handler
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def enqueue(self, task: Dict[str, Any]) -> None:
+        self._queue.put(task)
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every enqueued task has been handled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _work(self) -> None:
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                self._handler(task)
+            except Exception:  # the handler records job errors itself
+                logger.exception("Job task failed: %s", task)
+            finally:
+                self._queue.task_done()
+
+
+class SQLiteJobQueue:
+    """Durable queue in a SQLite file, drained by polling worker threads."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        handler: TaskHandler,
+        workers: int = 2,
+        poll_interval: float = 0.1,
+        visibility_timeout: float = 600.0,
+    ) -> None:
+        self.path = str(path)
+        self._handler = handler
+        self._poll_interval = poll_interval
+        self._visibility_timeout = visibility_timeout
+        self._stop = threading.Event()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'queued',
+                    claimed_at REAL
+                )
+                """
+            )
+        self._threads = [
+            threading.Thread(target=self._work, name=f"sqlite-job-worker-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """A new autocommit connection; callers close it (``sqlite3``'s context manager does not)."""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, task: Dict[str, Any]) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT INTO tasks (payload) VALUES (?)", (json.dumps(task, default=str),))
+
+    def pending(self) -> int:
+        with closing(self._connect()) as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()
+        return count
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(self._poll_interval)
+        return True
+
+    def close(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _claim(self, conn: sqlite3.Connection) -> Optional[tuple[int, Dict[str, Any]]]:
+        """Atomically move the oldest runnable task to ``running``."""
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                """
+                SELECT id, payload FROM tasks
+                WHERE state = 'queued' OR (state = 'running' AND claimed_at < ?)
+                ORDER BY id LIMIT 1
+                """,
+                (now - self._visibility_timeout,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE tasks SET state = 'running', claimed_at = ? WHERE id = ?", (now, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0], json.loads(row[1])
+
+    def _work(self) -> None:
+        conn = self._connect()
+        try:
+            while not self._stop.is_set():
+                claimed = self._claim(conn)
+                if claimed is None:
+                    self._stop.wait(self._poll_interval)
+                    continue
+                task_id, task = claimed
+                try:
+                    self._handler(task)
+                except Exception:  # the handler records job errors itself
+                    logger.exception("Job task %s failed", task_id)
+                conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        finally:
+            conn.close()
+
+
+def job_queue_from_spec(spec: str, handler: TaskHandler, workers: int = 2) -> InProcessJobQueue | SQLiteJobQueue:
+    """Build a queue from ``memory`` or ``sqlite:<path>``."""
+    if spec.startswith("sqlite:"):
+        return SQLiteJobQueue(spec[len("sqlite:"):], handler, workers=workers)
+    if spec == "memory":
+        return InProcessJobQueue(handler, workers=workers)
+    raise ValueError(f"Unknown job queue spec: {spec!r}")
@@ -0,0 +1,89 @@
+"""Length-bucketed batch planning for padded sequence scoring.
+
+``BrickPlotter.preprocess`` right-aligns every sequence of a batch by
+padding it with ``g`` up to the longest member, plus constant flanks. Padding
+a mixed-length library to its global maximum wastes most of the work on
+filler, so sequences are binned into buckets whose members are padded only
+to the bucket maximum. The scoring cost of a row grows linearly with its
+padded length, so a bucket's overhead is::
+
+    padded_bases / useful_bases - 1
+
+where ``useful_bases`` counts every member at its own length plus the
+flanks and ``padded_bases`` counts every member at the bucket maximum.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence
+
+
+@dataclass
+class LengthBucket:
+    """One padded batch: member indices into the input and its padding cost."""
+
+    indices: List[int] = field(default_factory=list)
+    max_length: int = 0
+    useful_bases: int = 0
+    flank: int = 0
+
+    @property
+    def padded_bases(self) -> int:
+        return len(self.indices) * (self.max_length + self.flank)
+
+    @property
+    def overhead(self) -> float:
+        return self.padded_bases / self.useful_bases - 1 if self.useful_bases else 0.0
+
+    def report(self) -> Dict[str, float]:
+        return {
+            "size": len(self.indices),
+            "maxLength": self.max_length,
+            "paddedLength": self.max_length + self.flank,
+            "usefulBases": self.useful_bases,
+            "paddedBases": self.padded_bases,
+            "overhead": round(self.overhead, 6),
+        }
+
+
+def plan_length_buckets(
+    lengths: Sequence[int],
+    flank: int = 0,
+    waste_tolerance: float = 0.1,
+    max_batch: int = 512,
+) -> List[LengthBucket]:
+    """Greedily bin ``lengths`` (shortest first) into buckets.
+
+    A bucket is closed when adding the next sequence would push its overhead
+    above ``waste_tolerance`` or its size above ``max_batch``. A tolerance of
+    0 yields exact-length buckets.
+    """
+    if waste_tolerance < 0:
+        raise ValueError("waste_tolerance must be non-negative")
+    if max_batch < 1:
+        raise ValueError("max_batch must be at least 1")
+
+    buckets: List[LengthBucket] = []
+    current = LengthBucket(flank=flank)
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        length = lengths[index]
+        if current.indices:
+            size = len(current.indices) + 1
+            padded = size * (max(current.max_length, length) + flank)
+            useful = current.useful_bases + length + flank
+            if size > max_batch or padded > (1 + waste_tolerance) * useful:
+                buckets.append(current)
+                current = LengthBucket(flank=flank)
+        current.indices.append(index)
+        current.max_length = max(current.max_length, length)
+        current.useful_bases += length + flank
+    if current.indices:
+        buckets.append(current)
+    return buckets
+
+
+def total_overhead(buckets: Sequence[LengthBucket]) -> float:
+    """Overall padding overhead of a plan."""
+    useful = sum(bucket.useful_bases for bucket in buckets)
+    padded = sum(bucket.padded_bases for bucket in buckets)
+    return padded / useful - 1 if useful else 0.0
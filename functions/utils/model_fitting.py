@@ -0,0 +1,406 @@
+"""Refit thermodynamic promoter models by L-BFGS with analytic gradients.
+
+:func:`fitModel` minimises the ``mlogL`` objective of ``lps2eval`` over
+sequences with measured expression classes (``numData[tt][dataID]`` with
+``seqs``, ``digiLums`` and ``weights``, as ``lps2eval`` reads them). The
+parameters are the two box matrices, the spacer penalties, the chemical
+potential of each data id, ``en.scale``, ``logClearanceRate`` (when the model
+has one) and the logistic coefficients and intercepts of each data id. The
+logistic terms are fitted jointly with the energies rather than refitted by
+scikit-learn at every step, which gives the same optimum.
+
+The forward pass reproduces ``getBrickDict`` -> ``brick2lps`` ->
+``logisticLogProba`` for whole arrays of sequences:
+
+* box energies are summed one matrix row at a time over ``(nSeq, Lout)``
+  strided slices, and brick ``[r, s]`` is
+  ``E1[r + nSpacer - s] + E2[r + nSpacer] + sp[s]``, as in ``getBricks``;
+* ``brick2lps`` reduces the bricks before and after the threshold position
+  (and the ``_rc`` bricks into the OFF term) with ``bindMode``;
+* the logistic layer scores ``log10 Pon`` per class.
+
+The backward pass runs the same steps in reverse: softmax weights of the
+reductions, per-spacer sums back onto the box energies, and one
+``np.bincount`` per matrix row for the matrix gradients. Sequences are
+processed in chunks, so memory is bounded by ``chunk`` rows of bricks.
+``sp.penalties[spFlex]`` stays fixed, as a shift of every penalty is the same
+as a shift of the chemical potential.
+"""
+from __future__ import annotations
+
+import copy
+import logging
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import expit, log_expit, logsumexp
+
+from .model_functions import logisticParams, thresholdPosition
+
+logger = logging.getLogger(__name__)
+
+GROUPS = ("matrices", "sp.penalties", "chem.pot", "en.scale", "logClearanceRate", "logistic")
+LN10 = np.log(10.0)
+
+
+def _chemPotKey(fitpar, dataID):
+    """Key of ``fitpar["chem.pot"]`` used for ``dataID``, resolved like ``getBrickDict``."""
+    chemPot = fitpar["chem.pot"]
+    if dataID in chemPot:
+        return dataID
+    for key in chemPot:
+        if dataID in key:
+            return key
+    raise KeyError(f"No chemical potential for {dataID}")
+
+
+def _thresholdPos(fitpar, dataID, Lbrick):
+    thresholdPos = thresholdPosition(fitpar["ThDict"], dataID)
+    return Lbrick + thresholdPos if thresholdPos <= 0 else thresholdPos
+
+
+class _Layout:
+    """Flat parameter vector <-> named arrays."""
+
+    def __init__(self, fitpar, optimize: Sequence[str]):
+        self.fitpar = fitpar
+        self.optimize = set(optimize)
+        unknown = self.optimize - set(GROUPS)
+        if unknown:
+            raise ValueError(f"Unknown parameter groups: {sorted(unknown)}")
+        nSpacer = len(fitpar["sp.penalties"])
+        self.spFree = np.flatnonzero(np.arange(nSpacer) != fitpar.get("spFlex", nSpacer // 2) if nSpacer > 1 else [])
+        self.dataIDs = list(fitpar["DataIDs"])
+        self.entries: List[Tuple[str, Tuple[int, ...]]] = []
+        if "matrices" in self.optimize:
+            self.entries += [("matrix0", fitpar["matrices"][0].shape), ("matrix1", fitpar["matrices"][1].shape)]
+        if "sp.penalties" in self.optimize and len(self.spFree):
+            self.entries.append(("sp", (len(self.spFree),)))
+        if "chem.pot" in self.optimize:
+            self.entries += [(f"mu:{dataID}", ()) for dataID in self.dataIDs]
+        if "en.scale" in self.optimize:
+            self.entries.append(("logScale", ()))
+        if "logClearanceRate" in self.optimize and fitpar.get("logClearanceRate") is not None:
+            self.entries.append(("logR", ()))
+        if "logistic" in self.optimize:
+            for dataID in self.dataIDs:
+                params = logisticParams(self._estimator(dataID))
+                self.entries += [(f"coef:{dataID}", params.intercept.shape), (f"intercept:{dataID}", params.intercept.shape)]
+        self.sizes = [int(np.prod(shape)) for _, shape in self.entries]
+
+    def _estimator(self, dataID):
+        estimators = self.fitpar["logisticRegression"]
+        if dataID in estimators:
+            return estimators[dataID]
+        return next(value for key, value in estimators.items() if dataID in key)
+
+    def values(self) -> Dict[str, np.ndarray]:
+        """Every parameter, optimised or not, as float arrays."""
+        fitpar = self.fitpar
+        values = {
+            "matrix0": np.asarray(fitpar["matrices"][0], dtype=float),
+            "matrix1": np.asarray(fitpar["matrices"][1], dtype=float),
+            "spAll": np.asarray(fitpar["sp.penalties"], dtype=float).copy(),
+            "logScale": np.log(float(fitpar["en.scale"])),
+            "logR": fitpar.get("logClearanceRate"),
+        }
+        values["sp"] = values["spAll"][self.spFree]
+        for dataID in self.dataIDs:
+            values[f"mu:{dataID}"] = float(fitpar["chem.pot"][_chemPotKey(fitpar, dataID)])
+            params = logisticParams(self._estimator(dataID))
+            if params.coef.shape[0] != 1:
+                raise ValueError("Logistic layers must take log10 Pon as their only feature")
+            values[f"coef:{dataID}"] = params.coef[0].copy()
+            values[f"intercept:{dataID}"] = params.intercept.copy()
+            values[f"classes:{dataID}"] = params.classes
+            values[f"ovr:{dataID}"] = params.ovr
+        return values
+
+    def pack(self, values) -> np.ndarray:
+        return np.concatenate([np.ravel(values[name]).astype(float) for name, _ in self.entries]) if self.entries else np.empty(0)
+
+    def unpack(self, vector, base) -> Dict[str, np.ndarray]:
+        values = dict(base)
+        offset = 0
+        for (name, shape), size in zip(self.entries, self.sizes):
+            values[name] = vector[offset: offset + size].reshape(shape) if shape else float(vector[offset])
+            offset += size
+        values["spAll"] = base["spAll"].copy()
+        values["spAll"][self.spFree] = values["sp"]
+        return values
+
+
+def _boxEnergies(m, seqs, start, Lout):
+    energies = np.zeros((len(seqs), Lout))
+    for j in range(m.shape[0]):
+        energies += m[j][seqs[:, start + j: start + j + Lout]]
+    return energies
+
+
+def _boxGradient(grad, seqs, start, n, Lout):
+    return np.array([
+        np.bincount(seqs[:, start + j: start + j + Lout].ravel(), weights=grad.ravel(), minlength=4)
+        for j in range(n)
+    ])
+
+
+class _Strand:
+    """Bricks of one strand of a chunk, shaped ``(nSeq, Lbrick, nSpacer)``, and their backward pass."""
+
+    def __init__(self, seqs, values, minSpacer):
+        self.seqs = seqs.astype(np.intp)
+        self.m1, self.m2 = values["matrix0"], values["matrix1"]
+        self.n1, self.n2 = self.m1.shape[0], self.m2.shape[0]
+        self.start2 = self.n1 + minSpacer
+        self.nSpacer = len(values["spAll"])
+        self.Lout = seqs.shape[1] - self.n1 - self.n2 - minSpacer + 1
+        self.Lbrick = self.Lout - self.nSpacer
+        e1 = _boxEnergies(self.m1, self.seqs, 0, self.Lout)
+        e2 = _boxEnergies(self.m2, self.seqs, self.start2, self.Lout)
+        nS, Lb = self.nSpacer, self.Lbrick
+        self.bricks = np.stack(
+            [e1[:, nS - s: nS - s + Lb] + e2[:, nS: nS + Lb] + values["spAll"][s] for s in range(nS)], axis=2
+        )
+
+    def backward(self, grad):
+        """Gradients of the matrices and spacer penalties for a gradient on the bricks."""
+        nS, Lb = self.nSpacer, self.Lbrick
+        g1 = np.zeros((len(grad), self.Lout))
+        for s in range(nS):
+            g1[:, nS - s: nS - s + Lb] += grad[:, :, s]
+        g2 = np.zeros((len(grad), self.Lout))
+        g2[:, nS: nS + Lb] = grad.sum(axis=2)
+        return (
+            _boxGradient(g1, self.seqs, 0, self.n1, self.Lout),
+            _boxGradient(g2, self.seqs, self.start2, self.n2, self.Lout),
+            grad.sum(axis=(0, 1)),
+        )
+
+
+def _bind(x, bindMode, logR):
+    """``brick2lps``'s ``bindF`` over ``(nSeq, k)`` energies: value, d/dx and d/dlogR."""
+    if bindMode == "max":
+        best = np.argmin(x, axis=1)
+        grad = np.zeros_like(x)
+        grad[np.arange(len(x)), best] = 1.0
+        return x[np.arange(len(x)), best], grad, None
+    if logR is None:
+        value = -logsumexp(-x, axis=1)
+        return value, np.exp(value[:, None] - x), None
+    R = np.exp(logR)
+    with np.errstate(over="ignore"):
+        inverse = 1.0 / (np.exp(x) + R)
+    total = inverse.sum(axis=1)
+    value = -np.log(total)
+    # d/dx of 1/(e^x + R) is -e^x/(e^x + R)^2 = -inverse * expit(x - logR)
+    grad = inverse * expit(x - logR) / total[:, None]
+    return value, grad, R * (inverse * inverse).sum(axis=1) / total
+
+
+def _logistic(x, labels, coef, intercept, classes, ovr):
+    """Per-sample log-likelihood of ``labels`` and its gradient on the class scores ``x * coef + intercept``."""
+    z = x[:, None] * coef + intercept
+    rows = np.arange(len(x))
+    if len(classes) == 2:
+        # A multinomial binary model scores the softmax of [-z, z], i.e. expit(2z).
+        sign = np.where(labels == 1, 1.0, -1.0) * (1.0 if ovr else 2.0)
+        return log_expit(sign * z[:, 0]), (sign * expit(-sign * z[:, 0]))[:, None]
+    onehot = np.zeros_like(z)
+    onehot[rows, labels] = 1.0
+    if ovr:
+        terms = log_expit(z)
+        norm = logsumexp(terms, axis=1)
+        return terms[rows, labels] - norm, (onehot - np.exp(terms - norm[:, None])) * expit(-z)
+    norm = logsumexp(z, axis=1)
+    return z[rows, labels] - norm, onehot - np.exp(z - norm[:, None])
+
+
+def _objective(layout, base, data, bindMode, includeRC, minSpacer, chunk, l2):
+    """Return a function of the flat parameter vector giving ``(mlogL, gradient)``."""
+
+    def evaluate(vector):
+        values = layout.unpack(vector, base)
+        scale = np.exp(values["logScale"])
+        logR = values["logR"] if bindMode == "add" else None
+        grads = {name: np.zeros(shape) if shape else 0.0 for name, shape in layout.entries}
+        total = 0.0
+        for dataID, seqs, labels, weights in data:
+            mu = values[f"mu:{dataID}"]
+            coef, intercept = values[f"coef:{dataID}"], values[f"intercept:{dataID}"]
+            classes, ovr = values[f"classes:{dataID}"], values[f"ovr:{dataID}"]
+            for start in range(0, len(seqs), chunk):
+                part = slice(start, start + chunk)
+                strands = [_Strand(seqs[part], values, minSpacer)]
+                if includeRC:
+                    strands.append(_Strand(3 - seqs[part][:, ::-1], values, minSpacer))
+                Lbrick = strands[0].Lbrick
+                threshold = _thresholdPos(layout.fitpar, dataID, Lbrick)
+                scaled = [scale * (strand.bricks - mu) for strand in strands]
+                if strands[1:]:  # getBrickDict flips _rc bricks back onto forward positions
+                    scaled[1] = scaled[1][:, ::-1]
+                n, nS = len(scaled[0]), strands[0].nSpacer
+
+                on, dOn, rOn = _bind(scaled[0][:, :threshold].reshape(n, -1), bindMode, logR)
+                off = np.zeros(n)
+                offParts = []
+                if threshold < Lbrick:
+                    value, grad, rGrad = _bind(scaled[0][:, threshold:].reshape(n, -1), bindMode, logR)
+                    off += value
+                    offParts.append((0, slice(threshold, None), grad, rGrad))
+                if strands[1:]:
+                    occlusion = layout.fitpar.get("rcOcclusion", np.arange(Lbrick))
+                    value, grad, rGrad = _bind(scaled[1][:, occlusion].reshape(n, -1), bindMode, logR)
+                    off += value
+                    offParts.append((1, occlusion, grad, rGrad))
+
+                logZ = np.logaddexp(np.logaddexp(0.0, -on), -off)
+                lps = (-on - logZ) / LN10
+                logLik, dz = _logistic(lps, labels[part], coef, intercept, classes, ovr)
+                w = weights[part]
+                total -= w @ logLik
+                gz = -w[:, None] * dz
+                gLps = gz @ coef
+                gOn = gLps / LN10 * (-1.0 + np.exp(-on - logZ))
+                gOff = gLps / LN10 * (np.exp(-off - logZ) if offParts else 0.0)
+
+                gScaled = [np.zeros_like(scaled[0]) for _ in strands]
+                gScaled[0][:, :threshold] = (gOn[:, None] * dOn).reshape(n, threshold, nS)
+                gLogR = gOn @ rOn if rOn is not None else 0.0
+                for strand, rows, grad, rGrad in offParts:
+                    gScaled[strand][:, rows] += (gOff[:, None] * grad).reshape(n, -1, nS)
+                    if rGrad is not None:
+                        gLogR += gOff @ rGrad
+                if strands[1:]:
+                    gScaled[1] = gScaled[1][:, ::-1]
+                    scaled[1] = scaled[1][:, ::-1]
+
+                if "logScale" in grads:
+                    grads["logScale"] += sum(float((g * s).sum()) for g, s in zip(gScaled, scaled))
+                if f"mu:{dataID}" in grads:
+                    grads[f"mu:{dataID}"] -= scale * sum(float(g.sum()) for g in gScaled)
+                if "logR" in grads:
+                    grads["logR"] += gLogR
+                if f"coef:{dataID}" in grads:
+                    grads[f"coef:{dataID}"] += gz.T @ lps
+                    grads[f"intercept:{dataID}"] += gz.sum(axis=0)
+                if "matrix0" in grads or "sp" in grads:
+                    for strand, g in zip(strands, gScaled):
+                        m0, m1, sp = strand.backward(scale * g)
+                        if "matrix0" in grads:
+                            grads["matrix0"] += m0
+                            grads["matrix1"] += m1
+                        if "sp" in grads:
+                            grads["sp"] += sp[layout.spFree]
+        if l2:
+            for name in ("matrix0", "matrix1", "sp"):
+                if name in grads:
+                    total += 0.5 * l2 * float((values[name] ** 2).sum())
+                    grads[name] = grads[name] + l2 * values[name]
+        return total, layout.pack(grads)
+
+    return evaluate
+
+
+def _numericData(fitpar, numData, tt):
+    data = []
+    for dataID in fitpar["DataIDs"]:
+        entry = numData[tt][dataID]
+        weights = np.asarray(entry.get("weights", np.ones(len(entry["seqs"]))), dtype=float)
+        data.append((dataID, np.asarray(entry["seqs"]), np.asarray(entry["digiLums"], dtype=np.intp), weights))
+    return data
+
+
+def mlogLAndGradient(fitpar, numData, tt="training", optimize=GROUPS, chunk=2048, l2=0.0):
+    '''
+    The mlogL objective of lps2eval at the parameters in fitpar, and its gradient.
+
+    Parameters:
+        fitpar: dictionary in the layout of the model files
+        numData: dictionary, numData[tt][dataID] with "seqs", "digiLums" and "weights"
+        tt: string, which part of numData to use. Default = "training"
+        optimize: parameter groups (see GROUPS) that the gradient covers
+        chunk: number of sequences scored at a time. Default = 2048
+        l2: ridge penalty on matrices and spacer penalties. Default = 0
+
+    Returns:
+        (mlogL, gradient, names): float, flat numpy array, and (name, shape) of each block of the gradient
+    '''
+    layout = _Layout(fitpar, optimize)
+    base = layout.values()
+    evaluate = _objective(layout, base, _numericData(fitpar, numData, tt), fitpar["bindMode"], fitpar["includeRC"],
+                          int(fitpar["min.spacer"]), chunk, l2)
+    value, grad = evaluate(layout.pack(base))
+    return value, grad, layout.entries
+
+
+def _logisticLayer(params, template):
+    """A fitted estimator like ``template`` with the given parameters, or a plain dict without scikit-learn."""
+    coef, intercept, classes = params
+    try:
+        estimator = copy.deepcopy(template)
+        estimator.coef_ = coef.reshape(-1, 1)
+        estimator.intercept_ = intercept.copy()
+        estimator.classes_ = classes
+        estimator.n_features_in_ = 1
+        return estimator
+    except AttributeError:  # a plain dict or LogisticParams
+        return {"coef": coef.reshape(-1, 1), "intercept": intercept.copy(), "classes": classes,
+                "ovr": bool(logisticParams(template).ovr)}
+
+
+def fitModel(fitpar, numData, tt="training", optimize=GROUPS, maxiter=500, chunk=2048, l2=0.0, tol=1e-6):
+    '''
+    Refit a thermodynamic model to numData by L-BFGS on the mlogL objective of lps2eval.
+
+    Parameters:
+        fitpar: dictionary in the layout of the model files; used as the starting point
+        numData: dictionary, numData[tt][dataID] with "seqs", "digiLums" and "weights"
+        tt: string, which part of numData to use. Default = "training"
+        optimize: parameter groups to fit, out of GROUPS. Default = all of them;
+            logClearanceRate only when fitpar has one
+        maxiter: maximal number of L-BFGS iterations. Default = 500
+        chunk: number of sequences scored at a time. Default = 2048
+        l2: ridge penalty on matrices and spacer penalties. Default = 0
+        tol: relative tolerance on the objective. Default = 1e-6
+
+    Returns:
+        (newFitpar, report): the refitted model in the same dict layout, and a dictionary with
+        the initial and final mlogL, iterations, evaluations, seconds and the optimizer message
+    '''
+    started = time.monotonic()
+    layout = _Layout(fitpar, optimize)
+    base = layout.values()
+    evaluate = _objective(layout, base, _numericData(fitpar, numData, tt), fitpar["bindMode"], fitpar["includeRC"],
+                          int(fitpar["min.spacer"]), chunk, l2)
+    x0 = layout.pack(base)
+    initial, _ = evaluate(x0)
+    result = minimize(evaluate, x0, jac=True, method="L-BFGS-B", options={"maxiter": maxiter, "ftol": tol})
+    values = layout.unpack(result.x, base)
+    logger.info("fitModel: mlogL %.4f -> %.4f in %d iterations", initial, result.fun, result.nit)
+
+    newFitpar = copy.deepcopy(fitpar)
+    newFitpar["matrices"] = [values["matrix0"].copy(), values["matrix1"].copy()]
+    newFitpar["sp.penalties"] = values["spAll"].copy()
+    newFitpar["en.scale"] = float(np.exp(values["logScale"]))
+    if values["logR"] is not None:
+        newFitpar["logClearanceRate"] = float(values["logR"])
+    chemPot = dict(fitpar["chem.pot"])
+    estimators = dict(fitpar["logisticRegression"])
+    for dataID in layout.dataIDs:
+        chemPot[_chemPotKey(fitpar, dataID)] = float(values[f"mu:{dataID}"])
+        key = dataID if dataID in estimators else next(k for k in estimators if dataID in k)
+        estimators[key] = _logisticLayer(
+            (values[f"coef:{dataID}"], values[f"intercept:{dataID}"], values[f"classes:{dataID}"]), estimators[key]
+        )
+    newFitpar["chem.pot"] = chemPot
+    newFitpar["logisticRegression"] = estimators
+    return newFitpar, {
+        "initial": float(initial),
+        "final": float(result.fun),
+        "iterations": int(result.nit),
+        "evaluations": int(result.nfev),
+        "seconds": time.monotonic() - started,
+        "message": str(result.message),
+    }
@@ -1,17 +1,60 @@
 from sys import path as syspath
 syspath.append("../")
 ## Definitions:
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 import numpy as np
 from utils.general_functions import multi_map, tensum, bindingEnergies, getDiNu
-from scipy.special import logsumexp
+from scipy.special import expit, log_expit, logsumexp
+from weakref import WeakKeyDictionary
 # from scipy.misc import logsumexp
 
 # from functions.fastFunctions import tensum, bindingEnergies, getDiNu
     
+def constantFlankWidths(seqs: np.array) -> tuple:
+    '''
+    Widths of the leading and trailing flanks whose windows need scoring only once.
+
+    For several sequences these are the columns identical in every row (e.g. the
+    'g' padding added by BrickPlotter.preprocess, or a shared backbone). For a
+    single sequence they are its leading and trailing homopolymer runs.
+
+    Parameters:
+        seqs: numpy array of shape (nSeq, L)
+
+    Returns:
+        (head, tail): tuple of ints
+    '''
+    nSeq, L = seqs.shape
+    if L == 0:
+        return 0, 0
+    if nSeq > 1:
+        same = np.all(seqs == seqs[0], axis=0)
+        if same.all():
+            return L, 0
+        return int(np.argmin(same)), int(np.argmin(same[::-1]))
+    row = seqs[0]
+    if np.all(row == row[0]):
+        return L, 0
+    return int(np.argmin(row == row[0])), int(np.argmin(row[::-1] == row[-1]))
+
+def flankWindowEnergies(m: np.array, row: np.array, lo: int, hi: int) -> np.array:
+    '''
+    Energies of windows lo..hi-1 of a single sequence. A homopolymer stretch gives
+    the same energy for every window, so it costs one column sum.
+    '''
+    n = m.shape[0]
+    segment = row[lo:hi + n - 1]
+    if np.all(segment == segment[0]):
+        return np.full(hi - lo, m[:, segment[0]].sum())
+    return bindingEnergies(m, np.lib.stride_tricks.sliding_window_view(segment, n))
+
 def slideSingleMatrix(m: np.array, seqs: np.array) -> np.array:
     '''
     Calculate the energy of binding for each sequence in a matrix.
+
+    Windows lying entirely inside constant flanks (see constantFlankWidths) are
+    scored once and broadcast; only windows overlapping the variable part are
+    scored per sequence.
     
     Parameters:
         m: numpy array
@@ -20,8 +63,23 @@ def slideSingleMatrix(m: np.array, seqs: np.array) -> np.array:
     Returns:
         np.array([bindingEnergies(m,seqs[:,offset:offset+m.shape[0]]) for offset in range(Lout)]).T: numpy array
     '''
-    Lout = seqs.shape[1]-m.shape[0]+1
-    return np.array([bindingEnergies(m,seqs[:,offset:offset+m.shape[0]]) for offset in range(Lout)]).T
+    n = m.shape[0]
+    nSeq, L = seqs.shape
+    Lout = L-n+1
+    head, tail = constantFlankWidths(seqs)
+    lo = min(max(head - n + 1, 0), max(Lout, 0))   # windows [0, lo) lie in the head
+    hi = max(min(L - tail, Lout), lo)               # windows [hi, Lout) lie in the tail
+    if Lout <= 0 or (lo == 0 and hi == Lout):
+        return np.array([bindingEnergies(m,seqs[:,offset:offset+n]) for offset in range(Lout)]).T
+
+    energies = np.empty((nSeq, Lout))
+    if lo > 0:
+        energies[:, :lo] = flankWindowEnergies(m, seqs[0], 0, lo)
+    if hi < Lout:
+        energies[:, hi:] = flankWindowEnergies(m, seqs[0], hi, Lout)
+    if hi > lo:
+        energies[:, lo:hi] = np.array([bindingEnergies(m,seqs[:,offset:offset+n]) for offset in range(lo, hi)]).T
+    return energies
 
 def getBricks(twoMatrices: list[list[int]],
               minSpacer: int,
@@ -164,11 +222,37 @@ def getBrickDict(seqDict,
 
 
     
+def thresholdPosition(thresholdPosDict, dataID):
+    '''
+    Threshold position of a data set, as stored in a model's ThDict.
+
+    With a "Prl" entry, data sets without their own entry fall back to it; otherwise
+    the first key containing the data ID is used. Values <= 0 count from the end of
+    the bricks.
+
+    Parameters:
+        thresholdPosDict: dictionary
+            Threshold position per data set
+        dataID: string
+            Data set to look up
+
+    Returns:
+        out: int
+    '''
+    if "Prl" in thresholdPosDict:
+        return thresholdPosDict.get(dataID, thresholdPosDict["Prl"])
+    for k in thresholdPosDict:
+        if dataID in k:
+            return thresholdPosDict[k]
+    raise KeyError(f"No threshold position for {dataID}")
+
+
 def brick2lps(bricks_DNIs,
               fitpars,
               thresholdPosDict_ = None,
               bindMode_ = None,
-              useChemPot = "chem.pot"
+              useChemPot = "chem.pot",
+              allThresholds = False
              ):
     '''
     Calculate the log10 of the probability of occupancy for each sequence in a dictionary of bricks.
@@ -184,10 +268,15 @@ def brick2lps(bricks_DNIs,
             Binding mode. Default = None.
         useChemPot: string
             Chemical potential to subtract from the energy of binding. Default = "chem.pot"
+        allThresholds: boolean
+            Return log10 Pon for every threshold position, shaped (nSeq, Lbrick),
+            instead of one value per sequence (see brick2lpsProfile). Default = False.
         
     Returns:
         out: dictionary of numpy arrays
     '''
+    if allThresholds:
+        return brick2lpsProfile(bricks_DNIs, fitpars, bindMode_=bindMode_)
     out = {}               
     if thresholdPosDict_ is None: # No threshold position given
         thresholdPosDict_ = fitpars["ThDict"]
@@ -209,13 +298,7 @@ def brick2lps(bricks_DNIs,
         bdni = bricks_DNIs[dataID_]
         
         # Get threshold position
-        try:
-            thresholdPos = thresholdPosDict_.get(dataID_, thresholdPosDict_["Prl"])
-        except:
-            for k in thresholdPosDict_:
-                if dataID_ in k:
-                    thresholdPos = thresholdPosDict_[k]
-                    break
+        thresholdPos = thresholdPosition(thresholdPosDict_, dataID_)
         if thresholdPos <= 0:
             thresholdPos = bdni.shape[1] + thresholdPos
 
@@ -253,6 +336,235 @@ def brick2lps(bricks_DNIs,
     
 
 
+def brick2lpsProfile(bricks_DNIs,
+                     fitpars,
+                     bindMode_ = None
+                    ):
+    '''
+    log10 probability of occupancy for every threshold (TSS) position at once.
+
+    Column t-1 of the result equals brick2lps with thresholdPos = t, for
+    t = 1..Lbrick: positions [0, t) count as ON and [t, Lbrick) as OFF. Each
+    position is first reduced over its spacers, then the ON and OFF terms of
+    every threshold come from one prefix and one suffix scan along the
+    position axis (np.logaddexp.accumulate for bindMode "add",
+    np.minimum.accumulate for "max", and a cumulative sum of 1/(exp(E)+R) when
+    the model has a logClearanceRate). That is O(L) per sequence instead of
+    O(L^2) for calling brick2lps once per threshold.
+
+    Parameters:
+        bricks_DNIs: dictionary of numpy arrays
+            Bricks of shape (nSeq, Lbrick, nSpacer) per data set, with "_rc" entries for the reverse strand
+        fitpars: dictionary
+            Fit parameters
+        bindMode_: string
+            Binding mode. Default = None (use fitpars["bindMode"]).
+
+    Returns:
+        out: dictionary of numpy arrays of shape (nSeq, Lbrick)
+    '''
+    if bindMode_ is None:
+        bindMode_ = fitpars["bindMode"]
+    try:
+        R_ = np.exp(fitpars["logClearanceRate"])
+    except:
+        R_ = None
+
+    # Per-position terms and how to combine them, such that bindF(x) over a
+    # range of positions equals finish(combine of the per-position terms).
+    if bindMode_ == "add" and R_ is None:
+        perPosition = lambda xi: logsumexp(-xi, axis = tuple(range(2, xi.ndim)))
+        scan, finish, empty = np.logaddexp.accumulate, lambda acc: -acc, -np.inf
+    elif bindMode_ == "add":
+        perPosition = lambda xi: np.sum(1.0/(np.exp(xi) + R_), axis = tuple(range(2, xi.ndim)))
+        scan, finish, empty = np.cumsum, lambda acc: -np.log(acc), 0.0
+    elif bindMode_ == "max":
+        perPosition = lambda xi: np.min(xi, axis = tuple(range(2, xi.ndim)))
+        scan, finish, empty = np.minimum.accumulate, lambda acc: acc, np.inf
+    else:
+        raise ValueError(f"Unknown bindMode: {bindMode_}")
+
+    out = {}
+    for dataID_ in bricks_DNIs:
+        if "_rc" in dataID_:
+            continue
+        terms = perPosition(bricks_DNIs[dataID_])
+        effON_ = finish(scan(terms, axis = 1))
+        # OFF for threshold t covers [t, Lbrick); the last threshold has no OFF
+        # part, which brick2lps counts as an effective energy of 0.
+        suffix = scan(terms[:, ::-1], axis = 1)[:, ::-1]
+        effOFF_ = np.zeros_like(effON_)
+        effOFF_[:, :-1] = finish(suffix[:, 1:])
+
+        if dataID_ + "_rc" in bricks_DNIs:
+            bdni_rc = bricks_DNIs[dataID_ + "_rc"]
+            rcOcclusion = fitpars.get("rcOcclusion", np.arange(bdni_rc.shape[1]))
+            rcTerms = perPosition(bdni_rc[:, rcOcclusion])
+            rcScan = scan(rcTerms, axis = 1)[:, -1] if rcTerms.shape[1] else np.full(len(rcTerms), empty)
+            effOFF_ += finish(rcScan)[:, None]
+        with np.errstate(over = "ignore"):
+            Pons_ = np.exp(-effON_) / (1.0 + np.exp(-effON_) + np.exp(-effOFF_))
+        out[dataID_] = np.log10(Pons_)
+
+    return out
+
+
+LogisticParams = namedtuple("LogisticParams", ["coef", "intercept", "classes", "ovr"])
+_logisticCache = WeakKeyDictionary()
+
+
+def logisticParams(LR):
+    '''
+    Coefficients, intercepts and classes of a fitted logistic regression, taken out once.
+
+    Accepts a scikit-learn LogisticRegression, a LogisticParams, or a plain dictionary
+    with "coef" (laid out like coef_), "intercept", "classes" and optionally "ovr"
+    (default True), so models
+    can be evaluated without scikit-learn. Estimators are cached until they are refitted.
+
+    Parameters:
+        LR: fitted estimator, LogisticParams or dictionary
+
+    Returns:
+        LogisticParams with coef of shape (nFeatures, nColumns) and intercept of shape (nColumns,)
+    '''
+    if isinstance(LR, LogisticParams):
+        return LR
+    if isinstance(LR, dict):
+        intercept = np.atleast_1d(np.asarray(LR["intercept"], dtype=float))
+        return LogisticParams(np.asarray(LR["coef"], dtype=float).reshape(len(intercept), -1).T,
+                              intercept,
+                              np.asarray(LR["classes"]),
+                              bool(LR.get("ovr", True)))
+    cached = _logisticCache.get(LR)
+    # fit() assigns a new coef_ array, so a refitted estimator misses the cache.
+    if cached is not None and cached[0] is LR.coef_:
+        return cached[1]
+    # sklearn 0.20/0.21 pickles store "warn", which meant one-vs-rest; "auto" is
+    # one-vs-rest for liblinear or two classes and multinomial otherwise.
+    multiClass = getattr(LR, "multi_class", "auto")
+    ovr = multiClass in ("ovr", "warn") or (
+        multiClass in ("auto", "deprecated")
+        and (getattr(LR, "solver", "") in ("liblinear", "warn") or len(LR.classes_) == 2))
+    params = LogisticParams(np.asarray(LR.coef_, dtype=float).T,
+                            np.asarray(LR.intercept_, dtype=float).ravel(),
+                            np.asarray(LR.classes_),
+                            ovr)
+    _logisticCache[LR] = (LR.coef_, params)
+    return params
+
+
+def _logisticDecision(params, X):
+    X = np.asarray(X, dtype=float)
+    if params.coef.shape[0] == 1:  # one feature: broadcasting beats a (n, 1) @ (1, k) matmul
+        return X * params.coef[0] + params.intercept
+    return X @ params.coef + params.intercept
+
+
+def logisticLogProba(params, X, columns=None):
+    '''
+    Log-probability of each class, as predict_log_proba of the estimator.
+
+    Binary models give [log(1-p), log(p)] with p = expit(d), d = X.coef + intercept, or
+    p = expit(2d) when fitted as multinomial (the softmax of [-d, d]); one-vs-rest models
+    normalise the per-class expit over classes; multinomial models use the softmax.
+    The class terms are taken in log space, so tails that underflow to -inf in
+    scikit-learn stay finite.
+
+    Parameters:
+        params: LogisticParams (see logisticParams)
+        X: numpy array of shape (nSamples, nFeatures)
+        columns: optional numpy array of shape (nSamples,) of class indices; when given,
+            only the log-probability of that class is computed for each sample
+
+    Returns:
+        numpy array of shape (nSamples, nClasses), or (nSamples,) with columns
+    '''
+    decision = _logisticDecision(params, X)
+    rows = np.arange(len(decision))
+    if len(params.classes) == 2:
+        decision = decision[:, 0] if params.ovr else 2 * decision[:, 0]
+        if columns is None:
+            return np.column_stack([log_expit(-decision), log_expit(decision)])
+        return log_expit(np.where(np.asarray(columns) == 1, decision, -decision))
+    picked = decision if columns is None else decision[rows, columns]
+    if not params.ovr:
+        norm = logsumexp(decision, axis=1)
+        return picked - (norm if columns is not None else norm[:, None])
+    total = expit(decision).sum(axis=1)
+    with np.errstate(divide="ignore"):
+        norm = np.log(total)
+    lost = total == 0
+    if lost.any():  # every class term underflowed
+        norm[lost] = logsumexp(log_expit(decision[lost]), axis=1)
+    return log_expit(picked) - (norm if columns is not None else norm[:, None])
+
+
+def logisticPredict(params, X):
+    '''
+    Most likely class of each sample, as predict of the estimator.
+
+    Parameters:
+        params: LogisticParams (see logisticParams)
+        X: numpy array of shape (nSamples, nFeatures)
+
+    Returns:
+        numpy array of shape (nSamples,)
+    '''
+    decision = _logisticDecision(params, X)
+    if len(params.classes) == 2:
+        return params.classes[(decision[:, 0] > 0).astype(int)]
+    return params.classes[np.argmax(decision, axis=1)]
+
+
+def weightedLinR2(x, y, weights):
+    '''
+    Weighted R^2 of the least-squares line of y on x, as LinearRegression().fit(...).score(...).
+
+    Parameters:
+        x: numpy array of shape (nSamples,) or (nSamples, 1)
+        y: numpy array of shape (nSamples,)
+        weights: numpy array of shape (nSamples,)
+
+    Returns:
+        float
+    '''
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    dx = x - weights @ x / total
+    dy = y - weights @ y / total
+    sxx = weights @ (dx * dx)
+    slope = (weights @ (dx * dy)) / sxx if sxx > 0 else 0.0
+    ssTot = weights @ (dy * dy)
+    if ssTot == 0:
+        return 1.0 if weights @ (dy - slope * dx) ** 2 == 0 else 0.0
+    return 1 - weights @ (dy - slope * dx) ** 2 / ssTot
+
+
+def weightedR2(predicted, y, weights):
+    '''
+    1 - weighted mean squared error / weighted variance of y.
+
+    Parameters:
+        predicted: numpy array of shape (nSamples,)
+        y: numpy array of shape (nSamples,)
+        weights: numpy array of shape (nSamples,)
+
+    Returns:
+        float
+    '''
+    weights = np.asarray(weights, dtype=float)
+    y = np.asarray(y, dtype=float)
+    total = weights.sum()
+    errs = np.asarray(predicted, dtype=float) - y
+    wmse = weights @ (errs * errs) / total
+    dy = y - weights @ y / total
+    wvar = weights @ (dy * dy) / total
+    return 1 - wmse / wvar
+
+
 def lps2eval(fitpar, objF, numData,
              DataIDs_   = None,
              tt         = "training",
@@ -308,7 +620,6 @@ def lps2eval(fitpar, objF, numData,
         seqs_     =       data_[dataID_]["seqs"]
         digiLums_ =       data_[dataID_]["digiLums"]
         weights_  =       data_[dataID_]["weights"]
-        Ndata_    =   len(data_[dataID_]["weights"])
         logPon_   = logPonDict_[dataID_].reshape(-1,1)
 #         if not np.all(np.isfinite(logPon_)):
 #             if objF=="mlogL":
@@ -327,24 +638,16 @@ def lps2eval(fitpar, objF, numData,
                     break
                     
         if fit: LR_.fit( logPon_, digiLums_, sample_weight=weights_)
+        params_ = logisticParams(LR_)
             
         if objF=="mlogL":
-            out[dataID_] = -(LR_.predict_log_proba(logPon_)[range(Ndata_),digiLums_]*weights_).sum()
+            out[dataID_] = -(logisticLogProba(params_, logPon_, digiLums_) @ weights_)
             
         if objF=="linR2":
-            from sklearn.linear_model import LinearRegression
-            LinReg = LinearRegression()
-            lums = data_[dataID_]["lums"]
-            LinReg.fit(logPon_,lums,sample_weight=weights_)
-            out[dataID_] = LinReg.score(logPon_,lums,sample_weight=weights_)
+            out[dataID_] = weightedLinR2(logPon_, data_[dataID_]["lums"], weights_)
 
         if objF=="r2":
-            lums = data_[dataID_]["lums"]
-            errs = LR_.predict(logPon_)-lums
-            wmse = sum(weights_*errs**2)/weights_.sum()
-            lums_mean = np.sum(lums*weights_)/weights_.sum()
-            wvar = sum(weights_*(lums-lums_mean)**2)/weights_.sum()
-            out[dataID_] = 1-wmse/wvar
+            out[dataID_] = weightedR2(logisticPredict(params_, logPon_), data_[dataID_]["lums"], weights_)
 
     return out 
 
@@ -0,0 +1,161 @@
+"""Two-bit packed sequence store with memory-mapped access.
+
+Genomes and large libraries that are scored repeatedly are converted once
+to a compact binary file (suffix ``.2bp``) and read back through
+``np.memmap``, so later runs neither parse FASTA nor load whole sequences.
+Bases take 2 bits (``a=0, c=1, g=2, t=3``, four per byte, the first base in
+the high bits), a quarter of the ASCII size. ``N`` and other ambiguity codes
+are stored as ``a`` plus an interval in the N-mask. Windows are unpacked on
+the fly from the mapped bytes.
+
+Layout: ``MAGIC``, each record's packed bases (byte aligned), the index
+arrays (lengths, byte offsets, N-interval offsets, N intervals, ids), then a
+JSON footer describing the index sections, its length as ``uint64`` and
+``MAGIC`` again. The footer sits at the end so records can be written while
+streaming.
+"""
+from __future__ import annotations
+
+import json
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .encoding import MASKED, encode_sequence
+
+MAGIC = b"THRM2BP\x01"
+PACKED_SUFFIX = ".2bp"
+
+_FOOTER = struct.Struct("<Q")
+_LETTERS = np.frombuffer(b"ACGTN", dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+
+def pack_codes(codes: np.ndarray) -> np.ndarray:
+    """Pack base indices (0-3) four to a byte, first base in the high bits."""
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[: len(codes)] = codes
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+
+
+def unpack_codes(packed: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Unpack bases ``start:end`` of a record whose packed bytes begin at ``packed[0]``."""
+    first, last = start // 4, -(-end // 4)
+    quads = (np.asarray(packed[first:last], dtype=np.uint8)[:, None] >> _SHIFTS) & 3
+    offset = start - 4 * first
+    return quads.ravel()[offset: offset + end - start].astype(np.int8)
+
+
+def _n_intervals(mask: np.ndarray) -> np.ndarray:
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+def write_packed_store(records: Iterable[Tuple[str, str]], path: Union[str, Path]) -> Dict[str, int]:
+    """Write ``(id, sequence)`` records to ``path``; returns record and base counts."""
+    path = Path(path)
+    ids: List[str] = []
+    lengths: List[int] = []
+    offsets: List[int] = []
+    n_offsets: List[int] = [0]
+    intervals: List[np.ndarray] = []
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as handle:
+        handle.write(MAGIC)
+        position = len(MAGIC)
+        for record_id, sequence in records:
+            codes = encode_sequence(sequence, n_policy="mask")
+            mask = codes == MASKED
+            codes[mask] = 0
+            packed = pack_codes(codes.view(np.uint8))
+            ids.append(record_id.replace("\n", " "))
+            lengths.append(len(codes))
+            offsets.append(position)
+            runs = _n_intervals(mask)
+            intervals.append(runs)
+            n_offsets.append(n_offsets[-1] + len(runs))
+            handle.write(packed.tobytes())
+            position += packed.nbytes
+
+        sections = {
+            "lengths": np.asarray(lengths, dtype=np.int64),
+            "offsets": np.asarray(offsets, dtype=np.int64),
+            "nOffsets": np.asarray(n_offsets, dtype=np.int64),
+            "nIntervals": np.concatenate(intervals).astype(np.int64) if intervals else np.empty((0, 2), np.int64),
+            "ids": np.frombuffer("\n".join(ids).encode("utf-8"), dtype=np.uint8),
+        }
+        footer = {"version": 1, "records": len(ids), "sections": {}}
+        for name, array in sections.items():
+            padding = -position % 8
+            handle.write(b"\0" * padding)
+            position += padding
+            footer["sections"][name] = {"offset": position, "dtype": array.dtype.str, "shape": list(array.shape)}
+            handle.write(array.tobytes())
+            position += array.nbytes
+        encoded = json.dumps(footer).encode("utf-8")
+        handle.write(encoded + _FOOTER.pack(len(encoded)) + MAGIC)
+    tmp.replace(path)
+    return {"records": len(ids), "bases": int(sum(lengths))}
+
+
+class PackedSequenceStore:
+    """Read-only view of a ``.2bp`` file through ``np.memmap``."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        tail = len(MAGIC) + _FOOTER.size
+        if len(self._data) < len(MAGIC) + tail or bytes(self._data[: len(MAGIC)]) != MAGIC or bytes(self._data[-len(MAGIC):]) != MAGIC:
+            raise ValueError(f"Not a packed sequence store: {self.path}")
+        (footer_length,) = _FOOTER.unpack(bytes(self._data[-tail: -len(MAGIC)]))
+        footer = json.loads(bytes(self._data[-tail - footer_length: -tail]))
+        sections = {
+            name: np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=self._data, offset=spec["offset"])
+            for name, spec in footer["sections"].items()
+        }
+        self.lengths: np.ndarray = sections["lengths"]
+        self._offsets = sections["offsets"]
+        self._n_offsets = sections["nOffsets"]
+        self._n_intervals = sections["nIntervals"]
+        raw_ids = bytes(sections["ids"]).decode("utf-8")
+        self.ids: List[str] = raw_ids.split("\n") if footer["records"] else []
+        self._index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def index_of(self, record_id: str) -> int:
+        if self._index is None:
+            self._index = {record_id: index for index, record_id in enumerate(self.ids)}
+        return self._index[record_id]
+
+    def n_intervals(self, index: int) -> np.ndarray:
+        """``[start, end)`` runs of ambiguous bases in record ``index``."""
+        return self._n_intervals[self._n_offsets[index]: self._n_offsets[index + 1]]
+
+    def codes(self, index: int, start: int = 0, end: Optional[int] = None, mask: bool = True) -> np.ndarray:
+        """Base indices of ``start:end`` of record ``index`` (``MASKED`` at N unless ``mask`` is false)."""
+        length = int(self.lengths[index])
+        end = length if end is None else min(end, length)
+        start = max(0, start)
+        if start >= end:
+            return np.empty(0, dtype=np.int8)
+        offset = int(self._offsets[index])
+        codes = unpack_codes(self._data[offset: offset + -(-length // 4)], start, end)
+        if mask:
+            runs = self.n_intervals(index)
+            for run_start, run_end in runs[(runs[:, 1] > start) & (runs[:, 0] < end)]:
+                codes[max(run_start, start) - start: min(run_end, end) - start] = MASKED
+        return codes
+
+    def sequence(self, index: int, start: int = 0, end: Optional[int] = None) -> str:
+        """Decoded ``start:end`` of record ``index`` with ambiguous bases as ``N``."""
+        codes = self.codes(index, start, end)
+        return _LETTERS[np.where(codes == MASKED, 4, codes)].tobytes().decode("ascii")
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for index, record_id in enumerate(self.ids):
+            yield record_id, self.sequence(index)
@@ -0,0 +1,175 @@
+"""Candidate promoter calls from brick matrices.
+
+A candidate is a brick cell whose energy is below ``threshold`` and no higher
+than any of its eight neighbours across positions and spacer configurations
+(:func:`local_minima`), on either strand. Overlapping candidates are then
+thinned by non-maximum suppression (:func:`suppress_overlaps`): the strongest
+candidate is kept, every candidate whose footprint overlaps it is dropped,
+and so on. Both stages are whole-array numpy operations; suppression runs in
+rounds that keep every candidate which is the strongest within a footprint
+of itself, which gives the same result as the one-at-a-time greedy pass.
+
+A brick row ``r`` covers bases ``r + 1 .. r + footprint`` on the forward
+strand and ``r .. r + footprint - 1`` on the reverse one (see
+``utils/tracks.py``). :func:`call_peaks` ranks the candidates of one matrix;
+:class:`PeakStream` does the same for a chromosome handed over in
+consecutive tiles of rows, so calls do not depend on where tiles split.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+STRANDS = ("+", "-")
+
+
+def local_minima(energies: np.ndarray, threshold: float) -> tuple:
+    """``(rows, spacers)`` of cells below ``threshold`` that are no higher than their 8 neighbours.
+
+    ``NaN`` cells (no complete site) never qualify and never block a neighbour.
+    """
+    energies = np.where(np.isnan(energies), np.inf, np.asarray(energies, dtype=float))
+    rows, spacers = energies.shape
+    padded = np.pad(energies, 1, constant_values=np.inf)
+    is_min = energies < threshold
+    for dr in (-1, 0, 1):
+        for ds in (-1, 0, 1):
+            if dr or ds:
+                is_min &= energies <= padded[1 + dr: 1 + dr + rows, 1 + ds: 1 + ds + spacers]
+    return np.nonzero(is_min)
+
+
+def _near(starts: np.ndarray, width: int):
+    """Yield ``(d, near)`` where ``near[i]`` tells whether sorted ``starts[i]`` and ``starts[i + d]`` overlap."""
+    for d in range(1, len(starts)):
+        near = starts[d:] - starts[:-d] < width
+        if not near.any():  # starts are sorted, so no larger d overlaps either
+            return
+        yield d, near
+
+
+def suppress_overlaps(starts: np.ndarray, energies: np.ndarray, width: int) -> np.ndarray:
+    """Indices of the candidates kept by greedy non-maximum suppression, strongest first.
+
+    Two candidates overlap when their starts are less than ``width`` apart.
+    Ties in energy go to the leftmost candidate.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    energies = np.asarray(energies, dtype=float)
+    rank = np.empty(len(starts), dtype=np.int64)
+    rank[np.lexsort((starts, energies))] = np.arange(len(starts))
+    by_start = np.argsort(starts, kind="stable")
+    sorted_starts, sorted_rank = starts[by_start], rank[by_start]
+
+    alive = np.ones(len(starts), dtype=bool)
+    kept = np.zeros(len(starts), dtype=bool)
+    while alive.any():
+        live = np.flatnonzero(alive)
+        live_starts, live_rank = sorted_starts[live], sorted_rank[live]
+        # Keep every candidate that beats all live candidates it overlaps ...
+        best = np.ones(len(live), dtype=bool)
+        for d, near in _near(live_starts, width):
+            best[d:] &= ~(near & (live_rank[:-d] < live_rank[d:]))
+            best[:-d] &= ~(near & (live_rank[d:] < live_rank[:-d]))
+        kept[live[best]] = True
+        # ... then retire them along with everything they overlap.
+        gone = best.copy()
+        for d, near in _near(live_starts, width):
+            gone[d:] |= near & best[:-d]
+            gone[:-d] |= near & best[d:]
+        alive[live[gone]] = False
+    chosen = by_start[kept]
+    return chosen[np.argsort(rank[chosen])]
+
+
+def _ranked(rows, spacers, strands, energies, footprint, chem_pot, scale, offset, limit) -> List[dict]:
+    starts = rows + offset + (strands == 0)
+    keep = suppress_overlaps(starts, energies, footprint)[:limit]
+    log_pon = -np.logaddexp(0.0, scale * (energies[keep] - chem_pot)) / np.log(10.0)
+    return [
+        {
+            "rank": rank,
+            "row": int(rows[index]),
+            "spacer": int(spacers[index]),
+            "strand": STRANDS[strands[index]],
+            "start": int(starts[index]),
+            "end": int(starts[index]) + footprint,
+            "energy": float(energies[index]),
+            "logPon": float(pon),
+        }
+        for rank, (index, pon) in enumerate(zip(keep.tolist(), log_pon.tolist()), 1)
+    ]
+
+
+def call_peaks(
+    strand_bricks: Dict[str, np.ndarray],
+    threshold: float,
+    footprint: int,
+    chem_pot: float = 0.0,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    scale: float = 1.0,
+) -> List[dict]:
+    """Ranked candidates of ``(rows, nSpacer)`` bricks keyed by strand (``"+"``, ``"-"``).
+
+    Each candidate has its brick ``row`` and ``spacer``, ``strand``, the
+    ``start``/``end`` of its footprint in sequence coordinates (shifted by
+    ``offset``), ``energy`` and ``logPon``, the log10 occupancy of the site
+    on its own, ``-log10(1 + exp(scale * (energy - chem_pot)))``.
+    """
+    parts = []
+    for strand, bricks in strand_bricks.items():
+        rows, spacers = local_minima(bricks, threshold)
+        parts.append((rows, spacers, np.full(len(rows), STRANDS.index(strand)), np.asarray(bricks, dtype=float)[rows, spacers]))
+    if not parts:
+        return []
+    rows, spacers, strands, energies = (np.concatenate(column) for column in zip(*parts))
+    return _ranked(rows, spacers, strands, energies, footprint, chem_pot, scale, offset, limit)
+
+
+class PeakStream:
+    """:func:`call_peaks` over a chromosome pushed as consecutive tiles of brick rows.
+
+    The last row of each tile is decided once the next tile shows its
+    neighbour, and suppression runs over the whole chromosome in
+    :meth:`finish`, so the calls match scoring the chromosome in one piece.
+    Only the raw candidates and two rows per strand are held between tiles.
+    """
+
+    def __init__(self, threshold: float, footprint: int, chem_pot: float = 0.0, scale: float = 1.0) -> None:
+        self.threshold = threshold
+        self.footprint = footprint
+        self.chem_pot = chem_pot
+        self.scale = scale
+        self.begin()
+
+    def begin(self) -> None:
+        self._tail: Dict[str, np.ndarray] = {}
+        self._base = -1  # row index of the first tail row; row -1 is a virtual edge
+        self._found: List[tuple] = []
+
+    def push(self, strand_bricks: Dict[str, np.ndarray]) -> None:
+        """Add the next rows, keyed by strand like :func:`call_peaks`; ``NaN`` marks rows without a site."""
+        base = self._base
+        for strand, bricks in strand_bricks.items():
+            bricks = np.asarray(bricks, dtype=float)
+            block = np.concatenate((self._tail.get(strand, np.full((1, bricks.shape[1]), np.inf)), bricks))
+            rows, spacers = local_minima(block, self.threshold)
+            # The first row was decided by the previous push; the last waits for its neighbour.
+            inner = (rows >= 1) & (rows <= len(block) - 2)
+            rows, spacers = rows[inner], spacers[inner]
+            self._found.append((rows + base, spacers, np.full(len(rows), STRANDS.index(strand)), block[rows, spacers]))
+            self._tail[strand] = block[-2:]
+            self._base = base + len(block) - len(self._tail[strand])
+
+    def finish(self, limit: Optional[int] = None) -> List[dict]:
+        """Decide the last row and return the chromosome's ranked candidates."""
+        if self._tail:
+            self.push({strand: np.full((1, tail.shape[1]), np.inf) for strand, tail in self._tail.items()})
+        found = self._found
+        self.begin()
+        if not found:
+            return []
+        rows, spacers, strands, energies = (np.concatenate(column) for column in zip(*found))
+        return _ranked(rows, spacers, strands, energies, self.footprint, self.chem_pot, self.scale, 0, limit)
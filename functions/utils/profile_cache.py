@@ -0,0 +1,106 @@
+"""Per-instance read-through TTL cache for ``users/{uid}`` profile documents."""
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+class UserProfileCache:
+    """Cache profile dicts by uid for ``ttl`` seconds.
+
+    Misses read through to Firestore. Writers keep the cache coherent by
+    calling :meth:`put` or :meth:`apply` after a successful commit, or
+    :meth:`invalidate` when the new state is not known locally. Missing
+    documents are never cached, so a bootstrap write is picked up on the
+    next request. When ``enabled`` is False every call reads through.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 30.0,
+        max_entries: int = 10_000,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.stats: Counter = Counter()
+
+    def get(self, user_ref: Any) -> Optional[Dict[str, Any]]:
+        """Return a copy of the profile for ``user_ref``, or None if it does not exist."""
+        uid = user_ref.id
+        if self.enabled:
+            with self._lock:
+                entry = self._entries.get(uid)
+                if entry is not None and self._clock() - entry[0] <= self.ttl:
+                    self._entries.move_to_end(uid)
+                    self.stats["hits"] += 1
+                    return copy.deepcopy(entry[1])
+                if entry is not None:
+                    del self._entries[uid]
+                    self.stats["expired"] += 1
+                self.stats["misses"] += 1
+
+        snapshot = user_ref.get()
+        if not snapshot.exists:
+            return None
+        profile = snapshot.to_dict() or {}
+        self.put(uid, profile)
+        return copy.deepcopy(profile)
+
+    def put(self, uid: str, profile: Dict[str, Any]) -> None:
+        """Store the committed state of a profile."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[uid] = (self._clock(), copy.deepcopy(profile))
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def apply(self, uid: str, updates: Dict[str, Any], drop: Iterable[str] = ()) -> None:
+        """Write through committed top-level ``updates`` and forget ``drop`` fields.
+
+        Fields whose new value is only known server-side (e.g. atomic
+        increments) should be listed in ``drop`` rather than ``updates``.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return
+            profile = entry[1]
+            profile.update(copy.deepcopy(updates))
+            for field in drop:
+                profile.pop(field, None)
+            self.stats["writes"] += 1
+
+    def invalidate(self, uid: str) -> None:
+        with self._lock:
+            if self._entries.pop(uid, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "ttlSeconds": self.ttl,
+                "hitRate": (self.stats["hits"] / lookups) if lookups else None,
+                **dict(self.stats),
+            }
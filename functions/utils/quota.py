@@ -0,0 +1,139 @@
+"""Monthly job quota backed by atomic Firestore reservations and local leases.
+
+``users/{uid}.monthlyUsage`` holds three fields:
+
+- ``count``: jobs actually submitted this month, bumped with an atomic
+  ``Increment(1)`` in the submit_job bookkeeping batch.
+- ``reserved``: quota units handed out to instances as leases, only ever
+  changed inside a transaction, so the monthly limit holds across instances.
+- ``leasedAt``: when the last lease was granted.
+
+Each instance keeps a small lease block per user in memory and consumes from
+it without touching Firestore. A new lease costs one transaction. Leases
+expire after ``lease_ttl`` seconds; their unused units are returned on the
+next grant. Units stranded by an instance that died are reclaimed once no
+lease can still be live, i.e. ``lease_ttl`` after the last grant. A local
+lease is timed from before its transaction starts, and so before the server
+stamps ``leasedAt``; it therefore never outlives the reservation backing it.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+MONTHLY_JOB_LIMIT = 100
+
+
+@dataclass
+class _Lease:
+    month: str
+    remaining: int
+    granted_at: float
+
+
+class MonthlyQuota:
+    """Per-instance cache of quota leases for the monthly job limit."""
+
+    def __init__(
+        self,
+        transactional: Callable[[Callable], Callable],
+        limit: int = MONTHLY_JOB_LIMIT,
+        block_size: int = 5,
+        lease_ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._transactional = transactional
+        self.limit = limit
+        self.block_size = block_size
+        self.lease_ttl = lease_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._leases: Dict[str, _Lease] = {}
+        self._user_locks: Dict[str, threading.Lock] = {}
+        self.stats: Counter = Counter()
+
+    def reset(self) -> None:
+        """Forget all local leases (unused units are reclaimed after the TTL)."""
+        with self._lock:
+            self._leases.clear()
+            self._user_locks.clear()
+            self.stats.clear()
+
+    def try_consume(self, db: Any, user_ref: Any, month: str) -> bool:
+        """Take one unit of quota for ``user_ref``; False once the limit is reached."""
+        uid = user_ref.id
+        if self._take_local(uid, month):
+            return True
+
+        with self._lock:
+            user_lock = self._user_locks.setdefault(uid, threading.Lock())
+        with user_lock:
+            # Another thread may have refilled the lease while we waited.
+            if self._take_local(uid, month):
+                return True
+            returned = self._pop_expired(uid, month)
+            requested_at = self._clock()
+            granted = self._grant(db, user_ref, month, returned)
+            if granted <= 0:
+                self.stats["denied"] += 1
+                return False
+            with self._lock:
+                self._leases[uid] = _Lease(month, granted - 1, requested_at)
+            self.stats["leases"] += 1
+            return True
+
+    def _take_local(self, uid: str, month: str) -> bool:
+        with self._lock:
+            lease = self._leases.get(uid)
+            if (
+                lease is None
+                or lease.month != month
+                or lease.remaining <= 0
+                or self._clock() - lease.granted_at > self.lease_ttl
+            ):
+                return False
+            lease.remaining -= 1
+            self.stats["local"] += 1
+            return True
+
+    def _pop_expired(self, uid: str, month: str) -> int:
+        """Drop the local lease and report units that can be handed back."""
+        with self._lock:
+            lease = self._leases.pop(uid, None)
+        if lease is None or lease.month != month:
+            return 0
+        return lease.remaining
+
+    def _grant(self, db: Any, user_ref: Any, month: str, returned: int) -> int:
+        limit, block_size, lease_ttl = self.limit, self.block_size, self.lease_ttl
+
+        def reserve(transaction: Any) -> int:
+            snapshot = user_ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            usage = data.get("monthlyUsage") or {}
+            now = datetime.now()
+            if usage.get("monthYear") != month:
+                count, reserved = 0, 0
+            else:
+                count = int(usage.get("count", 0) or 0)
+                reserved = int(usage.get("reserved", 0) or 0) - returned
+                leased_at = usage.get("leasedAt")
+                if isinstance(leased_at, datetime) and now - leased_at.replace(tzinfo=None) > timedelta(seconds=lease_ttl):
+                    reserved = 0  # every lease handed out so far has expired
+                reserved = max(reserved, count)
+
+            granted = min(block_size, limit - reserved)
+            if granted <= 0:
+                return 0
+            usage_update = {"monthYear": month, "reserved": reserved + granted, "leasedAt": now}
+            if usage.get("monthYear") != month:
+                usage_update["count"] = 0
+            transaction.set(user_ref, {"monthlyUsage": usage_update}, merge=True)
+            return granted
+
+        return self._transactional(reserve)(db.transaction())
+
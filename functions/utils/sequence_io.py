@@ -0,0 +1,174 @@
+"""Streaming readers for sequence uploads and libraries (FASTA and CSV).
+
+One parser serves ``submit_job`` uploads, ``BrickPlotter`` file readers and
+the offline scoring CLI. Records are yielded one at a time as
+``(record_id, sequence)`` from a string, a text file object or any iterable
+of lines, so libraries of millions of sequences never need to fit in memory.
+Lines of a record are collected in a list and joined once, which keeps
+multi-line genome FASTA linear in its size.
+
+Gzip and bgzip input (``.fa.gz``) is recognised by its magic bytes and
+decompressed as it streams, from paths and from in-memory ``bytes`` alike;
+the format comes from the suffix under the compression suffix (see
+:func:`sequence_suffix`). Files converted with :func:`convert_to_packed`
+(``.2bp``, see ``utils/packed_store.py``) are read through the same
+``iter_records`` entry point without parsing. Random access into bgzip
+FASTA lives in ``utils/indexed_fasta.py``.
+
+Sequences are returned upper-cased with whitespace removed; validation is
+left to the caller (:func:`is_valid_sequence`) so that invalid records can
+be reported individually. Validation and reverse complement run on bytes
+through ``bytes.translate`` tables instead of regexes or per-base loops.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+from .packed_store import PACKED_SUFFIX, PackedSequenceStore, write_packed_store
+
+FASTA_SUFFIXES = {".fasta", ".fa", ".fna", ".ffn", ".faa"}
+CSV_SUFFIXES = {".csv"}
+GZIP_SUFFIXES = {".gz", ".bgz"}
+GZIP_MAGIC = b"\x1f\x8b"
+NUCLEOTIDES = b"ACGTU"
+
+Record = Tuple[str, str]
+Source = Union[str, bytes, TextIO, Iterable[str]]
+
+_IUPAC = b"ACGTUNRYKMSWBDHVacgtunrykmswbdhv"
+_COMPLEMENT = bytes.maketrans(_IUPAC, b"TGCAANYRMKSWVHDBtgcaanyrmkswvhdb")
+
+# Genome-length CSV fields exceed the csv module's 128 KiB default.
+csv.field_size_limit(max(csv.field_size_limit(), 2**31 - 1))
+
+
+def is_valid_sequence(sequence: str, alphabet: bytes = NUCLEOTIDES) -> bool:
+    """True when ``sequence`` is non-empty and only uses ``alphabet``."""
+    if not sequence:
+        return False
+    # Non-ASCII characters become "?", which no alphabet contains.
+    return not sequence.encode("ascii", "replace").translate(None, alphabet)
+
+
+def reverse_complement(sequence: str) -> str:
+    """Reverse complement of a whole record (IUPAC codes; ``U`` pairs with ``A``)."""
+    return sequence.encode("ascii", "replace").translate(_COMPLEMENT)[::-1].decode("ascii")
+
+
+def sequence_suffix(name: str | Path) -> str:
+    """Format suffix of ``name``, looking through ``.gz``/``.bgz`` (``x.fa.gz`` gives ``.fa``)."""
+    suffixes = [suffix.lower() for suffix in Path(name).suffixes]
+    if suffixes and suffixes[-1] in GZIP_SUFFIXES:
+        suffixes.pop()
+    return suffixes[-1] if suffixes else ""
+
+
+def open_text(path: str | Path) -> TextIO:
+    """Open ``path`` for reading text, decompressing gzip/bgzip as it streams."""
+    with open(path, "rb") as probe:
+        compressed = probe.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _lines(source: Source) -> Iterable[str]:
+    if isinstance(source, str):
+        return io.StringIO(source)
+    if isinstance(source, (bytes, bytearray)):
+        if source[:2] == GZIP_MAGIC:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=io.BytesIO(source)), encoding="utf-8", newline="")
+        return io.StringIO(bytes(source).decode("utf-8"))
+    return source
+
+
+def iter_fasta(source: Source, rc: bool = False) -> Iterator[Record]:
+    """Yield ``(header, sequence)`` records; unnamed records get ``record_<n>``."""
+    record_id: Optional[str] = None
+    chunks: List[str] = []
+    count = 0
+
+    def record() -> Record:
+        sequence = "".join(chunks).upper()
+        return record_id or f"record_{count}", reverse_complement(sequence) if rc else sequence
+
+    for line in _lines(source):
+        line = line.strip()
+        if line.startswith(">"):
+            if chunks:
+                count += 1
+                yield record()
+            record_id = line[1:].strip() or None
+            chunks = []
+        elif line:
+            chunks.append("".join(line.strip('"').split()))
+    if chunks:
+        count += 1
+        yield record()
+
+
+def iter_csv(source: Source, rc: bool = False) -> Iterator[Record]:
+    """Yield ``(id, sequence)`` rows from CSV.
+
+    With a header containing ``sequence``, ids come from an ``id`` or
+    ``name`` column (``record_<n>`` otherwise). Without one, the file is read
+    as headerless ``id,sequence`` rows and other rows are skipped.
+    """
+    rows = csv.reader(_lines(source))
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [cell.strip().lower() for cell in header]
+    if "sequence" in columns:
+        seq_col = columns.index("sequence")
+        id_col = next((columns.index(name) for name in ("id", "name") if name in columns), None)
+        min_width, max_width = seq_col + 1, None
+    else:
+        seq_col, id_col = 1, 0
+        min_width = max_width = 2
+        rows = _prepend(header, rows)
+    for number, row in enumerate(rows, start=1):
+        if len(row) < min_width or (max_width is not None and len(row) > max_width):
+            continue
+        sequence = "".join(row[seq_col].split()).upper()
+        if not sequence:
+            continue
+        record_id = row[id_col].strip() if id_col is not None and id_col < len(row) else ""
+        yield record_id or f"record_{number}", reverse_complement(sequence) if rc else sequence
+
+
+def _prepend(first: List[str], rows: Iterator[List[str]]) -> Iterator[List[str]]:
+    yield first
+    yield from rows
+
+
+def iter_text(source: Source, suffix: str, rc: bool = False) -> Iterator[Record]:
+    """Stream records from in-memory or opened content, chosen by file ``suffix``."""
+    suffix = suffix.lower()
+    if suffix in FASTA_SUFFIXES:
+        return iter_fasta(source, rc=rc)
+    if suffix in CSV_SUFFIXES:
+        return iter_csv(source, rc=rc)
+    raise ValueError(f"Unsupported file type: {suffix}")
+
+
+def iter_records(path: str | Path, rc: bool = False) -> Iterator[Record]:
+    """Stream records from a FASTA, CSV (plain or gzipped) or packed file, chosen by extension."""
+    suffix = sequence_suffix(path)
+    if suffix == PACKED_SUFFIX:
+        for record_id, sequence in PackedSequenceStore(path):
+            yield record_id, reverse_complement(sequence) if rc else sequence
+        return
+    if suffix not in FASTA_SUFFIXES | CSV_SUFFIXES:
+        raise ValueError(f"Unsupported file type: {suffix}")
+    with open_text(path) as handle:
+        yield from iter_text(handle, suffix, rc=rc)
+
+
+def convert_to_packed(source: str | Path, target: str | Path) -> Dict[str, int]:
+    """Convert a FASTA or CSV file (plain or gzipped) to the packed ``.2bp`` format."""
+    return write_packed_store(iter_records(source), target)
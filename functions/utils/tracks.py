@@ -0,0 +1,365 @@
+"""Per-position binding tracks for genome scans: bedGraph and an indexed binary format.
+
+A scan walks each chromosome in tiles (:func:`iter_genome_tiles`), scores
+every tile to bricks, and reduces them over spacer configurations and strands
+to one value per position (:func:`position_signals`):
+
+``minEnergy``
+    strongest site, the minimum brick energy;
+``logSumExp``
+    effective energy of all sites, ``-logsumexp(-E)``;
+``pon``
+    log10 occupancy of the position on its own, ``-log10(1 + exp(logSumExp))``.
+
+A brick row covers ``footprint`` bases starting one base after the row
+index (see ``getBricks``), so the value of row ``r`` is reported at position
+``r + 1``: the first base of the sites it summarises. Positions with no
+complete site, or whose sites cover an ``N``, have no value.
+
+Writers take each chromosome as consecutive chunks of values (``NaN`` for
+no value) and keep only a chunk plus one partial zoom bin in memory.
+:class:`BedGraphWriter` merges runs of equal rounded values.
+:class:`BinaryTrackWriter` writes ``float32`` values per base followed by
+zoom levels, which hold ``min``, ``max``, ``sum`` and ``count`` for bins of
+64, 1024 and 16384 bases by default. Zoom data is spilled to temporary files
+during the scan. The layout follows ``utils/packed_store.py``: ``MAGIC``,
+then the per-chromosome values, then the zoom sections, then a JSON footer,
+its length as ``uint64``, and ``MAGIC`` again. :class:`TrackFile` maps the
+file with ``np.memmap``. It answers ``values`` range queries from the
+per-base data and ``summary`` queries from the coarsest zoom level that
+still resolves the requested bins.
+"""
+from __future__ import annotations
+
+import json
+import shutil
+import struct
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, IO, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy.special import logsumexp
+
+from .encoding import encode_sequence
+from .indexed_fasta import IndexedFasta
+from .packed_store import PACKED_SUFFIX, PackedSequenceStore
+from .sequence_io import FASTA_SUFFIXES, iter_records, sequence_suffix
+
+MAGIC = b"THRMTRK\x01"
+TRACK_SUFFIX = ".trk"
+SIGNALS = ("minEnergy", "logSumExp", "pon")
+ZOOM_BINS = (64, 1024, 16384)
+
+_FOOTER = struct.Struct("<Q")
+
+Tiles = Iterator[Tuple[int, np.ndarray]]
+
+
+def position_signals(strand_bricks: Sequence[np.ndarray], covered: np.ndarray) -> Dict[str, np.ndarray]:
+    """Reduce ``(rows, nSpacer)`` bricks of each strand to per-row signals; rows not ``covered`` become NaN."""
+    energies = np.concatenate([np.asarray(bricks, dtype=float) for bricks in strand_bricks], axis=1)
+    effective = -logsumexp(-energies, axis=1)
+    signals = {
+        "minEnergy": energies.min(axis=1),
+        "logSumExp": effective,
+        "pon": -np.logaddexp(0.0, effective) / np.log(10.0),
+    }
+    for values in signals.values():
+        values[~covered] = np.nan
+    return signals
+
+
+def _tiles_from_codes(codes: np.ndarray, rows: int, footprint: int) -> Tiles:
+    for first in range(0, max(len(codes) - footprint, 0), rows):
+        yield first, codes[first: first + rows + footprint]
+
+
+def iter_genome_tiles(genome: Union[str, Path], rows: int, footprint: int) -> Iterator[Tuple[str, int, Tiles]]:
+    """``(chrom, length, tiles)`` per chromosome; ``tiles`` yields ``(first_row, codes)`` for ``rows`` brick rows.
+
+    Each tile's codes span ``rows + footprint`` bases from ``first_row``, so
+    consecutive tiles overlap by the footprint. ``.2bp`` genomes and plain or
+    bgzip FASTA are read one tile at a time; other inputs (plain gzip, CSV)
+    are read one chromosome at a time.
+    """
+    suffix = sequence_suffix(genome)
+    if suffix == PACKED_SUFFIX:
+        store = PackedSequenceStore(genome)
+        for index, record_id in enumerate(store.ids):
+            length = int(store.lengths[index])
+            tiles = (
+                (first, store.codes(index, first, first + rows + footprint))
+                for first in range(0, max(length - footprint, 0), rows)
+            )
+            yield record_id.split(None, 1)[0] if record_id.strip() else record_id, length, tiles
+        return
+    fasta: Optional[IndexedFasta] = None
+    if suffix in FASTA_SUFFIXES:
+        try:
+            fasta = IndexedFasta(genome)
+        except ValueError:  # plain gzip has no block index
+            fasta = None
+    if fasta is not None:
+        with fasta:
+            for name, length in fasta.lengths().items():
+                tiles = (
+                    (first, encode_sequence(fasta.fetch(name, first, first + rows + footprint), "mask"))
+                    for first in range(0, max(length - footprint, 0), rows)
+                )
+                yield name, length, tiles
+        return
+    for record_id, sequence in iter_records(genome):
+        codes = encode_sequence(sequence, "mask")
+        yield record_id.split(None, 1)[0] if record_id.strip() else record_id, len(codes), _tiles_from_codes(codes, rows, footprint)
+
+
+class _ChromWriter(ABC):
+    """Shared bookkeeping: one chromosome at a time, values in order, exactly ``length`` of them."""
+
+    def __init__(self) -> None:
+        self._chrom: Optional[str] = None
+        self._length = 0
+        self._written = 0
+
+    def begin(self, chrom: str, length: int) -> None:
+        if self._chrom is not None:
+            raise ValueError(f"Chromosome {self._chrom} is still open")
+        self._chrom, self._length, self._written = chrom, length, 0
+
+    def write(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=float)
+        if self._chrom is None or self._written + len(values) > self._length:
+            raise ValueError("Track values written outside a chromosome or past its end")
+        self._write(values)
+        self._written += len(values)
+
+    def end(self) -> None:
+        if self._written < self._length:
+            self.write(np.full(self._length - self._written, np.nan))
+        self._end()
+        self._chrom = None
+
+    @abstractmethod
+    def _write(self, values: np.ndarray) -> None:
+        """Store the next ``values`` of the open chromosome."""
+
+    @abstractmethod
+    def _end(self) -> None:
+        """Finish the open chromosome."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and close the output."""
+
+    def __enter__(self) -> "_ChromWriter":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class BedGraphWriter(_ChromWriter):
+    """bedGraph lines for runs of equal values, rounded to ``digits`` decimals; positions without a value are skipped."""
+
+    def __init__(self, path: Union[str, Path], name: str = "thermoters", digits: int = 3) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self._digits = digits
+        self._handle: IO[str] = self.path.open("w")
+        self._handle.write(f"track type=bedGraph name={name}\n")
+        self._run_start = 0
+        self._run_value = np.nan
+
+    def begin(self, chrom: str, length: int) -> None:
+        super().begin(chrom, length)
+        self._run_start, self._run_value = 0, np.nan
+
+    def _write(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        rounded = np.round(values, self._digits)
+        same = (rounded[1:] == rounded[:-1]) | (np.isnan(rounded[1:]) & np.isnan(rounded[:-1]))
+        offsets = np.concatenate(([0], np.flatnonzero(~same) + 1))
+        run_values = rounded[offsets]
+        run_starts = self._written + offsets
+        first = run_values[0]
+        if first == self._run_value or (np.isnan(first) and np.isnan(self._run_value)):
+            run_starts[0] = self._run_start  # the open run carries on into this chunk
+        else:
+            self._handle.write(self._line(self._written))
+        # Every run but the last is complete; the last stays open for the next chunk.
+        keep = ~np.isnan(run_values[:-1])
+        digits = self._digits
+        self._handle.write("".join(
+            f"{self._chrom}\t{start}\t{end}\t{value:.{digits}f}\n"
+            for start, end, value in zip(run_starts[:-1][keep].tolist(), run_starts[1:][keep].tolist(), run_values[:-1][keep].tolist())
+        ))
+        self._run_start, self._run_value = int(run_starts[-1]), float(run_values[-1])
+
+    def _line(self, end: int) -> str:
+        """Line for the open run, which ends at ``end``; empty for runs without a value."""
+        if np.isnan(self._run_value) or end <= self._run_start:
+            return ""
+        return f"{self._chrom}\t{self._run_start}\t{end}\t{self._run_value:.{self._digits}f}\n"
+
+    def _end(self) -> None:
+        self._handle.write(self._line(self._length))
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+def _zoom_summary(block: np.ndarray) -> np.ndarray:
+    """``(bins, 4)`` min, max, sum and count of the non-NaN values of each row of ``block``."""
+    present = ~np.isnan(block)
+    return np.stack(
+        [np.fmin.reduce(block, axis=1), np.fmax.reduce(block, axis=1), np.nansum(block, axis=1), present.sum(axis=1)],
+        axis=1,
+    )
+
+
+class BinaryTrackWriter(_ChromWriter):
+    """Indexed binary track: ``float32`` per base plus ``min/max/sum/count`` zoom levels."""
+
+    def __init__(self, path: Union[str, Path], zoom_bins: Sequence[int] = ZOOM_BINS) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self._handle: IO[bytes] = self._tmp.open("wb")
+        self._handle.write(MAGIC)
+        self._position = len(MAGIC)
+        self._zoom_bins = list(zoom_bins)
+        self._zoom_files: List[IO[bytes]] = [tempfile.TemporaryFile() for _ in self._zoom_bins]
+        self._zoom_written = [0] * len(self._zoom_bins)
+        self._carry: List[np.ndarray] = []
+        self._chroms: List[Dict[str, object]] = []
+
+    def begin(self, chrom: str, length: int) -> None:
+        super().begin(chrom, length)
+        self._chroms.append({"name": chrom, "length": length, "offset": self._position, "zooms": []})
+        self._carry = [np.empty(0) for _ in self._zoom_bins]
+        for level, _ in enumerate(self._zoom_bins):
+            self._chroms[-1]["zooms"].append({"bin": self._zoom_written[level], "bins": 0})  # type: ignore[union-attr]
+
+    def _write(self, values: np.ndarray) -> None:
+        data = values.astype("<f4").tobytes()
+        self._handle.write(data)
+        self._position += len(data)
+        for level, size in enumerate(self._zoom_bins):
+            pending = np.concatenate((self._carry[level], values))
+            whole = len(pending) // size * size
+            if whole:
+                self._spill(level, _zoom_summary(pending[:whole].reshape(-1, size)))
+            self._carry[level] = pending[whole:]
+
+    def _spill(self, level: int, summary: np.ndarray) -> None:
+        self._zoom_files[level].write(summary.astype("<f8").tobytes())
+        self._zoom_written[level] += len(summary)
+        self._chroms[-1]["zooms"][level]["bins"] += len(summary)  # type: ignore[index]
+
+    def _end(self) -> None:
+        for level, carry in enumerate(self._carry):
+            if len(carry):
+                self._spill(level, _zoom_summary(carry[np.newaxis]))
+
+    def close(self) -> None:
+        if self._handle.closed:
+            return
+        footer: Dict[str, object] = {"version": 1, "zoomBins": self._zoom_bins, "zoomOffsets": [], "chroms": self._chroms}
+        for zoom_file in self._zoom_files:
+            padding = -self._position % 8
+            self._handle.write(b"\0" * padding)
+            self._position += padding
+            footer["zoomOffsets"].append(self._position)  # type: ignore[union-attr]
+            zoom_file.seek(0)
+            shutil.copyfileobj(zoom_file, self._handle)
+            self._position += zoom_file.tell()
+            zoom_file.close()
+        encoded = json.dumps(footer).encode("utf-8")
+        self._handle.write(encoded + _FOOTER.pack(len(encoded)) + MAGIC)
+        self._handle.close()
+        self._tmp.replace(self.path)
+
+
+class TrackFile:
+    """Read-only view of a binary track through ``np.memmap``."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        tail = len(MAGIC) + _FOOTER.size
+        if len(self._data) < len(MAGIC) + tail or bytes(self._data[: len(MAGIC)]) != MAGIC or bytes(self._data[-len(MAGIC):]) != MAGIC:
+            raise ValueError(f"Not a track file: {self.path}")
+        (footer_length,) = _FOOTER.unpack(bytes(self._data[-tail: -len(MAGIC)]))
+        footer = json.loads(bytes(self._data[-tail - footer_length: -tail]))
+        self.zoom_bins: List[int] = footer["zoomBins"]
+        self._chroms = {chrom["name"]: chrom for chrom in footer["chroms"]}
+        self._zoom_offsets: List[int] = footer["zoomOffsets"]
+
+    @property
+    def chroms(self) -> Dict[str, int]:
+        return {name: chrom["length"] for name, chrom in self._chroms.items()}
+
+    def _bounds(self, chrom: str, start: int, end: Optional[int]) -> Tuple[dict, int, int]:
+        entry = self._chroms[chrom]
+        end = entry["length"] if end is None else min(end, entry["length"])
+        return entry, max(0, start), end
+
+    def values(self, chrom: str, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """Per-base values of ``start:end`` (NaN where there is no value)."""
+        entry, start, end = self._bounds(chrom, start, end)
+        size = max(end - start, 0)
+        return np.ndarray((size,), dtype="<f4", buffer=self._data, offset=entry["offset"] + 4 * start)
+
+    def _zoom(self, chrom: str, level: int) -> np.ndarray:
+        zoom = self._chroms[chrom]["zooms"][level]
+        offset = self._zoom_offsets[level] + 32 * zoom["bin"]
+        return np.ndarray((zoom["bins"], 4), dtype="<f8", buffer=self._data, offset=offset)
+
+    def summary(self, chrom: str, start: int = 0, end: Optional[int] = None, bins: int = 1) -> Dict[str, np.ndarray]:
+        """``min``, ``max`` and ``mean`` of ``start:end`` in ``bins`` equal bins.
+
+        Uses the coarsest zoom level whose bins are no wider than the
+        requested ones; zoom bins that straddle a requested bin edge are
+        counted in the bin holding their start. Narrower requests are
+        answered exactly from the per-base values.
+        """
+        entry, start, end = self._bounds(chrom, start, end)
+        edges = np.linspace(start, end, bins + 1).astype(np.int64)
+        level = max((i for i, size in enumerate(self.zoom_bins) if size <= (end - start) / bins), default=None)
+        if level is None:
+            values = np.asarray(self.values(chrom, start, end), dtype=float)
+            cuts = np.minimum(edges[:-1] - start, max(len(values) - 1, 0))
+            present = ~np.isnan(values)
+            table = np.stack(
+                [
+                    np.fmin.reduceat(values, cuts),
+                    np.fmax.reduceat(values, cuts),
+                    np.add.reduceat(np.where(present, values, 0.0), cuts),
+                    np.add.reduceat(present.astype(float), cuts),
+                ],
+                axis=1,
+            ) if len(values) else np.full((bins, 4), np.nan)
+        else:
+            size = self.zoom_bins[level]
+            zoom = np.asarray(self._zoom(chrom, level))
+            lo, hi = start // size, -(-end // size)
+            # A zoom bin belongs to the requested bin holding its start; the
+            # one straddling ``start`` goes to the first bin.
+            cuts = -(-edges[:-1] // size) - lo
+            cuts[0] = 0
+            part = zoom[lo:hi]
+            table = np.stack(
+                [
+                    np.fmin.reduceat(part[:, 0], cuts),
+                    np.fmax.reduceat(part[:, 1], cuts),
+                    np.add.reduceat(part[:, 2], cuts),
+                    np.add.reduceat(part[:, 3], cuts),
+                ],
+                axis=1,
+            )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = table[:, 2] / table[:, 3]
+        return {"start": edges[:-1], "end": edges[1:], "min": table[:, 0], "max": table[:, 1], "mean": mean}
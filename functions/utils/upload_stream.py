@@ -0,0 +1,155 @@
+"""Incremental reading of uploaded sequence files with size limits.
+
+``submit_job`` accepts ``multipart/form-data`` bodies: a ``payload`` part
+holding the usual JSON options, followed by one file part. The body is read
+from the request stream in fixed-size chunks and decoded with werkzeug's
+incremental ``MultipartDecoder``. The file part is exposed as a binary stream,
+so the sequence parser consumes it line by line while the upload is still
+arriving, and memory stays bounded by the chunk size rather than the file.
+
+Limits are enforced while reading: ``max_bytes`` on the raw body and
+``max_decompressed`` on the text produced from gzip/bgzip uploads, so a
+small compressed file cannot expand without bound.
+"""
+from __future__ import annotations
+
+import gzip
+import io
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+GZIP_MAGIC = b"\x1f\x8b"
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """The uploaded file cannot be accepted."""
+
+
+class UploadTooLarge(UploadError):
+    """An upload exceeded a size limit while it was being read."""
+
+
+class LimitedReader(io.RawIOBase):
+    """Binary reader that raises :class:`UploadTooLarge` past ``limit`` bytes."""
+
+    def __init__(self, raw: BinaryIO, limit: int, what: str = "Upload") -> None:
+        self._raw = raw
+        self._limit = limit
+        self._what = what
+        self.consumed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:  # type: ignore[override]
+        data = self._raw.read(len(buffer))
+        self.consumed += len(data)
+        if self.consumed > self._limit:
+            raise UploadTooLarge(f"{self._what} exceeds the limit of {self._limit} bytes")
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def open_upload_text(raw: BinaryIO, max_decompressed: int) -> io.TextIOWrapper:
+    """Text view of an uploaded file, gunzipping (with a size limit) when it starts with the gzip magic."""
+    buffered = raw if isinstance(raw, io.BufferedReader) else io.BufferedReader(raw)  # type: ignore[arg-type]
+    if buffered.peek(2)[:2] == GZIP_MAGIC:
+        inflated = LimitedReader(gzip.GzipFile(fileobj=buffered), max_decompressed, "Decompressed upload")  # type: ignore[arg-type]
+        buffered = io.BufferedReader(inflated)
+    return io.TextIOWrapper(buffered, encoding="utf-8", newline="")
+
+
+class _PartReader(io.RawIOBase):
+    """Raw stream over the ``Data`` events of the current multipart part."""
+
+    def __init__(self, events: Iterator[object]) -> None:
+        self._events = events
+        self._pending = b""
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:  # type: ignore[override]
+        while not self._pending and not self._done:
+            event = next(self._events, None)
+            if not isinstance(event, Data):
+                self._done = True
+                break
+            self._pending = event.data
+            self._done = not event.more_data
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class MultipartUpload:
+    """Form fields and a streamed file part from a ``multipart/form-data`` body.
+
+    Fields must precede the file part (``FormData`` sends parts in the order
+    they were appended); the body is read only as far as the file part
+    before the constructor returns.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        boundary: str,
+        max_bytes: int,
+        max_field_bytes: int = 64 * 1024,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        self._stream = LimitedReader(stream, max_bytes)
+        self._decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=max_field_bytes)
+        self._chunk_size = chunk_size
+        self._events = self._iter_events()
+        self.fields: Dict[str, str] = {}
+        self.file_name: Optional[str] = None
+        self._read_fields()
+
+    def _iter_events(self) -> Iterator[object]:
+        while True:
+            event = self._decoder.next_event()
+            if isinstance(event, NeedData):
+                chunk = self._stream.read(self._chunk_size)
+                self._decoder.receive_data(chunk or None)
+                continue
+            yield event
+            if isinstance(event, Epilogue):
+                return
+
+    def _read_fields(self) -> None:
+        name: Optional[str] = None
+        parts: list[bytes] = []
+        for event in self._events:
+            if isinstance(event, File):
+                self.file_name = event.filename or event.name
+                return
+            if isinstance(event, Field):
+                name, parts = event.name, []
+            elif isinstance(event, Data) and name is not None:
+                parts.append(event.data)
+                if not event.more_data:
+                    self.fields[name] = b"".join(parts).decode("utf-8")
+                    name = None
+
+    def file(self) -> io.BufferedReader:
+        """Binary stream of the file part; reading it pulls the body from the request."""
+        if self.file_name is None:
+            raise UploadError("No file part in upload")
+        return io.BufferedReader(_PartReader(self._events), buffer_size=self._chunk_size)
+
+
+def multipart_boundary(content_type: str) -> Optional[str]:
+    """Boundary of a ``multipart/form-data`` content type, or None for other bodies."""
+    media_type, _, params = (content_type or "").partition(";")
+    if media_type.strip().lower() != "multipart/form-data":
+        return None
+    for param in params.split(";"):
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary" and value:
+            return value.strip('"')
+    raise UploadError("multipart/form-data body without a boundary")
@@ -0,0 +1,163 @@
+"""Upstream windows of annotated genes, cut from an encoded genome.
+
+:func:`read_gene_starts` reads gene starts and strands from GFF3/GTF (1-based,
+inclusive) or BED (0-based, half-open) annotation, plain or gzipped. A gene
+starts at its first base in transcription direction: ``start`` on ``+`` and
+``end`` on ``-``.
+
+:func:`upstream_windows` takes the base indices of one chromosome and cuts
+every window out of two zero-copy strided views: ``sliding_window_view`` over
+the chromosome for ``+`` genes, and over its reversed view ``codes[::-1]``
+(a negative stride, not a copy) for ``-`` genes. Only the selected windows
+are gathered into the ``(nGenes, W)`` batch that ``getBrickDict`` scores,
+and the ``-`` rows are complemented there, so the genome itself is never
+copied or reverse-complemented as a whole.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+from urllib.parse import unquote
+
+import numpy as np
+
+from .encoding import MASKED, encode_sequence
+from .packed_store import PACKED_SUFFIX, PackedSequenceStore
+from .sequence_io import iter_records, open_text, sequence_suffix
+
+BED_SUFFIXES = {".bed"}
+GFF_SUFFIXES = {".gff", ".gff3", ".gtf"}
+_NAME_KEYS = ("Name", "gene_name", "gene", "locus_tag", "ID", "gene_id")
+
+
+@dataclass
+class GeneStart:
+    """First transcribed base (0-based) of a gene on its strand."""
+
+    name: str
+    chrom: str
+    start: int
+    strand: str
+
+
+def _gff_attributes(field: str) -> Dict[str, str]:
+    attributes: Dict[str, str] = {}
+    for item in field.strip().rstrip(";").split(";"):
+        item = item.strip()
+        if "=" in item:  # GFF3: key=value
+            key, _, value = item.partition("=")
+        elif " " in item:  # GTF: key "value"
+            key, _, value = item.partition(" ")
+        else:
+            continue
+        attributes[key.strip()] = unquote(value.strip().strip('"'))
+    return attributes
+
+
+def read_gene_starts(path: Union[str, Path], feature: str = "gene") -> List[GeneStart]:
+    """Gene starts from a GFF3/GTF (rows of type ``feature``) or BED file, chosen by extension."""
+    suffix = sequence_suffix(path)
+    if suffix not in BED_SUFFIXES | GFF_SUFFIXES:
+        raise ValueError(f"Unsupported annotation file type: {suffix}")
+    genes: List[GeneStart] = []
+    with open_text(path) as handle:
+        for line_number, line in enumerate(handle, 1):
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\r\n").split("\t")
+            try:
+                if suffix in BED_SUFFIXES:
+                    chrom, start, end = fields[0], int(fields[1]), int(fields[2])
+                    strand = fields[5] if len(fields) > 5 else "+"
+                    name = fields[3] if len(fields) > 3 and fields[3] not in ("", ".") else f"{chrom}:{start + 1}"
+                    first = start if strand != "-" else end - 1
+                else:
+                    if fields[2] != feature:
+                        continue
+                    chrom, start, end, strand = fields[0], int(fields[3]), int(fields[4]), fields[6]
+                    attributes = _gff_attributes(fields[8]) if len(fields) > 8 else {}
+                    name = next((attributes[key] for key in _NAME_KEYS if key in attributes), f"{chrom}:{start}")
+                    first = start - 1 if strand != "-" else end - 1
+            except (IndexError, ValueError) as exc:
+                raise ValueError(f"Malformed annotation line {line_number} in {path}: {line.strip()!r}") from exc
+            if strand not in ("+", "-"):
+                raise ValueError(f"Gene {name} on line {line_number} of {path} has no strand")
+            genes.append(GeneStart(name, chrom, first, strand))
+    return genes
+
+
+def iter_genome_codes(genome: Union[str, Path], chroms: Iterable[str]) -> Iterator[Tuple[str, np.ndarray]]:
+    """``(chrom, codes)`` for every genome record named in ``chroms``, one chromosome at a time.
+
+    Records match on the first word of their id; when several records share
+    it, only the first is used. Ambiguous bases are ``MASKED``; packed
+    ``.2bp`` genomes are unpacked without decoding to text.
+    """
+    wanted = set(chroms)
+    if sequence_suffix(genome) == PACKED_SUFFIX:
+        store = PackedSequenceStore(genome)
+        for index, record_id in enumerate(store.ids):
+            chrom = record_id.split(None, 1)[0] if record_id.strip() else record_id
+            if chrom in wanted:
+                wanted.discard(chrom)
+                yield chrom, store.codes(index)
+        return
+    for record_id, sequence in iter_records(genome):
+        chrom = record_id.split(None, 1)[0] if record_id.strip() else record_id
+        if chrom in wanted:
+            wanted.discard(chrom)
+            yield chrom, encode_sequence(sequence, "mask")
+
+
+def upstream_windows(
+    codes: np.ndarray,
+    starts: np.ndarray,
+    strands: np.ndarray,
+    before: int,
+    after: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Windows of ``before`` bases upstream through ``after`` bases from each gene start, on the gene's strand.
+
+    ``strands`` holds ``True`` for ``-`` genes. Returns the ``(nGenes, W)``
+    batch and a mask of rows that lie inside the chromosome and hold no
+    ``MASKED`` base; rows outside the mask are left as zeros.
+    """
+    width = before + after
+    starts = np.asarray(starts, dtype=np.int64)
+    strands = np.asarray(strands, dtype=bool)
+    batch = np.zeros((len(starts), width), dtype=np.int8)
+    length = len(codes)
+    if width <= 0 or length < width:
+        return batch, np.zeros(len(starts), dtype=bool)
+
+    # A "-" gene's start at genome position p sits at position length-1-p of the reversed view.
+    offsets = np.where(strands, length - 1 - starts, starts) - before
+    inside = (offsets >= 0) & (offsets <= length - width)
+    forward = np.lib.stride_tricks.sliding_window_view(codes, width)
+    reverse = np.lib.stride_tricks.sliding_window_view(codes[::-1], width)
+    for minus, view in ((False, forward), (True, reverse)):
+        rows = np.flatnonzero(inside & (strands == minus))
+        if not len(rows):
+            continue
+        gathered = np.take(view, offsets[rows], axis=0)
+        if minus:
+            np.subtract(3, gathered, out=gathered, where=gathered != MASKED)
+        batch[rows] = gathered
+    inside &= ~(batch == MASKED).any(axis=1)
+    return batch, inside
+
+
+def group_by_chrom(genes: List[GeneStart]) -> Dict[str, List[int]]:
+    """Indices into ``genes`` for each chromosome, in first-seen order."""
+    groups: Dict[str, List[int]] = {}
+    for index, gene in enumerate(genes):
+        groups.setdefault(gene.chrom, []).append(index)
+    return groups
+
+
+def window_bounds(gene: GeneStart, before: int, after: int) -> Tuple[int, int]:
+    """0-based half-open genome interval covered by a gene's window."""
+    if gene.strand == "-":
+        return gene.start - after + 1, gene.start + before + 1
+    return gene.start - before, gene.start + after